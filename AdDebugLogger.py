@@ -1,8 +1,13 @@
+import collections
 import os
 import shutil
 import time
 import re
 
+from project_walker import walk_project
+from project_watcher import watch_project
+from sandbox_copy import clone_file, summarize
+
 # ==========================================
 # 1. THE C++ LOGGER GENERATOR (Header & Source)
 # ==========================================
@@ -17,6 +22,8 @@ def generate_cpp_header():
 class AdDebugLogger {
 private:
     static std::mutex logMutex;
+    static long long seq;
+    static std::string csvField(const std::string& text);
 public:
     static void logTrace(const char* file, int line);
 };
@@ -29,8 +36,21 @@ public:
 
 def generate_cpp_source():
     return """#include "AdDebugLogger.h"
+#include <sstream>
+#include <thread>
 
 std::mutex AdDebugLogger::logMutex;
+long long AdDebugLogger::seq = 0;
+
+std::string AdDebugLogger::csvField(const std::string& text) {
+    if (text.find_first_of(",\\"\\r\\n") == std::string::npos) return text;
+    std::string quoted = "\\"";
+    for (char c : text) {
+        if (c == '"') quoted += '"';
+        quoted += c;
+    }
+    return quoted + "\\"";
+}
 
 void AdDebugLogger::logTrace(const char* file, int line) {
     std::lock_guard<std::mutex> guard(logMutex);
@@ -44,6 +64,19 @@ void AdDebugLogger::logTrace(const char* file, int line) {
     if (logFile.is_open()) {
         logFile << msg;
     }
+
+    // One <stmt> record per executed line in the common trace schema (see trace_schema.py)
+    if (seq == 0) {
+        std::ofstream header("_VARIABLE_TRACKER.csv", std::ios_base::trunc);
+        header << "File,Line,Seq,Thread,Variable,Type,Value\\n";
+    }
+    std::ostringstream thread;
+    thread << std::this_thread::get_id();
+    std::ofstream tracker("_VARIABLE_TRACKER.csv", std::ios_base::app);
+    if (tracker.is_open()) {
+        tracker << csvField(file) << "," << line << "," << seq << "," << thread.str() << ",<stmt>,,\\n";
+    }
+    seq++;
 }
 """
 
@@ -105,7 +138,23 @@ def inject_into_cpp_file(file_path):
 # ==========================================
 # 3. RUNNER
 # ==========================================
-def process_cpp_project(source_dir):
+CPP_SKIP_DIRS = ['.git', 'build', 'out', 'bin', 'Debug', 'Release']
+
+
+def sandbox_cpp_file(src, dst, copies=None):
+    file = os.path.basename(src)
+    # Instrument .cpp and .cc files. (We usually avoid modifying headers .h/.hpp to prevent inline circular dependencies)
+    if file.endswith((".cpp", ".cc", ".cxx")):
+        shutil.copy2(src, dst)
+        inject_into_cpp_file(dst)
+        print(f"   Instrumented: {file}")
+    else:
+        method = clone_file(src, dst)
+        if copies is not None:
+            copies[method] += 1
+
+
+def process_cpp_project(source_dir, include=None, exclude=None, watch=False):
     suffix = int(time.time())
     target_dir = source_dir.rstrip('\\/') + f"_CPP_DEBUG_{suffix}"
     
@@ -120,28 +169,27 @@ def process_cpp_project(source_dir):
     with open(os.path.join(target_dir, "AdDebugLogger.cpp"), "w", encoding="utf-8") as f:
         f.write(generate_cpp_source())
     
-    for root, _, files in os.walk(source_dir):
-        # Skip common build directories
-        if any(x in root for x in ['.git', 'build', 'out', 'bin', 'Debug', 'Release']): continue
+    copies = collections.Counter()
+    # Skip common build directories
+    for root, files in walk_project(source_dir, skip_dirs=CPP_SKIP_DIRS, include=include, exclude=exclude):
         for file in files:
             src = os.path.join(root, file)
             dst = os.path.join(target_dir, os.path.relpath(src, source_dir))
             os.makedirs(os.path.dirname(dst), exist_ok=True)
-            
-            # Instrument .cpp and .cc files. (We usually avoid modifying headers .h/.hpp to prevent inline circular dependencies)
-            if file.endswith((".cpp", ".cc", ".cxx")):
-                shutil.copy2(src, dst)
-                inject_into_cpp_file(dst)
-                print(f"   Instrumented: {file}")
-            else:
-                shutil.copy2(src, dst)
+            sandbox_cpp_file(src, dst, copies)
                 
+    if copies:
+        print(f"\n   Untouched files: {summarize(copies)}")
     print(f"\n[FINISH] Project ready at: {target_dir}")
     print("\n[NOTE] Don't forget to add 'AdDebugLogger.cpp' to your compilation command or CMakeLists.txt!")
+    if watch:
+        watch_project(source_dir, target_dir, sandbox_cpp_file,
+                      skip_dirs=CPP_SKIP_DIRS, include=include, exclude=exclude)
 
 if __name__ == "__main__":
     p = input("C++ Project Path: ").strip().strip('"')
+    w = input("Watch for changes and re-instrument them live? (y/N): ").strip().lower() == "y"
     if os.path.isdir(p):
-        process_cpp_project(p)
+        process_cpp_project(p, watch=w)
     else:
         print("Invalid path.")
@@ -0,0 +1,485 @@
+import argparse
+import fnmatch
+import os
+import re
+import sys
+import time
+
+from source_map import SourceMapIndex, remap_pstats, remap_stream
+from trace_columnar import changes_per_variable, hits_per_line, numpy, open_columns
+from trace_diff import WINDOW_RECORDS, diff_traces
+from trace_index import TraceIndex
+from trace_perfetto import export_chrome_trace, timing_path_for
+from trace_report import SKETCH_CAPACITY, report_trace
+from trace_schema import detect_format, find_traces, map_ranges, tally, write_schema_csv
+from trace_stream import collect
+from trace_timeline import CHECKPOINT_INTERVAL, TraceTimeline
+
+# ==========================================
+# 1. SUBCOMMANDS
+# ==========================================
+def cmd_remap(args):
+    index = SourceMapIndex(args.sandbox)
+    if not len(index):
+        print(f"No source maps found under: {args.sandbox}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    if args.pstats:
+        entries = remap_pstats(args.input, args.output or args.input + ".remapped", index)
+        print(f"[FINISH] Remapped {entries} profile entries in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        return 0
+
+    src = open(args.input, 'r', encoding='utf-8', errors='replace') if args.input else sys.stdin
+    dst = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        remap_stream(src, dst, index)
+    finally:
+        if args.input: src.close()
+        if args.output: dst.close()
+    return 0
+
+
+def _print_step(index, step):
+    fields = index.record(step)
+    layout = index.layout
+    get = lambda i: fields[i] if i is not None and i < len(fields) else ""
+    where = f"{get(layout.file)}:{get(layout.line)}" if get(layout.file) else f"line {get(layout.line)}"
+    print(f"{step:>12}  {where:<24} {get(layout.variable)} = {get(layout.value)}")
+
+
+def cmd_query(args):
+    start = time.perf_counter()
+    with TraceIndex(args.trace, rebuild=args.rebuild, verbose=True) as index:
+        where = dict(line=args.line, file=args.file)
+        if args.query == "keys":
+            for kid, (file, line, variable) in enumerate(index.keys):
+                if args.variable is None or variable == args.variable:
+                    print(f"{index.postings[kid][1]:>12,}  {file + ':' if file else 'line '}{line:<8} {variable}")
+        elif args.query == "history":
+            if args.nth is not None:
+                step = index.nth(args.variable, args.nth, **where)
+                if step is None:
+                    print(f"{args.variable} has fewer than {args.nth:,} records.", file=sys.stderr)
+                    return 1
+                _print_step(index, step)
+            else:
+                shown = 0
+                for step, _ in index.history(args.variable, start=args.start, stop=args.stop, **where):
+                    if shown == args.limit:
+                        print(f"... ({index.count(args.variable, **where):,} records in total)", file=sys.stderr)
+                        break
+                    _print_step(index, step)
+                    shown += 1
+        elif args.query == "at":
+            step = index.last_before(args.variable, args.step, **where)
+            if step is None:
+                print(f"{args.variable} has no record at or before step {args.step:,}.", file=sys.stderr)
+                return 1
+            _print_step(index, step)
+        elif args.query == "equals":
+            for shown, step in enumerate(index.equals(args.variable, args.value, **where)):
+                if shown == args.limit:
+                    print("... (limit reached)", file=sys.stderr)
+                    break
+                _print_step(index, step)
+    print(f"[FINISH] Query answered in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def _describe_frame(timeline, frame):
+    info = timeline.frame_info(frame)
+    end = "end" if info["exit"] is None else f"{info['exit']:,}"
+    return f"#{frame} {info['function']} (steps {info['enter']:,}-{end})"
+
+
+def _print_state(timeline, frame, step, previous=None):
+    values = timeline.state(frame, step)
+    print(f"\n[STEP {step:,}] line {timeline.line_of(step)} in {_describe_frame(timeline, frame)}")
+    print("    stack: " + " <- ".join(timeline.frame_info(f)["function"] for f in timeline.call_stack(frame)))
+    if values is None:
+        print("    (frame not started yet)")
+        return values
+    for name, value in values.items():
+        changed = "*" if previous is not None and previous.get(name) != value else " "
+        print(f"  {changed} {name} = {value}")
+    return values
+
+
+def cmd_frames(args):
+    with TraceTimeline(args.trace, args.interval, rebuild=args.rebuild, verbose=True) as timeline:
+        for shown, frame in enumerate(timeline.frames(args.function)):
+            if shown == args.limit:
+                print("... (limit reached)", file=sys.stderr)
+                break
+            depth = len(timeline.call_stack(frame)) - 1
+            print("  " * min(depth, 20) + _describe_frame(timeline, frame))
+    return 0
+
+
+def cmd_state(args):
+    start = time.perf_counter()
+    with TraceTimeline(args.trace, args.interval, rebuild=args.rebuild, verbose=True) as timeline:
+        if not 0 <= args.step < timeline.records:
+            print(f"Step out of range (trace has {timeline.records:,} records).", file=sys.stderr)
+            return 1
+        frame = timeline.frame_at(args.step) if args.frame is None else args.frame
+        _print_state(timeline, frame, args.step)
+    print(f"[FINISH] Reconstructed in {(time.perf_counter() - start) * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def cmd_step(args):
+    with TraceTimeline(args.trace, args.interval, rebuild=args.rebuild, verbose=True) as timeline:
+        if args.function is not None:
+            calls = list(timeline.frames(args.function))
+            if len(calls) < args.call:
+                print(f"{args.function} has {len(calls)} recorded call(s).", file=sys.stderr)
+                return 1
+            frame = calls[args.call - 1]
+        else:
+            frame = args.frame
+        step = timeline.enters[frame]
+        values = _print_state(timeline, frame, timeline.snapshot_end(frame, step))
+        while True:
+            choice = input("\n[n]ext, [p]rev, [g]oto step, [q]uit: ").strip().lower()
+            if choice in ("q", "quit"):
+                return 0
+            if choice in ("g", "goto"):
+                try:
+                    target = int(input("Step: ").strip())
+                except:
+                    continue
+                moved = timeline.prev_snapshot(frame, target + 1) if timeline.frame_at(target) != frame else target
+            elif choice in ("p", "prev"):
+                moved = timeline.prev_snapshot(frame, step)
+            else:
+                moved = timeline.next_snapshot(frame, step)
+            if moved is None:
+                print("    (no further snapshot in this frame)")
+                continue
+            step = moved
+            values = _print_state(timeline, frame, timeline.snapshot_end(frame, step), values)
+
+
+def cmd_diff(args):
+    start = time.perf_counter()
+    result = diff_traces(args.a, args.b, args.window, args.hunks)
+    elapsed = time.perf_counter() - start
+    if result.first is None:
+        print(f"[DIFF] Identical: {result.records_a:,} records compared in {elapsed:.2f}s")
+        return 0
+
+    print(f"[DIFF] First divergence at A step {result.first[0]:,} / B step {result.first[1]:,}")
+    print(f"[DIFF] {result.hunks:,} hunk(s): {result.only_a:,} of {result.records_a:,} records only in A, "
+          f"{result.only_b:,} of {result.records_b:,} only in B ({elapsed:.2f}s)")
+    print("\nDiverging variables:")
+    ranked = sorted(result.variables.items(), key=lambda kv: -(kv[1][0] + kv[1][1]))
+    for name, (only_a, only_b, first_a, first_b) in ranked[:args.variables]:
+        first = f"A step {first_a:,}" if first_a is not None else f"B step {first_b:,}"
+        print(f"    {name:<24} A-only {only_a:>10,}  B-only {only_b:>10,}  first at {first}")
+    if len(ranked) > args.variables:
+        print(f"    ... {len(ranked) - args.variables} more")
+    for a_step, b_step, lines_a, lines_b in result.samples:
+        print(f"\n@@ A step {a_step:,}  B step {b_step:,} @@")
+        for marker, lines in (("-", lines_a), ("+", lines_b)):
+            for raw in lines:
+                print(f"{marker} {raw.decode('utf-8', 'replace').rstrip()}")
+    return 1
+
+
+def cmd_perfetto(args):
+    timing_path = timing_path_for(args.timing)
+    if not os.path.exists(timing_path):
+        print(f"No timing marks at {timing_path}; run the instrumented program with AD_TIMING=1.", file=sys.stderr)
+        return 1
+    output = args.output or os.path.splitext(timing_path)[0] + ".trace.json"
+    start = time.perf_counter()
+    events = export_chrome_trace(timing_path, output, min_line_us=args.min_line_us)
+    print(f"[FINISH] Wrote {events:,} trace events to {output} in {time.perf_counter() - start:.2f}s "
+          f"(open it at https://ui.perfetto.dev or chrome://tracing)", file=sys.stderr)
+    return 0
+
+
+def cmd_report(args):
+    start = time.perf_counter()
+    report = report_trace(args.trace, args.capacity)
+    elapsed = time.perf_counter() - start
+    name = lambda key: key.decode("utf-8", "replace")
+    print(f"[REPORT] {report.records:,} records, {report.snapshots:,} snapshots in {elapsed:.2f}s "
+          f"({report.records / max(elapsed, 1e-9):,.0f} rows/s). Counts are upper bounds (\u00b1 error).")
+
+    print("\nHot lines (snapshots written):")
+    for key, count, error in report.lines.top(args.top):
+        print(f"    {name(key):<28} {count:>12,}  \u00b1{error:<8,} {count / max(report.snapshots, 1):>7.1%}")
+
+    print("\nChurny variables (value changes between consecutive records):")
+    for key, count, error in report.changes.top(args.top):
+        writes = report.writes.estimate(key)
+        print(f"    {name(key):<28} {count:>12,}  \u00b1{error:<8,} of ~{writes:,} records ({min(count / max(writes, 1), 1):.0%})")
+
+    print("\nType-unstable variables:")
+    unstable = report.type_changes.top(args.top)
+    if not unstable:
+        print("    (none)")
+    for key, count, error in unstable:
+        types = ", ".join(sorted(report.types.get(key, ())))
+        print(f"    {name(key):<28} {count:>12,}  \u00b1{error:<8,} {types}")
+
+    print("\nGrowing values (size increases; containers by element count, other values by length):")
+    # Oscillating values grow often too; rank by net growth so steadily growing ones come first
+    growing = [(key, count, error) + tuple(report.sizes.get(key, (0, 0, 0, 0)))
+               for key, count, error in report.growth.top(args.top * 4)]
+    growing.sort(key=lambda g: -(g[1] - g[6]))
+    for key, count, error, first, last, peak, decreases in growing[:args.top]:
+        trend = "never shrank" if not decreases and last == peak else f"shrank {decreases:,}x"
+        print(f"    {name(key):<28} {count:>12,}  \u00b1{error:<8,} size {first:,} -> {last:,} (max {peak:,}, {trend})")
+    return 0
+
+
+def cmd_tail(args):
+    pattern = re.compile(args.grep) if args.grep else None
+    last_flush = [time.monotonic()]
+
+    def on_row(producer, fields):
+        layout = producer.layout
+        if len(fields) < layout.width or (args.pid is not None and producer.pid != args.pid):
+            return
+        line, variable, value = (f.decode("utf-8", "replace") for f in
+                                 (fields[layout.line], fields[layout.variable], fields[layout.value]))
+        marker = variable.startswith("<") and variable.endswith(">")
+        if marker and args.no_markers:
+            return
+        if args.variable and not marker and not fnmatch.fnmatchcase(variable, args.variable):
+            return
+        if args.line is not None and line != args.line:
+            return
+        if pattern is not None and not marker and not pattern.search(value):
+            return
+        if marker:
+            print(f"[{producer.pid}] {line:>6}  -- {variable[1:-1]} {value}")
+        else:
+            print(f"[{producer.pid}] {line:>6}  {variable} = {value}")
+        now = time.monotonic()
+        if now - last_flush[0] > 0.1:
+            sys.stdout.flush()
+            last_flush[0] = now
+
+    def on_event(producer, kind, detail):
+        if kind == "connect":
+            print(f"[{producer.pid}] connected: {' '.join(producer.argv)}", file=sys.stderr)
+        elif kind == "dropped":
+            print(f"[{producer.pid}] ... {detail:,} rows dropped by the producer (collector too slow)", file=sys.stderr)
+        elif kind == "disconnect":
+            print(f"[{producer.pid}] disconnected after {producer.rows:,} rows ({producer.dropped:,} dropped)",
+                  file=sys.stderr)
+        elif kind == "error":
+            print(f"[{producer.pid}] dropped connection: {detail}", file=sys.stderr)
+        sys.stdout.flush()
+
+    print(f"[TAIL] Listening on {args.address}; run the instrumented program with AD_STREAM={args.address}",
+          file=sys.stderr)
+    try:
+        collect(args.address, on_row, on_event)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_convert(args):
+    inputs = find_traces(args.input) if os.path.isdir(args.input) else [args.input]
+    if not inputs:
+        print(f"No trace files found in: {args.input}", file=sys.stderr)
+        return 1
+    if args.output and len(inputs) > 1:
+        print("--output needs a single input file.", file=sys.stderr)
+        return 1
+    for path in inputs:
+        start = time.perf_counter()
+        output = args.output or os.path.splitext(path)[0] + ".schema.csv"
+        try:
+            count = write_schema_csv(path, output, args.format, args.jobs)
+        except ValueError as e:
+            print(f"[SKIP] {path}: {e}", file=sys.stderr)
+            continue
+        print(f"[FINISH] {path} -> {output}: {count:,} records in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 0
+
+
+def cmd_columnar(args):
+    start = time.perf_counter()
+    try:
+        trace = open_columns(args.trace, rebuild=args.rebuild, fmt=args.format, jobs=args.jobs)
+    except ValueError as e:
+        print(f"[ERROR] {args.trace}: {e}", file=sys.stderr)
+        return 1
+    with trace:
+        print(f"[COLUMNS] {len(trace):,} records in {trace.path} ({time.perf_counter() - start:.2f}s; "
+              f"aggregating with {'NumPy' if numpy is not None else 'pure Python, install NumPy to vectorize'})",
+              file=sys.stderr)
+        start = time.perf_counter()
+        hits = sorted(hits_per_line(trace).items(), key=lambda kv: -kv[1])[:args.top]
+        changes = sorted(changes_per_variable(trace).items(), key=lambda kv: -kv[1])[:args.top]
+        elapsed = time.perf_counter() - start
+        print("Hits per line:")
+        for line, count in hits:
+            print(f"    line {line:<23} {count:>12,} {count / max(len(trace), 1):>7.1%}")
+        print("\nChanges per variable:")
+        for variable, count in changes:
+            print(f"    {variable:<28} {count:>12,}")
+        print(f"[FINISH] Aggregated in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+
+def cmd_count(args):
+    try:
+        if detect_format(args.trace) != "csv":
+            print(f"{args.trace} is not a CSV trace; run `ad-trace convert` on it first.", file=sys.stderr)
+            return 1
+        start = time.perf_counter()
+        partials = map_ranges(args.trace, tally, args.jobs)
+    except ValueError as e:
+        print(f"[ERROR] {args.trace}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    records = sum(p["records"] for p in partials)
+    lines, variables = partials[0]["lines"], partials[0]["variables"]
+    for partial in partials[1:]:
+        lines.update(partial["lines"])
+        variables.update(partial["variables"])
+    size = os.path.getsize(args.trace)
+    print(f"[COUNT] {records:,} records in {elapsed:.2f}s over {len(partials)} ranges "
+          f"({records / max(elapsed, 1e-9):,.0f} rows/s, {size / max(elapsed, 1e-9) / 1e6:,.0f} MB/s)", file=sys.stderr)
+    print("Records per line:")
+    for (file, line), count in lines.most_common(args.top):
+        print(f"    {(file + ':' if file else 'line ') + str(line):<28} {count:>12,} {count / max(records, 1):>7.1%}")
+    print("\nRecords per variable:")
+    for variable, count in variables.most_common(args.top):
+        print(f"    {variable:<28} {count:>12,} {count / max(records, 1):>7.1%}")
+    return 0
+
+# ==========================================
+# 2. ENTRY POINT
+# ==========================================
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ad-trace", description="Tools for instrumented runs and their traces.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    remap = commands.add_parser("remap", help="Translate instrumented file/line locations back to the original source.")
+    remap.add_argument("sandbox", help="Instrumented project folder (contains the .admap files)")
+    remap.add_argument("input", nargs="?", help="Traceback/profile/coverage text (default: stdin)")
+    remap.add_argument("-o", "--output", help="Write here instead of stdout")
+    remap.add_argument("--pstats", action="store_true", help="Input is a binary cProfile dump")
+    remap.set_defaults(func=cmd_remap)
+
+    query = commands.add_parser("query", help="Look up variables in a _VARIABLE_TRACKER.csv through a sidecar index.")
+    query.add_argument("trace", help="Trace CSV (indexed to <trace>.adidx on first use)")
+    query.add_argument("--rebuild", action="store_true", help="Rebuild the index even if it looks current")
+    queries = query.add_subparsers(dest="query", required=True)
+    keys = queries.add_parser("keys", help="List recorded (line, variable) pairs with their record counts")
+    keys.add_argument("variable", nargs="?")
+    history = queries.add_parser("history", help="Every record of a variable, in step order")
+    history.add_argument("variable")
+    history.add_argument("--nth", type=int, help="Only the n-th record (1-based)")
+    history.add_argument("--from", dest="start", type=int, default=0, help="First step to include")
+    history.add_argument("--to", dest="stop", type=int, help="Stop before this step")
+    history.add_argument("--limit", type=int, default=50, help="Maximum records printed (default 50)")
+    at = queries.add_parser("at", help="The variable's last recorded value at or before a step")
+    at.add_argument("variable")
+    at.add_argument("step", type=int)
+    equals = queries.add_parser("equals", help="Steps where the variable was recorded with exactly this value")
+    equals.add_argument("variable")
+    equals.add_argument("value")
+    equals.add_argument("--limit", type=int, default=50, help="Maximum records printed (default 50)")
+    for sub in (history, at, equals):
+        sub.add_argument("--line", help="Only records from this line")
+        sub.add_argument("--file", help="Only records from this file (File-prefixed traces)")
+    keys.set_defaults(line=None, file=None)
+    query.set_defaults(func=cmd_query)
+
+    frames = commands.add_parser("frames", help="List the function calls recovered from a function-mode trace.")
+    frames.add_argument("trace")
+    frames.add_argument("--function", help="Only calls of this function")
+    frames.add_argument("--limit", type=int, default=200, help="Maximum frames printed (default 200)")
+    state = commands.add_parser("state", help="All locals of a frame at a step, rebuilt from the nearest checkpoint.")
+    state.add_argument("trace")
+    state.add_argument("step", type=int)
+    state.add_argument("--frame", type=int, help="Frame number (default: the frame that wrote the step)")
+    step = commands.add_parser("step", help="Step forward and backward through one call's history.")
+    step.add_argument("trace")
+    target = step.add_mutually_exclusive_group(required=True)
+    target.add_argument("--frame", type=int)
+    target.add_argument("--function", help="Step through a call of this function (see --call)")
+    step.add_argument("--call", type=int, default=1, help="Which call of --function (1-based, default 1)")
+    diff = commands.add_parser("diff", help="Align two traces and report where and in which variables they diverge.")
+    diff.add_argument("a", help="Trace of the good run")
+    diff.add_argument("b", help="Trace of the bad run")
+    diff.add_argument("--window", type=int, default=WINDOW_RECORDS,
+                      help=f"Records per side held in memory while aligning (default {WINDOW_RECORDS})")
+    diff.add_argument("--hunks", type=int, default=5, help="Hunks printed with their records (default 5)")
+    diff.add_argument("--variables", type=int, default=25, help="Diverging variables listed (default 25)")
+    diff.set_defaults(func=cmd_diff)
+
+    perfetto = commands.add_parser("perfetto", help="Export the timing marks of a run as Chrome/Perfetto trace-event JSON.")
+    perfetto.add_argument("timing", help="_TIMING.csv, or the sandbox folder of a run made with AD_TIMING=1")
+    perfetto.add_argument("-o", "--output", help="Output file; a .gz suffix compresses it (default: <timing>.trace.json)")
+    perfetto.add_argument("--min-line-us", type=float, default=0.0,
+                          help="Drop per-line slices shorter than this many microseconds")
+    perfetto.set_defaults(func=cmd_perfetto)
+
+    report = commands.add_parser("report", help="One streaming pass: hot lines, churny variables, type changes, growth.")
+    report.add_argument("trace")
+    report.add_argument("--top", type=int, default=15, help="Entries per section (default 15)")
+    report.add_argument("--capacity", type=int, default=SKETCH_CAPACITY,
+                        help=f"Keys monitored per sketch; more is slower but tighter (default {SKETCH_CAPACITY})")
+    report.set_defaults(func=cmd_report)
+
+    tail = commands.add_parser("tail", help="Collect and print trace rows streamed live by runs made with AD_STREAM.")
+    tail.add_argument("address", nargs="?", default="unix:/tmp/ad-trace.sock",
+                      help="unix:/path or tcp:host:port to listen on (default unix:/tmp/ad-trace.sock)")
+    tail.add_argument("--variable", help="Only variables matching this glob")
+    tail.add_argument("--line", help="Only rows from this line")
+    tail.add_argument("--grep", help="Only values matching this regular expression")
+    tail.add_argument("--pid", type=int, help="Only rows from this process")
+    tail.add_argument("--no-markers", action="store_true", help="Hide <enter>/<exit>/<iteration> rows")
+    tail.set_defaults(func=cmd_tail)
+
+    convert = commands.add_parser("convert", help="Rewrite a trace from before the runtimes wrote the common "
+                                                  "File,Line,Seq,Thread,Variable,Type,Value schema in that schema.")
+    convert.add_argument("input", help="A trace file, or a sandbox folder to convert every trace file in")
+    convert.add_argument("-o", "--output", help="Output CSV (default: <input>.schema.csv)")
+    convert.add_argument("--format", choices=["csv", "java", "clojure", "bash"], help="Skip format detection")
+    convert.add_argument("--jobs", type=int, default=1, help="Processes parsing CSV traces (0: one per CPU; default 1)")
+    convert.set_defaults(func=cmd_convert)
+
+    columnar = commands.add_parser("columnar", help="Convert a trace into memory-mappable column files and "
+                                                    "print per-line hits and per-variable changes from them.")
+    columnar.add_argument("trace", help="A trace file (converted to <trace>.adcol when missing or stale), or an .adcol folder")
+    columnar.add_argument("--top", type=int, default=15, help="Entries per section (default 15)")
+    columnar.add_argument("--format", choices=["csv", "java", "clojure", "bash"], help="Skip format detection")
+    columnar.add_argument("--rebuild", action="store_true", help="Convert again even if the columns are fresh")
+    columnar.add_argument("--jobs", type=int, default=1, help="Processes parsing CSV traces (0: one per CPU; default 1)")
+    columnar.set_defaults(func=cmd_columnar)
+
+    count = commands.add_parser("count", help="Count records per line and per variable, parsing byte ranges "
+                                              "of a CSV trace in parallel.")
+    count.add_argument("trace")
+    count.add_argument("--jobs", type=int, default=0, help="Worker processes (default 0: one per CPU)")
+    count.add_argument("--top", type=int, default=15, help="Entries per section (default 15)")
+    count.set_defaults(func=cmd_count)
+
+    for sub, func in ((frames, cmd_frames), (state, cmd_state), (step, cmd_step)):
+        sub.add_argument("--interval", type=int, default=CHECKPOINT_INTERVAL,
+                         help=f"Records between checkpoints (default {CHECKPOINT_INTERVAL})")
+        sub.add_argument("--rebuild", action="store_true", help="Rebuild the index and checkpoints")
+        sub.set_defaults(func=func)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========================================
+# 1. THE CORPORA (Synthetic sources with nesting, strings and brackets that fool naive scanners)
+# ==========================================
+# Each chunk is repeated with {n} replaced until the requested line count is reached
+CHUNKS = {
+    "python": ('.py', '''
+class Widget_{n}:
+    """Docstring with (brackets] and {braces} that are not code."""
+    def __init__(self, items):
+        self.items = [x for x in items if x % 2]  # comment (with an open paren
+        self.lookup = {"key_{n}": [1, 2, {"deep": (3, 4)}], 'q': "it's [not] code"}
+
+    def run(self, limit):
+        total = 0
+        for i in range(limit):
+            if i % 3 == 0:
+                while total < i:
+                    total += len("[{n}]")
+            elif i > 10:
+                try:
+                    total -= self.lookup["key_{n}"][0]
+                except KeyError:
+                    pass
+        return total
+
+w_{n} = Widget_{n}(range(5))
+result_{n} = w_{n}.run(20)
+'''),
+    "c": ('.c', '''
+/* block comment with { unbalanced brace */
+struct point_{n} { int x; int y; };
+
+static int walk_{n}(const int *values, int count) {
+    int total = 0;
+    const char *label = "braces { in } strings";
+    for (int i = 0; i < count; i++) {
+        if (values[i] % 2 == 0) {
+            while (total < i) {
+                total += (int)sizeof(struct point_{n});
+            }
+        } else if (values[i] > 10) {
+            total -= values[i]; // trailing comment }
+        }
+    }
+    return total + (label[0] == '{');
+}
+'''),
+    "cpp": ('.cpp', '''
+namespace bench_{n} {
+template <typename T>
+class Accumulator {
+public:
+    explicit Accumulator(std::vector<T> items) : items_(std::move(items)) {}
+    T run(int limit) {
+        T total{};
+        std::string note = "template<args> and {braces}";
+        for (int i = 0; i < limit; ++i) {
+            if (i % 3 == 0) {
+                auto add = [&](T v) { total += v; };
+                add(items_[i % items_.size()]);
+            } else {
+                total -= static_cast<T>(note.size()); /* { */
+            }
+        }
+        return total;
+    }
+private:
+    std::vector<T> items_;
+};
+}  // namespace bench_{n}
+'''),
+    "javascript": ('.js', '''
+function widget_{n}(items) {
+    const lookup = { key: [1, 2, { deep: [3, 4] }], label: "braces { in } strings" };
+    let total = 0;
+    for (let i = 0; i < items.length; i++) {
+        if (items[i] % 2 === 0) {
+            const add = (v) => { total += v; };
+            add(lookup.key[0]);
+        } else {
+            total -= `${items[i]}}`.length; // template literal with a stray }
+        }
+    }
+    return total;
+}
+const result_{n} = widget_{n}([1, 2, 3, 4]);
+'''),
+    "go": ('.go', '''
+func walk_{n}(values []int) (int, error) {
+	total := 0
+	label := "braces { in } strings"
+	for i, v := range values {
+		if v%2 == 0 {
+			total = total + i
+		} else {
+			switch {
+			case v > 10:
+				total = total - len(label)
+			}
+		}
+	}
+	if err := check_{n}(total); err != nil {
+		return 0, err
+	}
+	return total, nil
+}
+
+func check_{n}(v int) error { return nil }
+'''),
+    "ruby": ('.rb', '''
+class Widget_{n}
+  def initialize(items)
+    @items = items.select { |x| x.odd? }
+    @lookup = { "key" => [1, 2, { deep: [3, 4] }], "label" => "do ... end in a string" }
+  end
+
+  def run(limit)
+    total = 0
+    limit.times do |i|
+      if i % 3 == 0
+        total += @lookup["key"][0]
+      elsif i > 10
+        total -= "#{i}".length
+      end
+    end
+    total
+  end
+end
+result_{n} = Widget_{n}.new([1, 2, 3]).run(20)
+'''),
+}
+
+# Files need a module/package prologue for some injectors to treat them as real sources
+PROLOGUES = {"go": "package main\n", "cpp": "#include <string>\n#include <vector>\n"}
+
+# language -> (runner script, runner function) timed as a whole-project build
+RUNNERS = {
+    "python": ("debugger_application.py", "process_project"),
+    "c": ("generate_c_header", "process_c_project"),
+    "cpp": ("AdDebugLogger.py", "process_cpp_project"),
+    "javascript": ("generate_js_header", "process_js_project"),
+    "go": ("generate_go_debug_util", "process_go_project"),
+    "ruby": ("inject_into_ruby", "process_ruby_project"),
+}
+SIZES = (1000, 10000, 100000)
+LINES_PER_PROJECT_FILE = 1000
+
+
+def build_corpus(path, language, lines):
+    """Writes at least `lines` lines of synthetic `language` source; returns (lines, bytes) written."""
+    chunk = CHUNKS[language][1]
+    chunk_lines = chunk.count("\n")
+    written, n = 0, 0
+    with open(path, "w", encoding="utf-8", newline="\n") as f:
+        prologue = PROLOGUES.get(language, "")
+        f.write(prologue)
+        written += prologue.count("\n")
+        while written < lines:
+            f.write(chunk.replace("{n}", str(n)))
+            written += chunk_lines
+            n += 1
+    return written, os.path.getsize(path)
+
+
+def build_project(source_dir, language, lines):
+    """Splits the corpus into files of LINES_PER_PROJECT_FILE lines, like a real project would be."""
+    ext = CHUNKS[language][0]
+    os.makedirs(source_dir, exist_ok=True)
+    total_lines = total_bytes = 0
+    for i in range(max(1, lines // LINES_PER_PROJECT_FILE)):
+        sub = os.path.join(source_dir, f"pkg_{i // 10}")
+        os.makedirs(sub, exist_ok=True)
+        file_lines, file_bytes = build_corpus(os.path.join(sub, f"module_{i}{ext}"), language,
+                                              min(lines, LINES_PER_PROJECT_FILE))
+        total_lines += file_lines
+        total_bytes += file_bytes
+    return total_lines, total_bytes
+
+# ==========================================
+# 2. THE RUNNERS (Every measurement in its own interpreter, so peak RSS is per measurement)
+# ==========================================
+INJECTOR_RUNNER = r'''
+import contextlib, io, resource, sys, time
+sys.path.insert(0, {repo!r})
+from polyglot_driver import PLUGINS
+plugin = PLUGINS[{language!r}]
+module = plugin.load()
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    ok = plugin.handler(module, {src!r}, {dst!r}, {depth!r}, {work_dir!r}) is not False
+elapsed = time.perf_counter() - start
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed, int(ok))
+'''
+
+PROJECT_RUNNER = r'''
+import contextlib, inspect, io, resource, sys, time
+sys.path.insert(0, {repo!r})
+from polyglot_driver import Plugin
+runner = getattr(Plugin("bench", {script!r}, None, ()).load(), {function!r})
+args = ({source_dir!r}, {depth!r}) if "max_depth" in inspect.signature(runner).parameters else ({source_dir!r},)
+start = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    runner(*args)
+elapsed = time.perf_counter() - start
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed, 1)
+'''
+
+
+def _run(code):
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True,
+                         stdin=subprocess.DEVNULL).stdout
+    peak_kb, elapsed, ok = out.split()[-3:]
+    return int(peak_kb) * 1024, float(elapsed), ok == "1"
+
+
+def _tree_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def measure_injector(language, lines, work_dir, depth=3, repeats=3):
+    ext = CHUNKS[language][0]
+    src = os.path.join(work_dir, f"_bench_source{ext}")
+    dst = os.path.join(work_dir, "out", f"_bench_source{ext}")
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    source_lines, source_bytes = build_corpus(src, language, lines)
+    repo = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeats):
+        peak, elapsed, ok = _run(INJECTOR_RUNNER.format(repo=repo, language=language, src=src, dst=dst,
+                                                        depth=depth, work_dir=os.path.dirname(dst)))
+        if best is None or elapsed < best[1]:
+            best = (peak, elapsed, ok)
+    peak, elapsed, ok = best
+    return {"lines": source_lines, "source_bytes": source_bytes, "seconds": elapsed,
+            "lines_per_sec": source_lines / elapsed if elapsed else None, "peak_rss": peak,
+            "output_bytes": os.path.getsize(dst), "expansion": os.path.getsize(dst) / source_bytes, "ok": ok}
+
+
+def measure_runner(language, lines, work_dir, depth=3, repeats=3):
+    script, function = RUNNERS[language]
+    parent = os.path.join(work_dir, "runner")
+    source_dir = os.path.join(parent, "project")
+    source_lines, source_bytes = build_project(source_dir, language, lines)
+    repo = os.path.dirname(os.path.abspath(__file__))
+    best, output_bytes = None, 0
+    for _ in range(repeats):
+        peak, elapsed, ok = _run(PROJECT_RUNNER.format(repo=repo, script=script, function=function,
+                                                       source_dir=source_dir, depth=depth))
+        # Runners create "<project>_<LANG>_DEBUG_<stamp>" siblings; measure and clear them between repeats
+        for name in os.listdir(parent):
+            sandbox = os.path.join(parent, name)
+            if name != "project":
+                output_bytes = _tree_bytes(sandbox)
+                shutil.rmtree(sandbox)
+        if best is None or elapsed < best[1]:
+            best = (peak, elapsed, ok)
+    shutil.rmtree(source_dir)
+    peak, elapsed, ok = best
+    return {"lines": source_lines, "source_bytes": source_bytes, "seconds": elapsed,
+            "lines_per_sec": source_lines / elapsed if elapsed else None, "peak_rss": peak,
+            "output_bytes": output_bytes, "expansion": output_bytes / source_bytes, "ok": ok}
+
+# ==========================================
+# 3. THE SUITE (JSON results, comparable across commits)
+# ==========================================
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _print_row(kind, language, lines, row):
+    status = "" if row["ok"] else "  [FAILED]"
+    print(f"    {kind:<9}{language:<12}{lines:>8,} lines {row['lines_per_sec'] or 0:>12,.0f} lines/sec  "
+          f"peak {row['peak_rss'] / 1048576:>7,.1f} MB  x{row['expansion']:.2f} size{status}")
+
+
+def benchmark_injectors(languages=None, sizes=SIZES, depth=3, repeats=3, runners=True):
+    results = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+               "timestamp": int(time.time()), "depth": depth, "repeats": repeats, "injectors": {}, "runners": {}}
+    for language in languages or CHUNKS:
+        for lines in sizes:
+            key = f"{language}/{lines}"
+            with tempfile.TemporaryDirectory() as work_dir:
+                try:
+                    results["injectors"][key] = row = measure_injector(language, lines, work_dir, depth, repeats)
+                    _print_row("inject", language, lines, row)
+                except subprocess.CalledProcessError as e:
+                    results["injectors"][key] = {"error": e.stderr.strip().splitlines()[-1]}
+                    print(f"    inject   {language:<12}{lines:>8,} lines  [ERROR] {results['injectors'][key]['error']}")
+                if runners and language in RUNNERS:
+                    try:
+                        results["runners"][key] = row = measure_runner(language, lines, work_dir, depth, repeats)
+                        _print_row("runner", language, lines, row)
+                    except subprocess.CalledProcessError as e:
+                        results["runners"][key] = {"error": e.stderr.strip().splitlines()[-1]}
+                        print(f"    runner   {language:<12}{lines:>8,} lines  [ERROR] {results['runners'][key]['error']}")
+    return results
+
+
+def compare_results(old, new, threshold=0.10):
+    """Prints throughput/memory changes versus an earlier results file; returns the regressed keys."""
+    regressions = []
+    print(f"\n    Comparing {old.get('commit')} -> {new.get('commit')} (regression threshold {threshold:.0%})")
+    for kind in ("injectors", "runners"):
+        for key, row in sorted(new[kind].items()):
+            before = old.get(kind, {}).get(key)
+            if not before or "error" in before or "error" in row:
+                continue
+            speed = row["lines_per_sec"] / before["lines_per_sec"]
+            memory = row["peak_rss"] / before["peak_rss"]
+            flag = ""
+            if speed < 1 - threshold or memory > 1 + threshold:
+                flag = "  [REGRESSION]"
+                regressions.append(f"{kind}:{key}")
+            print(f"    {kind[:-1]:<9}{key:<20} speed x{speed:.2f}  memory x{memory:.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Time every injector and project runner on synthetic corpora.")
+        parser.add_argument("--languages", help=f"Comma-separated subset of {','.join(CHUNKS)}")
+        parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="Comma-separated line counts")
+        parser.add_argument("--depth", type=int, default=3)
+        parser.add_argument("--repeats", type=int, default=3, help="Best-of-N runs per measurement")
+        parser.add_argument("--no-runners", action="store_true", help="Only time the single-file injectors")
+        parser.add_argument("--output", default="bench_injectors.json", help="Results file (default bench_injectors.json)")
+        parser.add_argument("--compare", metavar="JSON", help="Earlier results file to compare against")
+        parser.add_argument("--threshold", type=float, default=0.10, help="Slowdown/memory growth flagged as regression")
+        args = parser.parse_args()
+        languages = args.languages.split(",") if args.languages else None
+        sizes = [int(s) for s in args.sizes.split(",")]
+        depth, repeats, runners, output = args.depth, args.repeats, not args.no_runners, args.output
+        compare, threshold = args.compare, args.threshold
+    else:
+        languages = [x.strip() for x in input(f"Languages ({','.join(CHUNKS)}; blank for all): ").split(",") if x.strip()] or None
+        try:
+            sizes = [int(s) for s in (input("Line counts (default 1000,10000,100000): ").strip() or "1000,10000,100000").split(",")]
+        except:
+            sizes = list(SIZES)
+        depth, repeats, runners, output, threshold = 3, 3, True, "bench_injectors.json", 0.10
+        compare = input("Earlier results file to compare against (blank to skip): ").strip().strip('"') or None
+
+    print(f"\n[START] Benchmarking injectors ({', '.join(f'{s:,}' for s in sizes)} lines)...")
+    start = time.perf_counter()
+    results = benchmark_injectors(languages, sizes, depth, repeats, runners)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if compare:
+        with open(compare, encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), results, threshold)
+        print(f"    [RESULT] {len(regressions)} regression(s){': ' + ', '.join(regressions) if regressions else ''}")
+    print(f"[FINISH] Results written to {output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,255 @@
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_injectors import git_commit
+from debugger_application import LOG_FILES, inject_into_file
+
+# ==========================================
+# 1. THE WORKLOADS (Small programs exercising the runtime's hot paths; {scale} sets their size)
+# ==========================================
+WORKLOADS = {
+    "cpu_loops": '''
+def collatz(n):
+    steps = 0
+    while n != 1:
+        if n % 2 == 0:
+            n = n // 2
+        else:
+            n = 3 * n + 1
+        steps += 1
+    return steps
+
+best = 0
+for i in range(1, {scale} * 60):
+    s = collatz(i)
+    if s > best:
+        best = s
+print("longest chain", best)
+''',
+    "recursion": '''
+from collections import Counter
+
+WORDS = ["stop", "pots", "tops", "opts", "post", "spot", "on", "no", "so", "to", "top", "pot", "sop", "opt", "os"]
+
+def find_anagrams(phrase, max_words):
+    target_count = Counter(phrase.replace(" ", ""))
+    candidates = [w for w in WORDS if not Counter(w) - target_count]
+    found_hashes = set()
+
+    def backtrack(path, pool):
+        if sum(pool.values()) == 0:
+            found_hashes.add(tuple(sorted(path)))
+            return
+        if len(path) >= max_words:
+            return
+        for word in candidates:
+            if len(word) > sum(pool.values()):
+                continue
+            w_count = Counter(word)
+            if all(pool[c] >= w_count[c] for c in w_count):
+                backtrack(path + [word], pool - w_count)
+
+    for root in candidates:
+        backtrack([root], target_count - Counter(root))
+    return found_hashes
+
+for _ in range(max(1, {scale} // 5)):
+    result = find_anagrams("stop spot", 3)
+print("anagrams", len(result))
+''',
+    "io": '''
+import os
+
+path = "_bench_io.txt"
+with open(path, "w", encoding="utf-8") as f:
+    for i in range({scale} * 200):
+        f.write(f"row {i},{i * i}\\n")
+total = 0
+with open(path, encoding="utf-8") as f:
+    for line in f:
+        total += int(line.split(",")[1])
+os.remove(path)
+print("checksum", total)
+''',
+    "threads": '''
+import threading
+
+lock = threading.Lock()
+counts = [0]
+
+def worker(n):
+    local = 0
+    for i in range(n):
+        local += i % 7
+    with lock:
+        counts[0] += local
+
+threads = [threading.Thread(target=worker, args=({scale} * 1000,)) for _ in range(4)]
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+print("total", counts[0])
+''',
+    "asyncio": '''
+import asyncio
+
+async def producer(queue, n):
+    for i in range(n):
+        await queue.put(i)
+    await queue.put(None)
+
+async def consumer(queue):
+    total = 0
+    while True:
+        item = await queue.get()
+        if item is None:
+            return total
+        total += item
+
+async def main():
+    queue = asyncio.Queue(maxsize=100)
+    results = await asyncio.gather(producer(queue, {scale} * 200), consumer(queue))
+    return results[1]
+
+print("sum", asyncio.run(main()))
+''',
+}
+
+# Instrumentation modes of the Python injector, and the AD_SINK_BUFFER setting of each sink mode
+MODES = {"statements": (False, False), "loops": (True, False), "functions": (False, True)}
+SINKS = {"buffered": str(1 << 16), "line": "1"}
+
+# ==========================================
+# 2. THE RUNNER (Import + run + atexit flush are timed; interpreter startup is not)
+# ==========================================
+LAUNCHER = r'''
+import atexit, os, runpy, sys, time, traceback
+sys.argv = [{script!r}]
+ok = 1
+start = time.perf_counter()
+try:
+    runpy.run_path({script!r}, run_name="__main__")
+except BaseException:
+    ok = 0
+    traceback.print_exc()
+atexit._run_exitfuncs()
+elapsed = time.perf_counter() - start
+with open("_bench_result.txt", "w", encoding="utf-8") as f:
+    f.write(f"{{elapsed!r}} {{ok}}")
+os._exit(0)
+'''
+
+
+def _count_rows(path):
+    # Strict UTF-8 and csv parsing: a trace corrupted by the runtime fails the run instead of being counted
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return max(0, sum(1 for _ in csv.reader(f, strict=True)) - 1)
+
+
+def run_once(work_dir, script, sink=None):
+    """Runs one workload script in a fresh interpreter; returns (seconds, rows, trace bytes)."""
+    for f_name in LOG_FILES:
+        if os.path.exists(os.path.join(work_dir, f_name)):
+            os.remove(os.path.join(work_dir, f_name))
+    env = dict(os.environ)
+    if sink is not None:
+        env["AD_SINK_BUFFER"] = SINKS[sink]
+    proc = subprocess.run([sys.executable, "-c", LAUNCHER.format(script=script)], cwd=work_dir, env=env,
+                          stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    with open(os.path.join(work_dir, "_bench_result.txt"), encoding="utf-8") as f:
+        elapsed, ok = f.read().split()
+    if ok != "1":
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "workload failed")
+    rows = (_count_rows(os.path.join(work_dir, "_VARIABLE_TRACKER.csv")) +
+            _count_rows(os.path.join(work_dir, "_LOOP_SUMMARY.csv")))
+    trace_bytes = sum(os.path.getsize(os.path.join(work_dir, n)) for n in LOG_FILES
+                      if os.path.exists(os.path.join(work_dir, n)))
+    return float(elapsed), rows, trace_bytes
+
+
+def best_of(repeats, work_dir, script, sink=None):
+    runs = [run_once(work_dir, script, sink) for _ in range(repeats)]
+    return min(runs, key=lambda r: r[0])
+
+# ==========================================
+# 3. THE HARNESS (Original vs instrumented at every depth, mode and sink)
+# ==========================================
+def benchmark_overhead(workloads=None, depths=(1, 3), modes=("statements",), sinks=tuple(SINKS), scale=100,
+                       repeats=3):
+    results = {"commit": git_commit(), "python": platform.python_version(), "platform": platform.platform(),
+               "timestamp": int(time.time()), "scale": scale, "repeats": repeats, "workloads": {}}
+    for name in workloads or WORKLOADS:
+        source = WORKLOADS[name].replace("{scale}", str(scale))
+        with tempfile.TemporaryDirectory() as work_dir:
+            original = os.path.join(work_dir, "original.py")
+            with open(original, "w", encoding="utf-8") as f:
+                f.write(source)
+            base, _, _ = best_of(repeats, work_dir, original)
+            rows_out = results["workloads"][name] = {"original_seconds": base, "runs": {}}
+            print(f"    {name:<11} original {base * 1000:>9.1f} ms")
+
+            for mode in modes:
+                loop_mode, function_mode = MODES[mode]
+                for depth in depths:
+                    script = os.path.join(work_dir, f"instrumented_{mode}_{depth}.py")
+                    with open(script, "w", encoding="utf-8") as f:
+                        f.write(source)
+                    inject_into_file(script, depth, loop_mode=loop_mode, function_mode=function_mode)
+                    for sink in sinks:
+                        key = f"{mode}/depth{depth}/{sink}"
+                        try:
+                            elapsed, rows, trace_bytes = best_of(repeats, work_dir, script, sink)
+                        except RuntimeError as e:
+                            rows_out["runs"][key] = {"error": str(e)}
+                            print(f"        {key:<28} [ERROR] {e}")
+                            continue
+                        per_record = (elapsed - base) / rows * 1e9 if rows else None
+                        rows_out["runs"][key] = {"seconds": elapsed, "slowdown": elapsed / base, "rows": rows,
+                                                 "bytes": trace_bytes, "ns_per_record": per_record}
+                        print(f"        {key:<28} {elapsed * 1000:>9.1f} ms  x{elapsed / base:>7.2f}  "
+                              f"{rows:>10,} rows  {trace_bytes / 1048576:>8.2f} MB  "
+                              f"{'-' if per_record is None else f'{per_record:,.0f}':>8} ns/record")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Measure how much slower instrumented programs run.")
+        parser.add_argument("--workloads", help=f"Comma-separated subset of {','.join(WORKLOADS)}")
+        parser.add_argument("--depths", default="1,3", help="Comma-separated max_depth values (default 1,3)")
+        parser.add_argument("--modes", default="statements", help=f"Comma-separated subset of {','.join(MODES)}")
+        parser.add_argument("--sinks", default=",".join(SINKS), help=f"Comma-separated subset of {','.join(SINKS)}")
+        parser.add_argument("--scale", type=int, default=100, help="Workload size multiplier (default 100)")
+        parser.add_argument("--repeats", type=int, default=3, help="Best-of-N runs per measurement")
+        parser.add_argument("--output", help="Also write the results as JSON")
+        args = parser.parse_args()
+        workloads = args.workloads.split(",") if args.workloads else None
+        depths = [int(d) for d in args.depths.split(",")]
+        modes, sinks = args.modes.split(","), args.sinks.split(",")
+        scale, repeats, output = args.scale, args.repeats, args.output
+    else:
+        workloads = [x.strip() for x in input(f"Workloads ({','.join(WORKLOADS)}; blank for all): ").split(",") if x.strip()] or None
+        try:
+            depths = [int(d) for d in (input("Max depths (default 1,3): ").strip() or "1,3").split(",")]
+        except:
+            depths = [1, 3]
+        modes = [x.strip() for x in input(f"Modes ({','.join(MODES)}; default statements): ").split(",") if x.strip()] or ["statements"]
+        sinks, scale, repeats, output = list(SINKS), 100, 3, None
+
+    print(f"\n[START] Benchmarking instrumented runtime overhead (scale {scale})...")
+    start = time.perf_counter()
+    results = benchmark_overhead(workloads, depths, modes, sinks, scale, repeats)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(f"[FINISH] Benchmark completed in {time.perf_counter() - start:.1f}s")
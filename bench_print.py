@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from debugger_application import generate_header, write_runtime
+
+# ==========================================
+# 1. THE WORKLOAD (Chatty program driving the patched print)
+# ==========================================
+WORKLOADS = {
+    "print": 'print("iteration", _bench_i, "of", {count})',
+    "progress": "sys.stdout.write(f'\\rProgress: {{(_bench_i / {count}) * 100:.1f}}% ')",
+}
+
+
+def build_workload(count, with_header=True, style="print"):
+    statement = WORKLOADS[style].format(count=count)
+    body = f"""
+import sys
+import time as _bench_time
+_bench_start = _bench_time.perf_counter()
+for _bench_i in range({count}):
+    {statement}
+_bench_elapsed = _bench_time.perf_counter() - _bench_start
+with open("_bench_result.txt", "w", encoding="utf-8") as _bench_f:
+    _bench_f.write(repr(_bench_elapsed))
+"""
+    return (generate_header() if with_header else "") + body
+
+# ==========================================
+# 2. THE RUNNER (Isolated interpreter per measurement)
+# ==========================================
+def run_workload(count, with_header=True, style="print"):
+    with tempfile.TemporaryDirectory() as work_dir:
+        script = os.path.join(work_dir, "_bench_print.py")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(build_workload(count, with_header, style))
+        if with_header:
+            write_runtime(work_dir)
+        subprocess.run([sys.executable, script], cwd=work_dir, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(os.path.join(work_dir, "_bench_result.txt"), encoding="utf-8") as f:
+            elapsed = float(f.read())
+        log_bytes = sum(os.path.getsize(os.path.join(work_dir, n))
+                        for n in ("_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt")
+                        if os.path.exists(os.path.join(work_dir, n)))
+    return elapsed, log_bytes
+
+
+def benchmark_print(count=200000, repeats=3):
+    results = {}
+    for style in WORKLOADS:
+        for label, with_header in ((f"plain {style}", False), (f"patched {style}", True)):
+            best, log_bytes = None, 0
+            for _ in range(repeats):
+                elapsed, log_bytes = run_workload(count, with_header, style)
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = (best, log_bytes)
+            print(f"    {label:<17} {count / best:>12,.0f} calls/sec  ({best:.3f}s, {log_bytes:,} log bytes)")
+
+        slowdown = results[f"patched {style}"][0] / results[f"plain {style}"][0]
+        print(f"    [RESULT] Patched {style} costs {slowdown:.2f}x the plain call to a discarded stdout.\n")
+    return results
+
+
+if __name__ == "__main__":
+    try:
+        n = int(input("Print calls per run (default 200000): ").strip() or 200000)
+    except:
+        n = 200000
+    print(f"\n[START] Benchmarking patched print throughput ({n:,} calls)...")
+    start = time.perf_counter()
+    benchmark_print(n)
+    print(f"[FINISH] Benchmark completed in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# ==========================================
+# 1. THE CORPUS (Synthetic source file of a requested size)
+# ==========================================
+CHUNK = '''
+def step_{n}(values):
+    total = 0
+    for v in values:
+        if v % 3 == 0:
+            total += v
+    return total
+
+data_{n} = [i for i in range(10)]
+result_{n} = step_{n}(data_{n})
+'''
+
+
+def build_corpus(path, size_mb):
+    target = size_mb * 1024 * 1024
+    written, n = 0, 0
+    with open(path, "w", encoding="utf-8", buffering=1 << 20) as f:
+        while written < target:
+            chunk = CHUNK.format(n=n)
+            f.write(chunk)
+            written += len(chunk)
+            n += 1
+    return written
+
+# ==========================================
+# 2. THE RUNNER (Peak RSS of each injector in its own interpreter)
+# ==========================================
+# The whole-file injector holds the source and its output in memory several times over; past this
+# size it would exhaust RAM instead of measuring anything, so only the streaming injector runs
+WHOLE_FILE_MAX_MB = int(os.environ.get("AD_BENCH_WHOLE_MAX_MB", 256))
+
+RUNNER = r'''
+import shutil, sys, time
+try:
+    import resource
+except ImportError:  # Windows: no rusage, so Python allocations via tracemalloc stand in for RSS
+    resource = None
+    import tracemalloc
+    tracemalloc.start()
+sys.path.insert(0, {repo!r})
+from debugger_application import inject_into_file, stream_inject_file
+start = time.perf_counter()
+if {mode!r} == "stream":
+    stream_inject_file({src!r}, {dst!r}, source_path={src!r})
+else:
+    shutil.copyfile({src!r}, {dst!r})
+    inject_into_file({dst!r}, source_path={src!r})
+elapsed = time.perf_counter() - start
+if resource is not None:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+else:
+    peak = tracemalloc.get_traced_memory()[1]
+print(peak, elapsed)
+'''
+
+
+def measure(mode, src, work_dir):
+    dst = os.path.join(work_dir, f"_bench_{mode}.py")
+    code = RUNNER.format(repo=os.path.dirname(os.path.abspath(__file__)), mode=mode, src=src, dst=dst)
+    out = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True).stdout
+    peak, elapsed = out.split()[-2:]
+    output_bytes = os.path.getsize(dst)
+    for leftover in (dst, dst + ".admap"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    return int(peak), float(elapsed), output_bytes
+
+
+def benchmark_streaming(size_mb=1024):
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        src = os.path.join(work_dir, "_bench_source.py")
+        source_bytes = build_corpus(src, size_mb)
+        print(f"    Source: {source_bytes / 1048576:,.0f} MB")
+        for mode in ("whole", "stream"):
+            if mode == "whole" and size_mb > WHOLE_FILE_MAX_MB:
+                print(f"    whole   skipped: sources over {WHOLE_FILE_MAX_MB:,} MB exhaust memory "
+                      f"(raise AD_BENCH_WHOLE_MAX_MB to run it)")
+                continue
+            peak, elapsed, output_bytes = measure(mode, src, work_dir)
+            results[mode] = (peak, elapsed)
+            print(f"    {mode:<7} peak RSS {peak / 1048576:>9,.1f} MB  "
+                  f"({elapsed:.1f}s, {source_bytes / 1048576 / elapsed:,.1f} MB/s, {output_bytes / 1048576:,.0f} MB out)")
+    if "whole" in results:
+        print(f"    [RESULT] Streaming peaks at {results['stream'][0] / results['whole'][0]:.1%} of the whole-file injector's memory.\n")
+    else:
+        print(f"    [RESULT] Streaming peaks at {results['stream'][0] / 1048576:,.1f} MB for a {size_mb:,} MB source.\n")
+    return results
+
+
+if __name__ == "__main__":
+    try:
+        mb = int(input("Synthetic source size in MB (default 1024): ").strip() or 1024)
+    except:
+        mb = 1024
+    print(f"\n[START] Benchmarking injector peak memory ({mb:,} MB source)...")
+    start = time.perf_counter()
+    benchmark_streaming(mb)
+    print(f"[FINISH] Benchmark completed in {time.perf_counter() - start:.1f}s")
@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 def generate_header():
     """
     Returns a unified header to inject at the top of Scala/Chisel files
@@ -103,16 +105,14 @@ def inject_into_file(file_path, max_depth=3):
         print(f"Injection Error on {file_path}: {e}")
         return False
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_CHISEL_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
         
     print(f"\n[START] Building instrumented Chisel project layout...")
-    for root, _, files in os.walk(source_dir):
-        # Ignore common build artifacts and configuration targets
-        if any(x in root for x in ['target', '.git', '.bsp', '.metals', 'project']):
-            continue
+    # Ignore common build artifacts and configuration targets
+    for root, files in walk_project(source_dir, skip_dirs=['target', '.git', '.bsp', '.metals', 'project'], include=include, exclude=exclude):
         for file in files:
             # Chisel modules are authored within Scala files
             if file.endswith(".scala"):
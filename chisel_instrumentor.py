@@ -3,6 +3,8 @@ import shutil
 import time
 from pathlib import Path
 
+from project_walker import walk_project
+
 
 def generate_header():
     # Added Universal IDE Modelines to force the editor engine to lock to spaces.
@@ -198,7 +200,7 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     src_path = Path(source_dir).resolve()
     target_dir = src_path.parent / f"{src_path.name}_DEBUG_STATE_{int(time.time())}"
     
@@ -207,10 +209,8 @@ def process_project(source_dir, max_depth):
     
     ignore_dirs = {'venv', '.git', '__pycache__'}
     
-    for root, dirs, files in os.walk(src_path):
-        # Mutate dirs list in-place so os.walk skips ignored directories immediately
-        dirs[:] = [d for d in dirs if d not in ignore_dirs]
-        
+    # walk_project prunes ignored directories before descending into them
+    for root, files in walk_project(str(src_path), skip_dirs=ignore_dirs, include=include, exclude=exclude):
         for file in files:
             if file.endswith(".py"):
                 src_file = Path(root) / file
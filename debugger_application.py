@@ -1,221 +1,1615 @@
+import argparse
+import ast
 import os
+import re
 import shutil
+import signal
+import subprocess
+import sys
+import tempfile
 import time
+import tokenize
+from collections import deque
+
+from project_walker import PYTHON_ENV_DIRS, walk_project
+from project_watcher import watch_project
+from source_map import MAP_SUFFIX, SourceMap, map_path_for, spans_from_block_sizes, write_source_map
+
+# Files at least this large are streamed instead of being read into memory whole
+STREAM_THRESHOLD_BYTES = int(os.environ.get("AD_STREAM_THRESHOLD", 64 * 1024 * 1024))
+PROJECT_SKIP_DIRS = PYTHON_ENV_DIRS + ['.git', '__pycache__']
+
+
+RUNTIME_MODULE = "_ad_runtime"
 
 
-def generate_header():
+def generate_header(runtime_dir="."):
     # Added Universal IDE Modelines to force the editor engine to lock to spaces.
-    # The injected header strictly uses 4-space blocks for its internal hierarchy.
-    return """# -*- coding: utf-8 -*-
+    # The runtime is compiled once per process from RUNTIME_MODULE; every instrumented module only
+    # imports it (runtime_dir is where it sits, relative to the module).
+    return f"""# -*- coding: utf-8 -*-
 # vim: expandtab tabstop=4 shiftwidth=4
 # -*- indent-tabs-mode: nil; tab-width: 4 -*-
 # ==========================================
-# STRICT RECURSIVE WRAPPER + STATE TRACKER (V7.4 - PURE SPACES)
+# STRICT RECURSIVE WRAPPER + STATE TRACKER (V7.5 - PURE SPACES)
+# ==========================================
+import sys
+import os
+if {RUNTIME_MODULE!r} not in sys.modules:
+    sys.path.append(os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), {runtime_dir!r})))
+from {RUNTIME_MODULE} import *
+# ==========================================\n"""
+
+
+def generate_runtime():
+    # The injected runtime strictly uses 4-space blocks for its internal hierarchy.
+    return """# -*- coding: utf-8 -*-
+# ==========================================
+# STRICT RECURSIVE WRAPPER + STATE TRACKER (V7.5 - PURE SPACES), shared by every instrumented module
 # ==========================================
 import datetime as _dt
+import time as _time
 import sys
 import os
 import builtins
 import csv
+import atexit as _atexit
+import re as _re
+import collections as _collections
+import bisect as _bisect
+import threading as _threading
+import socket as _socket
+import struct as _struct
+import traceback as _traceback
+import json as _json
 
 _AD_DEBUG_ACTIVE = True
-_ORIGINAL_PRINT = builtins.print
+# Keep the interpreter's print even when another instrumented module already patched builtins
+if not hasattr(builtins, '_AD_ORIGINAL_PRINT'):
+    builtins._AD_ORIGINAL_PRINT = builtins.print
+_ORIGINAL_PRINT = builtins._AD_ORIGINAL_PRINT
+# AD_SINK_BUFFER=1 switches every log sink to line buffering (slower, but nothing lost on a hard crash)
+_AD_SINK_BUFFER = int(os.environ.get("AD_SINK_BUFFER", 1 << 16))
+# AD_TIMING=1 also writes _TIMING.csv: a perf_counter_ns mark per recorded line, call and loop (see ad-trace perfetto)
+_AD_TIMING = os.environ.get("AD_TIMING", "0") not in ("", "0")
+# AD_FLAMEGRAPH=time|hits samples the call stack every AD_FLAME_EVERY-th hook into _FLAMEGRAPH.folded
+_AD_FLAME_WEIGHT = os.environ.get("AD_FLAMEGRAPH", "").strip().lower()
+_AD_FLAME = _AD_FLAME_WEIGHT in ("time", "hits")
+_AD_FLAME_EVERY = max(1, int(os.environ.get("AD_FLAME_EVERY", 16)))
+_AD_FLAME_MAX_STACKS = max(16, int(os.environ.get("AD_FLAME_MAX_STACKS", 20000)))
+# AD_STREAM=unix:/path or tcp:host:port also sends every trace row to a live collector (ad-trace tail),
+# AD_STREAM_ONLY=1 skips the CSV. The program never waits on the collector: a full queue drops and counts.
+_AD_STREAM = os.environ.get("AD_STREAM", "").strip()
+_AD_STREAM_ONLY = os.environ.get("AD_STREAM_ONLY", "0") not in ("", "0")
+_AD_STREAM_QUEUE = max(1, int(os.environ.get("AD_STREAM_QUEUE", 65536)))
+# AD_TRIGGERS=exception,none,type,slow:MS[@LINE],var:NAME<op>VALUE starts in a cheap mode (per-line hit counts
+# in _LINE_HITS.csv, plus every AD_TRIGGER_SAMPLE-th snapshot) and records in full for AD_TRIGGER_WINDOW
+# snapshots whenever a trigger fires, preceded by the last AD_TRIGGER_BEFORE snapshots; AD_TRIGGER_MAX windows.
+_AD_TRIGGERS = os.environ.get("AD_TRIGGERS", "").strip()
+_AD_TRIGGER_WINDOW = max(1, int(os.environ.get("AD_TRIGGER_WINDOW", 2000)))
+_AD_TRIGGER_BEFORE = max(0, int(os.environ.get("AD_TRIGGER_BEFORE", 16)))
+_AD_TRIGGER_SAMPLE = max(0, int(os.environ.get("AD_TRIGGER_SAMPLE", 0)))
+_AD_TRIGGER_MAX = max(1, int(os.environ.get("AD_TRIGGER_MAX", 100)))
+
+# One buffered handle per log target, shared by every instrumented module of the process.
+if not hasattr(builtins, '_AD_LOG_SINKS'):
+    builtins._AD_LOG_SINKS = {}
+_AD_LOG_SINKS = builtins._AD_LOG_SINKS
+# Buffered text handles are not thread-safe: every row (or whole snapshot) is written under this lock
+if not hasattr(builtins, '_AD_SINK_LOCK'):
+    builtins._AD_SINK_LOCK = _threading.RLock()
+_AD_SINK_LOCK = builtins._AD_SINK_LOCK
+_AD_TS_CACHE = [-1, ""]
+# _VARIABLE_TRACKER.csv uses the common trace schema (see trace_schema.py); seq counts rows across modules
+_AD_TRACE_COLUMNS = ["File", "Line", "Seq", "Thread", "Variable", "Type", "Value"]
+if not hasattr(builtins, '_AD_TRACE_SEQ'):
+    builtins._AD_TRACE_SEQ = [0]
+_AD_TRACE_SEQ = builtins._AD_TRACE_SEQ
+
+def _ad_sink(f_name, newline=None):
+    # Callers hold _AD_SINK_LOCK, so two threads never open the same log twice
+    sink = _AD_LOG_SINKS.get(f_name)
+    if sink is None:
+        sink = open(f_name, "a", encoding="utf-8", newline=newline, buffering=_AD_SINK_BUFFER)
+        _AD_LOG_SINKS[f_name] = sink
+    return sink
+
+def _ad_sink_write(f_name, text):
+    with _AD_SINK_LOCK:
+        _ad_sink(f_name).write(text)
+
+def _ad_sink_rows(f_name, rows):
+    with _AD_SINK_LOCK:
+        csv.writer(_ad_sink(f_name, newline='')).writerows(rows)
+
+def _ad_trace_rows(file, line_no, entries):
+    # entries are (variable, type, value); seq is numbered under the lock, so it follows the file order
+    thread = _threading.current_thread().name
+    with _AD_SINK_LOCK:
+        seq = _AD_TRACE_SEQ[0]
+        _AD_TRACE_SEQ[0] = seq + len(entries)
+        csv.writer(_ad_sink("_VARIABLE_TRACKER.csv", newline='')).writerows(
+            [file, line_no, seq + i, thread, variable, kind, value] for i, (variable, kind, value) in enumerate(entries))
+
+def _ad_flush_logs():
+    with _AD_SINK_LOCK:
+        for sink in list(_AD_LOG_SINKS.values()):
+            try:
+                sink.flush()
+            except:
+                pass
+
+def _ad_fork_child():
+    _AD_SINK_LOCK.release()
+
+# A forked child starts with empty buffers, so it never writes the parent's pending rows a second time
+if hasattr(os, "register_at_fork") and not hasattr(builtins, '_AD_FORK_REGISTERED'):
+    builtins._AD_FORK_REGISTERED = True
+    os.register_at_fork(before=lambda: (_AD_SINK_LOCK.acquire(), _ad_flush_logs()),
+                        after_in_parent=_AD_SINK_LOCK.release, after_in_child=_ad_fork_child)
+
+def _ad_timestamp():
+    # strftime only runs when the wall clock crosses into a new second
+    now = int(_time.time())
+    if now != _AD_TS_CACHE[0]:
+        _AD_TS_CACHE[1] = _time.strftime("%Y-%m-%d %H:%M:%S", _time.localtime(now))
+        _AD_TS_CACHE[0] = now
+    return _AD_TS_CACHE[1]
+
+class _AdStreamSink:
+    \"\"\"File-like tee for the trace: rows go to the CSV (if any) and, through a sender thread, to a socket.\"\"\"
+    _FRAME = _struct.Struct("<IB")  # payload length, kind; same layout as trace_stream.FRAME
+    _ROW, _HELLO, _DROPPED = 0, 1, 2
+
+    def __init__(self, address, columns, file=None):
+        self._file = file
+        self._address = address
+        self._hello = _json.dumps({"pid": os.getpid(), "argv": sys.argv, "columns": columns}).encode("utf-8")
+        self._queue = _collections.deque()
+        self._dropped = 0
+        self._reported = 0
+        self._closing = False
+        self._thread = _threading.Thread(target=self._run, name="ad-stream", daemon=True)
+        self._thread.start()
+
+    def write(self, text):
+        if self._file is not None:
+            self._file.write(text)
+        if len(self._queue) < _AD_STREAM_QUEUE:
+            self._queue.append(text)
+        else:
+            self._dropped += 1
+        return len(text)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self, timeout=2.0):
+        # Gives the sender a moment to drain; a stalled collector cannot hold the exit longer than that
+        self._closing = True
+        self._thread.join(timeout)
+        self.flush()
+
+    def _connect(self):
+        kind, _, target = self._address.partition(":")
+        try:
+            if kind == "unix":
+                sock = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+                sock.settimeout(1.0)
+                sock.connect(target)
+            else:
+                host, _, port = (target if kind == "tcp" else self._address).rpartition(":")
+                sock = _socket.create_connection((host or "127.0.0.1", int(port)), timeout=1.0)
+            sock.settimeout(None)
+            return sock
+        except:
+            return None
+
+    def _frames(self, limit=4096):
+        frames = []
+        dropped = self._dropped - self._reported
+        if dropped:
+            payload = str(dropped).encode("ascii")
+            frames.append(self._FRAME.pack(len(payload), self._DROPPED) + payload)
+            self._reported += dropped
+        queue = self._queue
+        rows = 0
+        while queue and rows < limit:
+            payload = queue.popleft().rstrip("\\r\\n").encode("utf-8", "replace")
+            frames.append(self._FRAME.pack(len(payload), self._ROW) + payload)
+            rows += 1
+        return b"".join(frames), rows
+
+    def _run(self):
+        delay = 0.05
+        while True:
+            sock = self._connect()
+            if sock is None:
+                # No collector yet: rows pile up to the queue limit and are dropped from then on
+                if self._closing: return
+                _time.sleep(delay)
+                delay = min(delay * 2, 2.0)
+                continue
+            delay = 0.05
+            rows = 0
+            try:
+                sock.sendall(self._FRAME.pack(len(self._hello), self._HELLO) + self._hello)
+                while True:
+                    data, rows = self._frames()
+                    if data:
+                        sock.sendall(data)
+                    elif self._closing:
+                        sock.close()
+                        return
+                    else:
+                        _time.sleep(0.01)
+            except:
+                self._dropped += rows  # the batch in flight when the collector went away
+                try:
+                    sock.close()
+                except:
+                    pass
 
 def _reset_logs():
     log_files = ["_DEBUG_ONLY.txt", "_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt"]
     for f_name in log_files:
         try:
-            with open(f_name, "w", encoding="utf-8") as f:
-                f.write(f"--- SESSION START: {_dt.datetime.now()} ---\\n")
+            sink = open(f_name, "w", encoding="utf-8", buffering=_AD_SINK_BUFFER)
+            _AD_LOG_SINKS[f_name] = sink
+            sink.write(f"--- SESSION START: {_dt.datetime.now()} ---\\n")
         except:
             pass
 
     try:
-        with open("_VARIABLE_TRACKER.csv", "w", encoding="utf-8", newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Line", "Variable", "Value"])
+        sink = None
+        if not (_AD_STREAM and _AD_STREAM_ONLY):
+            sink = open("_VARIABLE_TRACKER.csv", "w", encoding="utf-8", newline='', buffering=_AD_SINK_BUFFER)
+            csv.writer(sink).writerow(_AD_TRACE_COLUMNS)
+        if _AD_STREAM:
+            sink = _AdStreamSink(_AD_STREAM, _AD_TRACE_COLUMNS, sink)
+            _atexit.register(sink.close)
+        _AD_LOG_SINKS["_VARIABLE_TRACKER.csv"] = sink
     except:
         pass
 
+    try:
+        sink = open("_LOOP_SUMMARY.csv", "w", encoding="utf-8", newline='', buffering=_AD_SINK_BUFFER)
+        _AD_LOG_SINKS["_LOOP_SUMMARY.csv"] = sink
+        writer = csv.writer(sink)
+        writer.writerow(["File", "Line", "Entry", "Iterations", "Elapsed_Sec", "Changed_Variables"])
+    except:
+        pass
+
+    if _AD_TIMING:
+        try:
+            sink = open("_TIMING.csv", "w", encoding="utf-8", newline='', buffering=_AD_SINK_BUFFER)
+            _AD_LOG_SINKS["_TIMING.csv"] = sink
+            csv.writer(sink).writerow(["Time_ns", "Thread", "Line", "Event", "Name"])
+        except:
+            pass
+
 if not hasattr(builtins, '_AD_LOGS_WIPED'):
     _reset_logs()
+    _atexit.register(_ad_flush_logs)
     builtins._AD_LOGS_WIPED = True
 
+if not hasattr(builtins, '_AD_TIMING_THREADS'):
+    builtins._AD_TIMING_THREADS = set()
+_AD_TIMING_THREADS = builtins._AD_TIMING_THREADS
+
+def _ad_time_mark(line_no, event, name=""):
+    # Timestamp first, so the mark measures the traced code and not the bookkeeping below
+    now = _time.perf_counter_ns()
+    ident = _threading.get_ident()
+    try:
+        rows = [[now, ident, line_no, event, name]]
+        if ident not in _AD_TIMING_THREADS:
+            _AD_TIMING_THREADS.add(ident)
+            rows.insert(0, [now, ident, 0, "thread", _threading.current_thread().name])
+        _ad_sink_rows("_TIMING.csv", rows)
+    except:
+        pass
+
 def _record_state(line_no, local_vars):
     if not _AD_DEBUG_ACTIVE: return
+    if _AD_TIMING: _ad_time_mark(line_no, "line")
+    if _AD_FLAME: _ad_flame_sample(line_no)
+    file = _ad_source_file(sys._getframe(1).f_code.co_filename)
+    if _AD_TRIGGERS and not _ad_capture(file, line_no, local_vars): return
+    _ad_write_state(file, line_no, local_vars)
+
+def _ad_write_state(file, line_no, local_vars):
+    # The snapshot is formatted outside the lock (str() may run user code) and written in one piece
+    rows = []
     try:
-        with open("_VARIABLE_TRACKER.csv", "a", encoding="utf-8", newline='') as f:
-            writer = csv.writer(f)
-            for var_name, var_val in local_vars.items():
-                if var_name.startswith('_'): continue
-                clean_val = str(var_val).replace('\\n', ' ').replace('\\r', '')
-                writer.writerow([line_no, var_name, clean_val])
+        for var_name, var_val in local_vars.items():
+            if var_name.startswith('_'): continue
+            clean_val = str(var_val).replace('\\n', ' ').replace('\\r', '')
+            rows.append((var_name, type(var_val).__name__, clean_val))
     except:
         pass
+    if rows:
+        try:
+            _ad_trace_rows(file, line_no, rows)
+        except:
+            pass
+
+class _AdStdout:
+    \"\"\"Tags every console line with [SCRIPT] and mirrors the text into the buffered log sinks.\"\"\"
+    _LINE_BREAKS = _re.compile(r'(\\r\\n|\\r|\\n)')
+
+    def __init__(self, stream):
+        self._ad_stream = stream
+        self._at_line_start = True
+
+    def write(self, text):
+        if not _AD_DEBUG_ACTIVE or not isinstance(text, str):
+            return self._ad_stream.write(text)
+        if not self._at_line_start and '\\n' not in text and '\\r' not in text:
+            console = entry = text
+        else:
+            console, log = [], []
+            for part in self._LINE_BREAKS.split(text):
+                if not part:
+                    continue
+                if part == '\\r':
+                    # Carriage-return redraws (progress bars) restart the tagged line on the console;
+                    # the log keeps each redraw as its own line.
+                    if not self._at_line_start:
+                        log.append('\\n')
+                    console.append(part)
+                    self._at_line_start = True
+                elif part[-1] == '\\n':
+                    if self._at_line_start:
+                        console.append("[SCRIPT] ")
+                        log.append("[SCRIPT] ")
+                    console.append(part)
+                    log.append('\\n')
+                    self._at_line_start = True
+                else:
+                    if self._at_line_start:
+                        console.append("[SCRIPT] ")
+                        log.append("[SCRIPT] ")
+                        self._at_line_start = False
+                    console.append(part)
+                    log.append(part)
+            console, entry = "".join(console), "".join(log)
+        self._ad_stream.write(console)
+        if entry:
+            for f_name in ("_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt"):
+                try:
+                    _ad_sink_write(f_name, entry)
+                except:
+                    pass
+        return len(text)
+
+    def flush(self):
+        self._ad_stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._ad_stream, name)
+
+if not hasattr(builtins, '_AD_STDOUT'):
+    builtins._AD_STDOUT = _AdStdout(sys.stdout) if sys.stdout is not None else None
+    if builtins._AD_STDOUT is not None:
+        sys.stdout = builtins._AD_STDOUT
+_AD_STDOUT = builtins._AD_STDOUT
 
 def _ad_script_output(msg, is_error=True):
     if not _AD_DEBUG_ACTIVE: return
-    timestamp = _dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted = f"[DEBUG_ERROR] [{timestamp}] {msg}" if is_error else f"[SCRIPT] {msg}"
-    _ORIGINAL_PRINT(formatted)
-    target = ["_DEBUG_ONLY.txt", "_COMBINED_LOG.txt"] if is_error else ["_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt"]
+    if not is_error and _AD_STDOUT is not None:
+        _AD_STDOUT.write(f"{msg}\\n")
+        return
+    formatted = f"[DEBUG_ERROR] [{_ad_timestamp()}] {msg}" if is_error else f"[SCRIPT] {msg}"
+    # Errors bypass the [SCRIPT] tagging and go straight to the real console
+    _ORIGINAL_PRINT(formatted, file=getattr(_AD_STDOUT, '_ad_stream', None))
+    # Format once, then hand the same buffer to the split log and the combined log
+    entry = formatted + "\\n"
+    target = ("_DEBUG_ONLY.txt", "_COMBINED_LOG.txt") if is_error else ("_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt")
     for f_name in target:
         try:
-            with open(f_name, "a", encoding="utf-8") as f: 
-                f.write(formatted + "\\n")
+            _ad_sink_write(f_name, entry)
         except:
             pass
+    if is_error:
+        _ad_flush_logs()
 
-def print(*args, **kwargs):
-    output = " ".join(map(str, args))
-    _ad_script_output(output, is_error=False)
+def print(*args, sep=" ", end="\\n", file=None, flush=False):
+    if file is None:
+        file = sys.stdout
+    # stderr, files, StringIO redirects and invalid arguments keep the exact builtin behavior
+    if (file is not _AD_STDOUT or not _AD_DEBUG_ACTIVE or
+            not isinstance(sep if sep is not None else "", str) or
+            not isinstance(end if end is not None else "", str)):
+        return _ORIGINAL_PRINT(*args, sep=sep, end=end, file=file, flush=flush)
+    file.write((" " if sep is None else sep).join(map(str, args)) + ("\\n" if end is None else end))
+    if flush:
+        file.flush()
 
 builtins.print = print
+
+# Loop summaries: the first K and last K iterations plus every Nth are recorded in full,
+# the rest only bump a counter. Loop entries are sampled the same way for nested loops.
+_AD_LOOP_HEAD = int(os.environ.get("AD_LOOP_HEAD", 3))
+_AD_LOOP_TAIL = int(os.environ.get("AD_LOOP_TAIL", 3))
+_AD_LOOP_EVERY = max(1, int(os.environ.get("AD_LOOP_EVERY", 1000)))
+# Shared by every instrumented module: open loops by (line, frame), totals by (source file, line)
+if not hasattr(builtins, '_AD_LOOP_ACTIVE'):
+    builtins._AD_LOOP_ACTIVE = {}
+    builtins._AD_LOOP_TOTALS = {}
+_AD_LOOP_ACTIVE = builtins._AD_LOOP_ACTIVE
+_AD_LOOP_TOTALS = builtins._AD_LOOP_TOTALS
+
+def _ad_loop_sampled(n):
+    return n <= _AD_LOOP_HEAD or n % _AD_LOOP_EVERY == 0
+
+def _record_loop_state(file, line_no, iteration, local_vars):
+    try:
+        _ad_trace_rows(file, line_no, [("<iteration>", "", iteration)])
+    except:
+        pass
+    _ad_write_state(file, line_no, local_vars)
+
+def _ad_loop_enter(line_no, local_vars):
+    if not _AD_DEBUG_ACTIVE: return
+    frame = sys._getframe(1)
+    key = (line_no, id(frame))
+    stale = _AD_LOOP_ACTIVE.pop(key, None)
+    if stale is not None:
+        if _AD_TIMING: _ad_time_mark(line_no, "endloop")
+        _ad_loop_close(stale, None)
+    if _AD_TIMING: _ad_time_mark(line_no, "loop")
+    site = (_ad_source_file(frame.f_code.co_filename), line_no)
+    totals = _AD_LOOP_TOTALS.get(site)
+    if totals is None:
+        totals = _AD_LOOP_TOTALS[site] = [0, 0, 0.0, set()]
+    totals[0] += 1
+    sampled = _ad_loop_sampled(totals[0])
+    _AD_LOOP_ACTIVE[key] = [line_no, totals[0], _time.perf_counter(), 0,
+                            dict(local_vars) if sampled else None,
+                            _collections.deque(maxlen=_AD_LOOP_TAIL) if sampled else None, site]
+
+def _ad_loop_tick(line_no, local_vars):
+    loop = _AD_LOOP_ACTIVE.get((line_no, id(sys._getframe(1))))
+    if loop is None: return
+    if _AD_FLAME: _ad_flame_sample(line_no)
+    loop[3] += 1
+    if _AD_TRIGGERS and _ad_capture(loop[6][0], line_no, local_vars):
+        _record_loop_state(loop[6][0], line_no, loop[3], local_vars)  # inside a capture window every iteration is kept
+        return
+    if loop[4] is None: return
+    if _ad_loop_sampled(loop[3]):
+        _record_loop_state(loop[6][0], line_no, loop[3], local_vars)
+    elif _AD_LOOP_TAIL:
+        # Shallow copy: rebinding is captured, in-place mutation shows the state at loop exit
+        loop[5].append((loop[3], dict(local_vars)))
+
+def _ad_loop_exit(line_no, local_vars):
+    loop = _AD_LOOP_ACTIVE.pop((line_no, id(sys._getframe(1))), None)
+    if loop is not None:
+        if _AD_TIMING: _ad_time_mark(line_no, "endloop")
+        _ad_loop_close(loop, local_vars)
+
+def _ad_value_changed(before, after):
+    if before is after: return False
+    try:
+        return bool(before != after)
+    except:
+        return True
+
+def _ad_loop_close(loop, local_vars):
+    line_no, entry, started, iterations, entry_vars, tail, site = loop
+    elapsed = _time.perf_counter() - started
+    changed = []
+    if local_vars is not None and entry_vars is not None:
+        changed = sorted(name for name, val in local_vars.items()
+                         if not name.startswith('_') and
+                         (name not in entry_vars or _ad_value_changed(entry_vars[name], val)))
+    totals = _AD_LOOP_TOTALS[site]
+    totals[1] += iterations
+    totals[2] += elapsed
+    totals[3].update(changed)
+    if entry_vars is None: return
+    try:
+        for iteration, snapshot in tail:
+            if iteration > iterations - _AD_LOOP_TAIL:
+                _record_loop_state(site[0], line_no, iteration, snapshot)
+        status = " ".join(changed) if local_vars is not None else "<left early>"
+        _ad_sink_rows("_LOOP_SUMMARY.csv", [[site[0], line_no, entry, iterations, f"{elapsed:.6f}", status]])
+    except:
+        pass
+
+def _ad_loop_shutdown():
+    for loop in list(_AD_LOOP_ACTIVE.values()):
+        _ad_loop_close(loop, None)
+    _AD_LOOP_ACTIVE.clear()
+    try:
+        _ad_sink_rows("_LOOP_SUMMARY.csv",
+                      [[file, line_no, f"ALL({entries})", iterations, f"{elapsed:.6f}", " ".join(sorted(changed))]
+                       for (file, line_no), (entries, iterations, elapsed, changed) in sorted(_AD_LOOP_TOTALS.items())
+                       if entries > 1])
+    except:
+        pass
+
+if not hasattr(builtins, '_AD_LOOP_REGISTERED'):
+    builtins._AD_LOOP_REGISTERED = True
+    _atexit.register(_ad_loop_shutdown)
+
+# Line maps: [original source, (inst_start, orig_start, orig_end) spans, sidecar path] per module, keyed by
+# the module's __file__. Streamed files reference their .admap sidecar instead, loaded on the first lookup.
+if not hasattr(builtins, '_AD_SOURCE_MAPS'):
+    builtins._AD_SOURCE_MAPS = {}
+_AD_SOURCE_MAPS = builtins._AD_SOURCE_MAPS
+
+def _ad_line_map(module_file, first_line, block_sizes, source_file=None):
+    starts, origins, ends = [], [], []
+    last_size = 0
+    for orig_line, size in enumerate(block_sizes, start=1):
+        if size == 1 and last_size == 1:
+            ends[-1] = orig_line
+        else:
+            starts.append(first_line)
+            origins.append(orig_line)
+            ends.append(orig_line)
+        last_size = size
+        first_line += size
+    line_map = [source_file, (starts, origins, ends), None]
+    _AD_SOURCE_MAPS[module_file] = line_map
+    return line_map
+
+def _ad_line_map_file(module_file, map_path, source_file=None):
+    line_map = [source_file, None, map_path]
+    _AD_SOURCE_MAPS[module_file] = line_map
+    return line_map
+
+def _ad_source_file(filename):
+    # The original source of an instrumented module (as its line map names it), else the file itself
+    entry = _AD_SOURCE_MAPS.get(filename)
+    return (entry[0] if entry is not None and entry[0] else filename) or ""
+
+def _ad_original_line(inst_line, line_map):
+    if line_map[1] is None:
+        if not line_map[2]: return 0
+        try:
+            with open(line_map[2], "r", encoding="utf-8") as f:
+                spans = _json.load(f)["spans"]
+            line_map[1] = ([x[0] for x in spans], [x[1] for x in spans], [x[2] for x in spans])
+        except:
+            line_map[1] = ([], [], [])
+    starts, origins, ends = line_map[1]
+    i = _bisect.bisect_right(starts, inst_line) - 1
+    if i < 0: return 0
+    return min(origins[i] + inst_line - starts[i], ends[i])
+
+def _ad_remap_frames(te, seen):
+    # Rewrites every instrumented frame of a TracebackException chain to original file/line
+    if te is None or id(te) in seen: return
+    seen.add(id(te))
+    frames = []
+    for fs in te.stack:
+        entry = _AD_SOURCE_MAPS.get(fs.filename)
+        orig_line = _ad_original_line(fs.lineno, entry) if entry is not None else 0
+        if not orig_line:
+            frames.append(fs)
+            continue
+        frames.append(_traceback.FrameSummary(entry[0] or fs.filename, orig_line,
+                                             fs.name, lookup_line=False, line=fs.line))
+    te.stack = _traceback.StackSummary.from_list(frames)
+    _ad_remap_frames(te.__cause__, seen)
+    _ad_remap_frames(te.__context__, seen)
+
+def _ad_excepthook(exc_type, exc, tb):
+    try:
+        te = _traceback.TracebackException(exc_type, exc, tb)
+        _ad_remap_frames(te, set())
+        sys.stderr.write("".join(te.format()))
+    except:
+        sys.__excepthook__(exc_type, exc, tb)
+
+if not hasattr(builtins, '_AD_EXCEPTHOOK'):
+    builtins._AD_EXCEPTHOOK = _ad_excepthook
+    sys.excepthook = _ad_excepthook
+
+# Flamegraph sampling: stacks are keyed by (code, line) pairs while running and only resolved
+# to original file:function:line names once, at exit. Rare stacks fold into their callers.
+if not hasattr(builtins, '_AD_FLAME_STACKS'):
+    builtins._AD_FLAME_STACKS = {}
+    builtins._AD_FLAME_STATE = [0, {}]  # hook counter, thread ident -> perf_counter_ns of its last sample
+_AD_FLAME_STACKS = builtins._AD_FLAME_STACKS
+_AD_FLAME_STATE = builtins._AD_FLAME_STATE
+_AD_FLAME_COLLAPSED = (None, "[collapsed]")
+
+def _ad_flame_sample(line_no):
+    _AD_FLAME_STATE[0] += 1
+    if _AD_FLAME_STATE[0] % _AD_FLAME_EVERY: return
+    if _AD_FLAME_WEIGHT == "time":
+        now = _time.perf_counter_ns()
+        ident = _threading.get_ident()
+        last = _AD_FLAME_STATE[1].get(ident)
+        _AD_FLAME_STATE[1][ident] = now
+        if last is None: return
+        weight = now - last
+    else:
+        weight = 1
+    # The hook's own line is already an original line; negated so the exit-time remap skips it
+    frame = sys._getframe(2)
+    stack = [(frame.f_code, -line_no)]
+    frame = frame.f_back
+    while frame is not None and len(stack) < 128:
+        stack.append((frame.f_code, frame.f_lineno))
+        frame = frame.f_back
+    key = tuple(stack)
+    _AD_FLAME_STACKS[key] = _AD_FLAME_STACKS.get(key, 0) + weight
+    if len(_AD_FLAME_STACKS) > _AD_FLAME_MAX_STACKS:
+        _ad_flame_collapse()
+
+def _ad_flame_collapse():
+    # Keys are leaf-first, so dropping the leaf folds a stack into its caller; weights are kept
+    try:
+        while len(_AD_FLAME_STACKS) > _AD_FLAME_MAX_STACKS // 2:
+            weights = sorted(_AD_FLAME_STACKS.values())
+            cutoff = weights[len(weights) // 2]
+            for key, weight in list(_AD_FLAME_STACKS.items()):
+                if weight > cutoff or key == (_AD_FLAME_COLLAPSED,): continue
+                del _AD_FLAME_STACKS[key]
+                parent = key[2:] if key[0] == _AD_FLAME_COLLAPSED else key[1:]
+                folded = (_AD_FLAME_COLLAPSED,) + parent
+                _AD_FLAME_STACKS[folded] = _AD_FLAME_STACKS.get(folded, 0) + weight
+    except:
+        pass
+
+def _ad_flame_frame_name(code, line, names):
+    if code is None: return line
+    name = names.get((code, line))
+    if name is None:
+        entry = _AD_SOURCE_MAPS.get(code.co_filename)
+        if line < 0:
+            orig_line = -line
+        else:
+            orig_line = _ad_original_line(line, entry) if entry is not None else 0
+        path = (entry[0] if entry is not None and entry[0] else code.co_filename)
+        try:
+            path = os.path.relpath(path)
+        except:
+            pass
+        # ';' separates frames and ' ' the weight in the folded format
+        name = f"{path}:{code.co_name}:{orig_line or line}".replace(";", ":").replace(" ", "_")
+        names[(code, line)] = name
+    return name
+
+def _ad_flame_write():
+    if not _AD_FLAME_STACKS: return
+    names = {}
+    try:
+        with open("_FLAMEGRAPH.folded", "w", encoding="utf-8") as f:
+            for key, weight in sorted(_AD_FLAME_STACKS.items(), key=lambda kv: -kv[1]):
+                if _AD_FLAME_WEIGHT == "time":
+                    weight //= 1000  # microseconds
+                if weight <= 0: continue
+                frames = [_ad_flame_frame_name(code, line, names) for code, line in reversed(key)]
+                f.write(f"{';'.join(frames)} {weight}\\n")
+    except:
+        pass
+
+if _AD_FLAME and not hasattr(builtins, '_AD_FLAME_REGISTERED'):
+    builtins._AD_FLAME_REGISTERED = True
+    _atexit.register(_ad_flame_write)
+
+# Anomaly triggers: outside a capture window a hook only counts its line, runs the enabled
+# triggers and keeps a shallow copy of its locals in a short ring for the window's context.
+_AD_TRIGGER_STABLE = 3  # observations of one type before a change of it counts as an anomaly
+_AD_TRIGGER_TESTS = {"==": lambda a, b: a == b, "!=": lambda a, b: a != b, "<": lambda a, b: a < b,
+                     "<=": lambda a, b: a <= b, ">": lambda a, b: a > b, ">=": lambda a, b: a >= b}
+
+def _ad_var_test(op, literal):
+    if op == "~":
+        pattern = _re.compile(literal)
+        return lambda value: pattern.search(str(value)) is not None
+    compare = _AD_TRIGGER_TESTS[op]
+    try:
+        number = float(literal)
+    except ValueError:
+        number = None
+    def test(value):
+        # Numbers compare as numbers; anything else compares by its str(), so x==None works too
+        if number is not None and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return compare(value, number)
+        return compare(str(value), literal)
+    return test
+
+def _ad_parse_triggers(spec):
+    triggers = {"exception": False, "none": False, "type": False, "slow": [], "var": []}
+    for part in spec.split(","):
+        part = part.strip()
+        kind, _, arg = part.partition(":")
+        kind = kind.strip().lower()
+        try:
+            if kind in ("exception", "none", "type") and not arg:
+                triggers[kind] = True
+            elif kind == "slow":
+                ms, _, line = arg.partition("@")
+                triggers["slow"].append((int(float(ms) * 1e6), int(line) if line.strip() else None))
+            elif kind == "var":
+                name, op, literal = _re.match(r"^\s*([A-Za-z_]\w*)\s*(==|!=|<=|>=|<|>|~)\s*(.*)$", arg).groups()
+                triggers["var"].append((name, _ad_var_test(op, literal), arg.strip()))
+            elif part:
+                raise ValueError(part)
+        except:
+            _ad_script_output(f"AD_TRIGGERS: ignoring {part!r} (expected exception, none, type, "
+                              f"slow:MS[@LINE] or var:NAME<op>VALUE)", is_error=True)
+    return triggers
+
+def _ad_trigger_write_hits():
+    try:
+        with open("_LINE_HITS.csv", "w", encoding="utf-8", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(["Line", "Hits"])
+            writer.writerows(sorted(_AD_TRIGGER_STATE["hits"].items()))
+    except:
+        pass
+
+if _AD_TRIGGERS and not hasattr(builtins, '_AD_TRIGGER_STATE'):
+    builtins._AD_TRIGGER_STATE = {
+        "spec": _ad_parse_triggers(_AD_TRIGGERS),
+        "left": 0,        # snapshots still to record in full in the open window
+        "windows": 0,     # windows opened so far
+        "hooks": 0,
+        "hits": {},       # line -> hooks run there
+        "types": {},      # line -> type signature of its last snapshot (see _ad_type_reason)
+        "matching": set(),  # var: predicates true at their last evaluation
+        "last_ns": {},    # thread ident -> perf_counter_ns of its previous hook
+        "recent": _collections.deque(maxlen=_AD_TRIGGER_BEFORE),
+    }
+    _atexit.register(_ad_trigger_write_hits)
+_AD_TRIGGER_STATE = getattr(builtins, '_AD_TRIGGER_STATE', None)
+
+def _ad_type_reason(line_no, local_vars, spec, state):
+    # Per line: [names, their types, per-variable streaks, snapshots since] -- a snapshot whose
+    # types all match the previous one only bumps the last counter
+    names = tuple(local_vars)
+    kinds = tuple(map(type, local_vars.values()))
+    seen = state["types"].get(line_no)
+    if seen is not None and seen[1] == kinds and seen[0] == names:
+        seen[3] += 1
+        return None
+    previous = {}
+    if seen is not None:
+        previous = {name: (kind, streak + seen[3]) for name, kind, streak in zip(seen[0], seen[1], seen[2])}
+    reason = None
+    streaks = []
+    for name, kind, value in zip(names, kinds, local_vars.values()):
+        before = previous.get(name)
+        if before is None or before[0] is kind:
+            streaks.append(before[1] + 1 if before is not None else 1)
+            continue
+        if (reason is None and before[1] >= _AD_TRIGGER_STABLE and not name.startswith('_') and
+                (spec["type"] or value is None)):
+            reason = f"{name} became {kind.__name__} after {before[1]}x {before[0].__name__}"
+        streaks.append(1)
+    state["types"][line_no] = [names, kinds, streaks, 0]
+    return reason
+
+def _ad_trigger_reason(line_no, local_vars, failed, spec, state):
+    if failed and spec["exception"]:
+        return "exception"
+    reason = None
+    if spec["slow"]:
+        now = _time.perf_counter_ns()
+        ident = _threading.get_ident()
+        last = state["last_ns"].get(ident)
+        state["last_ns"][ident] = now
+        # The time since the thread's previous hook is the time the statement before this hook took
+        if last is not None:
+            for threshold, line in spec["slow"]:
+                if now - last > threshold and (line is None or line == line_no):
+                    reason = f"took {(now - last) / 1e6:.1f} ms"
+                    break
+    # Predicates fire when they become true, so a condition that stays true opens one window, not all of them
+    matching = state["matching"]
+    for i, (name, test, text) in enumerate(spec["var"]):
+        if name not in local_vars: continue
+        try:
+            hit = test(local_vars[name])
+        except:
+            hit = False
+        if not hit:
+            matching.discard(i)
+        elif i not in matching:
+            matching.add(i)
+            if reason is None:
+                reason = text
+    if spec["none"] or spec["type"]:
+        changed = _ad_type_reason(line_no, local_vars, spec, state)
+        reason = reason or changed
+    return reason
+
+def _ad_capture(file, line_no, local_vars, failed=False):
+    \"\"\"True when this snapshot is to be recorded in full (inside a capture window, or sampled).\"\"\"
+    state = _AD_TRIGGER_STATE
+    state["hooks"] += 1
+    hits = state["hits"]
+    hits[line_no] = hits.get(line_no, 0) + 1
+    reason = _ad_trigger_reason(line_no, local_vars, failed, state["spec"], state)
+    if reason is not None and state["left"] <= 0 and state["windows"] < _AD_TRIGGER_MAX:
+        state["windows"] += 1
+        state["left"] = _AD_TRIGGER_WINDOW
+        try:
+            for recent_file, line, snapshot in state["recent"]:
+                _ad_write_state(recent_file, line, snapshot)
+            _ad_trace_rows(file, line_no,
+                           [("<trigger>", "", f"{reason} (window {state['windows']}, {_AD_TRIGGER_WINDOW} snapshots)")])
+        except:
+            pass
+        state["recent"].clear()
+    if state["left"] > 0:
+        state["left"] -= 1
+        return True
+    if _AD_TRIGGER_SAMPLE and state["hooks"] % _AD_TRIGGER_SAMPLE == 0:
+        state["recent"].clear()
+        return True
+    if _AD_TRIGGER_BEFORE:
+        # Shallow copy: rebinding is captured, in-place mutation shows the state at the trigger
+        state["recent"].append((file, line_no, dict(local_vars)))
+    return False
+
+def _record_fn_state(line_no, event, local_vars):
+    code = sys._getframe(2).f_code
+    name = code.co_name
+    if _AD_TIMING: _ad_time_mark(line_no, event.strip("<>"), name)
+    file = _ad_source_file(code.co_filename)
+    if _AD_TRIGGERS and not _ad_capture(file, line_no, local_vars, event == "<exception>"): return
+    try:
+        _ad_trace_rows(file, line_no, [(event, "", name)])
+    except:
+        pass
+    _ad_write_state(file, line_no, local_vars)
+
+def _ad_fn_enter(line_no, local_vars):
+    if not _AD_DEBUG_ACTIVE: return
+    if _AD_FLAME: _ad_flame_sample(line_no)
+    _record_fn_state(line_no, "<enter>", local_vars)
+
+def _ad_fn_exit(line_no, local_vars):
+    if not _AD_DEBUG_ACTIVE: return
+    if _AD_FLAME: _ad_flame_sample(line_no)
+    _record_fn_state(line_no, "<exit>", local_vars)
+
+def _ad_fn_failed(line_no, exc, local_vars):
+    if not _AD_DEBUG_ACTIVE: return
+    # A traceback caught here starts at the wrapped function's own frame
+    tb = exc.__traceback__
+    entry = _AD_SOURCE_MAPS.get(tb.tb_frame.f_code.co_filename) if tb is not None else None
+    failed_line = (_ad_original_line(tb.tb_lineno, entry) if entry is not None else 0) or line_no
+    _ad_script_output(f'Line {failed_line} Failed: {exc}', is_error=True)
+    _record_fn_state(failed_line, "<exception>", local_vars)
+
+def _ad_stmt_failed(line_no, exc, local_vars):
+    _ad_script_output(f'Line {line_no} Failed: {exc}', is_error=True)
+    if _AD_TRIGGERS and _AD_DEBUG_ACTIVE:
+        file = _ad_source_file(sys._getframe(1).f_code.co_filename)
+        if _ad_capture(file, line_no, local_vars, True):
+            _ad_write_state(file, line_no, local_vars)
+
+# Every module instrumented against this runtime star-imports it, private helpers included
+__all__ = [name for name in globals() if not name.startswith('__')]
 # ==========================================\n"""
 
 
-def inject_into_file(file_path, max_depth=3):
+# ==========================================
+# INJECTION PIPELINE (reader -> classifier -> instrumenter -> writer, one line at a time)
+# ==========================================
+def read_source_lines(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for chunk in f:
+            # Phase 1: Eradicate hidden non-breaking space variants globally
+            yield from chunk.replace('\xa0', ' ').replace('\u00a0', ' ').splitlines()
+
+
+_OPEN_BRACKETS = {"(": 1, "[": 1, "{": 1, ")": -1, "]": -1, "}": -1}
+
+
+def _naive_bracket_delta(line):
+    return (line.count('(') + line.count('[') + line.count('{') -
+            line.count(')') - line.count(']') - line.count('}'))
+
+
+def _bracket_deltas(raw_lines):
+    """
+    Yields (line, change in bracket depth) with brackets counted on tokens, so those in comments
+    and string literals do not count. Lines are pulled lazily; from the first point the tokenizer
+    rejects (Python 2 code, broken indentation) brackets are counted character-wise instead.
+    """
+    lines = iter(raw_lines)
+    pending = deque()  # [line, delta] read by the tokenizer but not yet complete
+    first_row = 1      # row number of pending[0]
+
+    def readline():
+        line = next(lines, None)
+        if line is None:
+            return ""
+        pending.append([line, 0])
+        return line + "\n"
+
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            raw_content = f.read()
+        for token in tokenize.generate_tokens(readline):
+            row = token.start[0]
+            # A token starting on a later row completes every row before it
+            while pending and first_row < row:
+                yield tuple(pending.popleft())
+                first_row += 1
+            if token.type == tokenize.OP and token.string in _OPEN_BRACKETS:
+                pending[row - first_row][1] += _OPEN_BRACKETS[token.string]
+    except (tokenize.TokenError, SyntaxError):
+        for entry in pending:
+            entry[1] = _naive_bracket_delta(entry[0])
+    while pending:
+        yield tuple(pending.popleft())
+    for line in lines:
+        yield line, _naive_bracket_delta(line)
 
-        # Phase 1: Eradicate hidden non-breaking space variants globally
-        raw_content = raw_content.replace('\xa0', ' ').replace('\u00a0', ' ')
-        raw_lines = raw_content.splitlines()
 
-        lines_meta = []
-        in_triple_quote = False
-        quote_char = None
+def classify_lines(raw_lines):
+    """Yields (line, is_literal, starts_in_literal, bracket delta) using the triple-quote state machine."""
+    in_triple_quote = False
+    quote_char = None
 
-        # Build structural state machine mask across lines
-        for line in raw_lines:
-            stripped = line.strip()
-            line_starts_in_literal = in_triple_quote
+    # Build structural state machine mask across lines
+    for line, bracket_delta in _bracket_deltas(raw_lines):
+        stripped = line.strip()
+        line_starts_in_literal = in_triple_quote
 
-            i = 0
-            while i < len(line):
-                if in_triple_quote:
-                    if line[i:i + 3] == quote_char:
-                        in_triple_quote = False
-                        quote_char = None
-                        i += 3
-                        continue
+        i = 0
+        while i < len(line):
+            if in_triple_quote:
+                if line[i:i + 3] == quote_char:
+                    in_triple_quote = False
+                    quote_char = None
+                    i += 3
+                    continue
+                i += 1
+            else:
+                if line[i:i + 3] in ('"""', "'''"):
+                    in_triple_quote = True
+                    quote_char = line[i:i + 3]
+                    i += 3
+                    continue
+                elif line[i] in ('"', "'"):
+                    s_char = line[i]
                     i += 1
-                else:
-                    if line[i:i + 3] in ('"""', "'''"):
-                        in_triple_quote = True
-                        quote_char = line[i:i + 3]
-                        i += 3
-                        continue
-                    elif line[i] in ('"', "'"):
-                        s_char = line[i]
-                        i += 1
-                        while i < len(line) and line[i] != s_char:
-                            if line[i] == '\\':
-                                i += 2
-                            else:
-                                i += 1
-                        i += 1
-                        continue
+                    while i < len(line) and line[i] != s_char:
+                        if line[i] == '\\':
+                            i += 2
+                        else:
+                            i += 1
                     i += 1
+                    continue
+                i += 1
 
-            line_ends_in_literal = in_triple_quote
-            is_literal = (line_starts_in_literal or line_ends_in_literal or
-                          stripped.startswith(('"""', "'''")) or stripped.endswith(('"""', "'''")))
-            lines_meta.append((line, is_literal))
+        line_ends_in_literal = in_triple_quote
+        is_literal = (line_starts_in_literal or line_ends_in_literal or
+                      stripped.startswith(('"""', "'''")) or stripped.endswith(('"""', "'''")))
+        yield line, is_literal, line_starts_in_literal, bracket_delta
 
-        total_lines = len(lines_meta)
-        transformed_lines = [None] * total_lines
-        bracket_level = 0
-        structural_keywords = ('def ', 'class ', 'if ', 'elif ', 'else:', 'for ', 'while ',
-                               'with ', 'try:', 'except', 'finally:', '@', 'import ', 'from ')
 
-        for idx in range(total_lines):
-            line_text, trapped_in_literal = lines_meta[idx]
+STRUCTURAL_KEYWORDS = ('def ', 'class ', 'if ', 'elif ', 'else:', 'for ', 'while ',
+                       'with ', 'try:', 'except', 'finally:', '@', 'import ', 'from ')
+LOOP_KEYWORDS = ('for ', 'while ', 'async for ')
+CLOSER_LINES = (")", "]", "}", "),", "],", "},")
 
-            # Extract JUST the intra-line expression, leaving all internal/trailing spaces completely intact
-            content_part = line_text.lstrip(' \t')
-            stripped_for_check = content_part.strip()
 
-            # UNIVERSAL SPACE CONVERSION (Applied to EVERYTHING to satisfy IDE heuristics)
-            raw_indent = line_text[:len(line_text) - len(content_part)]
-            total_space_weight = raw_indent.count(' ') + (raw_indent.count('\t') * 4)
-            indent_level = max(0, total_space_weight // 4)
+def _instrument_blocks(classified, max_depth, loop_mode, function_mode):
+    bracket_level = 0
+    structural_keywords = STRUCTURAL_KEYWORDS
+    loop_keywords = LOOP_KEYWORDS
+    function_keywords = ('def ', 'async def ')
+    docstring_prefixes = ('"', "'", 'r"', "r'", 'u"', "u'")
 
-            # Construct the new, strictly space-instantiated preceding spacing (4 spaces per level)
-            indent_str = '    ' * indent_level
+    # Open loop/function blocks as [kind, header line, header indent, output indent, started].
+    # Function bodies are re-indented one level (shift) once their try: has been emitted.
+    block_stack = []
+    open_loops = 0
+    open_functions = 0
+    shift = 0
+    pending_def = None
 
-            # Reattach the pure-space prefix to the fully preserved invocation
-            normalized_line = indent_str + content_part
+    for idx, (line_text, trapped_in_literal, continues_literal, bracket_delta) in enumerate(classified):
+        # Extract JUST the intra-line expression, leaving all internal/trailing spaces completely intact
+        content_part = line_text.lstrip(' \t')
+        stripped_for_check = content_part.strip()
 
-            # Leave empty lines and internal string literal blocks untouched structurally (but formatted with spaces)
-            if not stripped_for_check:
-                transformed_lines[idx] = indent_str  # Preserve empty lines as pure spaces or completely empty
-                continue
+        # UNIVERSAL SPACE CONVERSION (Applied to EVERYTHING to satisfy IDE heuristics)
+        raw_indent = line_text[:len(line_text) - len(content_part)]
+        total_space_weight = raw_indent.count(' ') + (raw_indent.count('\t') * 4)
+        indent_level = max(0, total_space_weight // 4)
 
-            if trapped_in_literal:
-                transformed_lines[idx] = normalized_line
-                continue
+        # Construct the new, strictly space-instantiated preceding spacing (4 spaces per level)
+        indent_str = '    ' * indent_level
+
+        # Reattach the pure-space prefix to the fully preserved invocation
+        normalized_line = indent_str + content_part
 
-            prev_bracket_level = bracket_level
-            bracket_level += (line_text.count('(') + line_text.count('[') + line_text.count('{'))
-            bracket_level -= (line_text.count(')') + line_text.count(']') + line_text.count('}'))
+        # Leave empty lines and internal string literal blocks untouched structurally (but formatted with spaces)
+        if not stripped_for_check:
+            yield indent_str  # Preserve empty lines as pure spaces or completely empty
+            continue
 
-            is_structural = any(
-                stripped_for_check.startswith(k) for k in structural_keywords) or stripped_for_check.endswith(':')
+        if continues_literal or (trapped_in_literal and not (loop_mode or function_mode)):
+            yield normalized_line
+            continue
 
-            # Phase 3: Injection (Using strict 4-space string increments for the block hierarchy)
-            if prev_bracket_level == 0 and bracket_level == 0 and not is_structural and indent_level <= max_depth:
-                if stripped_for_check in (")", "]", "}", "),", "],", "},"):
-                    transformed_lines[idx] = normalized_line
+        # Phase 2b: Block hooks (loop ticks/exits, function try/except/finally) for loop and function modes
+        hooks = []
+        if (loop_mode or function_mode) and bracket_level == 0 and not stripped_for_check.startswith('#'):
+            while block_stack and indent_level <= block_stack[-1][2]:
+                kind, header_line, header_indent, out_level, started = block_stack[-1]
+                if (kind == 'loop' and indent_level == header_indent and
+                        stripped_for_check.split(':')[0].strip() == 'else'):
+                    break
+                block_stack.pop()
+                pad = '    ' * (out_level or 0)
+                if kind == 'loop':
+                    open_loops -= 1
+                    shift -= 1
+                    hooks.extend([
+                        f"{pad}finally:",
+                        f"{pad}    _ad_loop_exit({header_line}, locals())"
+                    ])
                 else:
-                    block = [
-                        f"{indent_str}try:",
-                        f"{indent_str}    {content_part}",
-                        f"{indent_str}    _record_state({idx + 1}, locals())",
-                        f"{indent_str}except Exception as e:",
-                        f"{indent_str}    _ad_script_output(f'Line {idx + 1} Failed: {{e}}', is_error=True)",
-                        f"{indent_str}    raise"
-                    ]
-                    transformed_lines[idx] = "\n".join(block)
+                    open_functions -= 1
+                    if started:
+                        shift -= 1
+                        hooks.extend([
+                            f"{pad}except Exception as _ad_exc:",
+                            f"{pad}    _ad_fn_failed({header_line}, _ad_exc, locals())",
+                            f"{pad}    raise",
+                            f"{pad}finally:",
+                            f"{pad}    _ad_fn_exit({header_line}, locals())"
+                        ])
+
+            if block_stack and not block_stack[-1][4] and indent_level > block_stack[-1][2]:
+                block = block_stack[-1]
+                pad = '    ' * (indent_level + shift)
+                if block[0] == 'loop':
+                    hooks.append(f"{pad}_ad_loop_tick({block[1]}, locals())")
+                    block[4] = True
+                elif not stripped_for_check.startswith(docstring_prefixes):
+                    hooks.append(f"{pad}_ad_fn_enter({block[1]}, locals())")
+                    hooks.append(f"{pad}try:")
+                    block[3] = indent_level + shift
+                    block[4] = True
+                    shift += 1
+
+        if shift:
+            indent_str = '    ' * (indent_level + shift)
+            normalized_line = indent_str + content_part
+
+        if trapped_in_literal:
+            yield "\n".join(hooks + [normalized_line])
+            continue
+
+        prev_bracket_level = bracket_level
+        bracket_level += bracket_delta
+
+        is_structural = any(
+            stripped_for_check.startswith(k) for k in structural_keywords) or stripped_for_check.endswith(':')
+
+        # Loop headers get enter hooks; function headers (possibly spanning lines) open a wrapped body
+        if (loop_mode and prev_bracket_level == 0 and bracket_level == 0 and indent_level <= max_depth and
+                stripped_for_check.startswith(loop_keywords) and stripped_for_check.endswith(':')):
+            # try/finally closes the loop however it is left: normally, by return or by an exception
+            hooks.extend([f"{indent_str}_ad_loop_enter({idx + 1}, locals())", f"{indent_str}try:"])
+            block_stack.append(['loop', idx + 1, indent_level, indent_level + shift, False])
+            open_loops += 1
+            shift += 1
+            yield "\n".join(hooks + ['    ' * (indent_level + shift) + content_part])
+            continue
+
+        if function_mode and prev_bracket_level == 0 and stripped_for_check.startswith(function_keywords):
+            pending_def = (idx + 1, indent_level) if indent_level <= max_depth else None
+        if pending_def is not None and bracket_level == 0:
+            if stripped_for_check.endswith(':'):
+                block_stack.append(['func', pending_def[0], pending_def[1], None, False])
+                open_functions += 1
+            pending_def = None
+
+        # Loop bodies and wrapped functions are covered by their block hooks instead of per-statement wrappers
+        if open_loops or open_functions:
+            yield "\n".join(hooks + [normalized_line])
+            continue
+
+        # Phase 3: Injection (Using strict 4-space string increments for the block hierarchy)
+        if prev_bracket_level == 0 and bracket_level == 0 and not is_structural and indent_level <= max_depth:
+            if stripped_for_check in CLOSER_LINES:
+                out = normalized_line
             else:
-                transformed_lines[idx] = normalized_line
+                block = [
+                    f"{indent_str}try:",
+                    f"{indent_str}    {content_part}",
+                    f"{indent_str}    _record_state({idx + 1}, locals())",
+                    f"{indent_str}except Exception as e:",
+                    f"{indent_str}    _ad_stmt_failed({idx + 1}, e, locals())",
+                    f"{indent_str}    raise"
+                ]
+                out = "\n".join(block)
+        else:
+            out = normalized_line
 
-        new_content = [generate_header()] + transformed_lines
+        yield "\n".join(hooks + [out]) if hooks else out
+
+    # Blocks still open at end of file close after the last line
+    closing = []
+    while block_stack:
+        kind, header_line, header_indent, out_level, started = block_stack.pop()
+        pad = '    ' * (out_level or 0)
+        if kind == 'loop':
+            closing.extend([
+                f"{pad}finally:",
+                f"{pad}    _ad_loop_exit({header_line}, locals())"
+            ])
+        elif started:
+            closing.extend([
+                f"{pad}except Exception as _ad_exc:",
+                f"{pad}    _ad_fn_failed({header_line}, _ad_exc, locals())",
+                f"{pad}    raise",
+                f"{pad}finally:",
+                f"{pad}    _ad_fn_exit({header_line}, locals())"
+            ])
+    return closing
+
+
+def instrument_lines(classified, max_depth=3, loop_mode=False, function_mode=False):
+    """Yields one instrumented block per original line; trailing block closers join the last one."""
+    blocks = _instrument_blocks(classified, max_depth, loop_mode, function_mode)
+    previous = None
+    while True:
+        try:
+            block = next(blocks)
+        except StopIteration as done:
+            closing = done.value
+            break
+        if previous is not None:
+            yield previous
+        previous = block
+    if previous is not None:
+        yield "\n".join([previous] + closing)
+
+
+def _block_hooks_error(text):
+    """The SyntaxError of loop/function-mode output, or None when it parses."""
+    try:
+        ast.parse(text)
+        return None
+    except SyntaxError as e:
+        return e
+
+
+def _report_block_fallback(file_path, error):
+    print(f"Injection Warning: {file_path}: loop/function hooks produced invalid Python "
+          f"({error.msg}, line {error.lineno}); wrapping statements only")
+
+
+def write_runtime(directory):
+    """Writes RUNTIME_MODULE into directory, unless an identical copy is already there (keeps its bytecode cache)."""
+    path = os.path.join(directory, RUNTIME_MODULE + ".py")
+    runtime = generate_runtime()
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == runtime:
+                return path
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(runtime)
+    return path
+
+
+def _runtime_header(file_path, runtime_dir):
+    # Without a sandbox root the runtime goes next to the instrumented file
+    if runtime_dir is None:
+        runtime_dir = os.path.dirname(os.path.abspath(file_path))
+        write_runtime(runtime_dir)
+    return generate_header(os.path.relpath(runtime_dir, os.path.dirname(os.path.abspath(file_path))))
+
+
+def inject_into_file(file_path, max_depth=3, loop_mode=False, function_mode=False, source_path=None,
+                     runtime_dir=None):
+    try:
+        transformed_lines = list(instrument_lines(classify_lines(read_source_lines(file_path)),
+                                                  max_depth, loop_mode, function_mode))
+        # Block hooks reshape the code; if that ever breaks it, statement mode (which never opens blocks) takes over
+        error = (loop_mode or function_mode) and _block_hooks_error("\n".join(transformed_lines))
+        if error:
+            statement_lines = list(instrument_lines(classify_lines(read_source_lines(file_path)), max_depth))
+            if _block_hooks_error("\n".join(statement_lines)) is None:
+                _report_block_fallback(file_path, error)
+                transformed_lines = statement_lines
+
+        # Line map: instrumented block sizes per original line, expanded to sorted spans at import
+        header = _runtime_header(file_path, runtime_dir)
+        first_line = header.count("\n") + 3
+        block_sizes = [block.count("\n") + 1 for block in transformed_lines]
+        line_map = (f"_AD_LINE_MAP = _ad_line_map(__file__, {first_line}, [{','.join(map(str, block_sizes))}], "
+                    f"{source_path and os.path.abspath(source_path)!r})")
+
+        new_content = [header, line_map] + transformed_lines
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write("\n".join(new_content) + "\n")
+
+        # Sidecar span map for the remap CLI and offline trace tools
+        SourceMap.from_block_sizes(os.path.basename(file_path), source_path and os.path.abspath(source_path),
+                                   first_line, block_sizes).save(map_path_for(file_path))
         return True
     except Exception as e:
         print(f"Injection Error: {e}")
         return False
 
 
-def process_project(source_dir, max_depth):
-    target_dir = source_dir.rstrip('\\/') + f"_DEBUG_STATE_{int(time.time())}"
-    if not os.path.exists(target_dir):
-        os.makedirs(target_dir)
-    print(f"\n[START] Building instrumented project layout...")
-    for root, _, files in os.walk(source_dir):
-        if any(x in root for x in ['venv', '.git', '__pycache__']):
+def stream_inject_file(src_path, dst_path, max_depth=3, loop_mode=False, function_mode=False, source_path=None,
+                       runtime_dir=None):
+    """
+    Same output as inject_into_file, but every stage is a generator and blocks are written as they
+    are produced, so memory stays bounded by the longest line. The line map cannot be embedded up
+    front, so the module loads it lazily from the .admap sidecar written alongside.
+    """
+    in_place = os.path.abspath(src_path) == os.path.abspath(dst_path)
+    out_path = dst_path + ".adtmp" if in_place else dst_path
+    try:
+        source = source_path and os.path.abspath(source_path)
+        header = _runtime_header(dst_path, runtime_dir)
+        first_line = header.count("\n") + 3
+        line_map = f"_AD_LINE_MAP = _ad_line_map_file(__file__, __file__ + {MAP_SUFFIX!r}, {source!r})"
+
+        with open(out_path, 'w', encoding='utf-8', buffering=1 << 20) as out:
+            out.write(header + "\n" + line_map + "\n")
+
+            def written_block_sizes():
+                for block in instrument_lines(classify_lines(read_source_lines(src_path)),
+                                              max_depth, loop_mode, function_mode):
+                    out.write(block)
+                    out.write("\n")
+                    yield block.count("\n") + 1
+
+            write_source_map(map_path_for(dst_path), os.path.basename(dst_path), source,
+                             spans_from_block_sizes(first_line, written_block_sizes()))
+        if loop_mode or function_mode:
+            # Validation reads the output back whole; only block modes need it, and only they fall back
+            with open(out_path, 'r', encoding='utf-8') as f:
+                error = _block_hooks_error(f.read())
+            if error:
+                _report_block_fallback(src_path, error)
+                if in_place:
+                    os.remove(out_path)
+                return stream_inject_file(src_path, dst_path, max_depth, source_path=source_path,
+                                          runtime_dir=runtime_dir)
+        if in_place:
+            os.replace(out_path, dst_path)
+        return True
+    except Exception as e:
+        print(f"Injection Error: {e}")
+        # A half-written module (or a map of one) must not be left where it could be run
+        for partial in (out_path, map_path_for(dst_path)):
+            if os.path.exists(partial):
+                os.remove(partial)
+        return False
+
+
+# ==========================================
+# ESTIMATION (classification-only pass and optional short profiling runs)
+# ==========================================
+LOG_FILES = ("_DEBUG_ONLY.txt", "_SCRIPT_ONLY.txt", "_COMBINED_LOG.txt", "_VARIABLE_TRACKER.csv", "_LOOP_SUMMARY.csv",
+             "_TIMING.csv", "_FLAMEGRAPH.folded", "_LINE_HITS.csv")
+
+_DEF_NAME = re.compile(r'^(?:async\s+)?def\s+([A-Za-z_]\w*)\s*\((.*)')
+_CLASS_NAME = re.compile(r'^class\s+([A-Za-z_]\w*)')
+_FOR_TARGET = re.compile(r'^(?:async\s+)?for\s+(.+?)\s+in\s')
+_WITH_TARGET = re.compile(r'\bas\s+([A-Za-z_]\w*)')
+_IMPORT_NAMES = re.compile(r'^(?:from\s+\S+\s+)?import\s+(.+)')
+_ASSIGN_TARGET = re.compile(r'^([A-Za-z_][\w\s,.*()\[\]]*?)\s*(?::[^=]*)?(?<![=!<>+\-*/%&|^@:])=(?!=)')
+_WALRUS_TARGET = re.compile(r'([A-Za-z_]\w*)\s*:=')
+_STRING_LITERAL = re.compile(r'"[^"]*"|\'[^\']*\'')
+_INNER_BRACKETS = re.compile(r'\[[^\[\]]*\]|\([^()]*\)|\{[^{}]*\}')
+
+
+def _target_names(target):
+    if target.count('(') != target.count(')') or target.count('[') != target.count(']'):
+        return []  # keyword arguments of a call, not an assignment
+    names = []
+    for piece in target.split(','):
+        piece = piece.strip(' ()[]*')
+        if re.fullmatch(r'[A-Za-z_]\w*', piece):
+            names.append(piece)
+    return names
+
+
+def _param_names(params):
+    params = _STRING_LITERAL.sub('', params)
+    while _INNER_BRACKETS.search(params):
+        params = _INNER_BRACKETS.sub('', params)
+    names = []
+    for piece in params.split(')')[0].split(','):
+        match = re.match(r'\s*\**([A-Za-z_]\w*)', piece)
+        if match:
+            names.append(match.group(1))
+    return names
+
+
+def _bound_names(stripped):
+    """Names a single logical line binds in its scope (assignments, loop targets, imports, with/as, walrus)."""
+    names = _WALRUS_TARGET.findall(stripped)
+    match = _FOR_TARGET.match(stripped)
+    if match:
+        return names + _target_names(match.group(1))
+    if stripped.startswith(('with ', 'async with ')):
+        return names + _WITH_TARGET.findall(stripped)
+    match = _IMPORT_NAMES.match(stripped)
+    if match:
+        for piece in match.group(1).strip('()\\ ').split(','):
+            parts = piece.split()
+            if parts and parts[0] != '*':
+                names.append(parts[-1] if len(parts) == 3 and parts[1] == 'as' else parts[0].split('.')[0])
+        return names
+    match = _ASSIGN_TARGET.match(stripped)
+    if match:
+        names += _target_names(match.group(1))
+    return names
+
+
+def _header_scope_names():
+    """Public module-level names the runtime header adds to every instrumented module's locals()."""
+    names = set()
+    for node in ast.parse(generate_header()).body + ast.parse(generate_runtime()).body:
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            names.update((alias.asname or alias.name).split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.Assign):
+            names.update(t.id for t in node.targets if isinstance(t, ast.Name))
+    return {n for n in names if not n.startswith('_') and n != '*'}
+
+
+def estimate_file(file_path, max_depth=3, module_names=None):
+    """
+    Runs only the reader and classifier over a file. For each depth up to max_depth, reports how many
+    statements would be wrapped, how many of those sit inside a loop, and the rows each of their
+    _record_state calls would write (the public names bound in scope at that point).
+    """
+    sites = []  # (indent level, inside a loop, rows per call)
+    scopes = [(-1, set(module_names if module_names is not None else _header_scope_names()))]
+    loop_indents = []
+    bracket_level = 0
+    pending_params = None
+
+    for line_text, trapped_in_literal, continues_literal, bracket_delta in classify_lines(read_source_lines(file_path)):
+        content_part = line_text.lstrip(' \t')
+        stripped = content_part.strip()
+        if not stripped or continues_literal:
+            continue
+        raw_indent = line_text[:len(line_text) - len(content_part)]
+        indent_level = max(0, (raw_indent.count(' ') + raw_indent.count('\t') * 4) // 4)
+
+        prev_bracket_level = bracket_level
+        bracket_level += bracket_delta
+
+        if pending_params is not None:
+            pending_params[1].append(stripped)
+            if bracket_level == 0:
+                scopes[-1][1].update(_param_names(" ".join(pending_params[1])))
+                pending_params = None
+            continue
+        if prev_bracket_level:
+            continue
+        if stripped.startswith('#'):
+            # Comments do not close blocks, but the instrumenter still wraps them like statements
+            if bracket_level == 0 and not trapped_in_literal and indent_level <= max_depth:
+                sites.append((indent_level, bool(loop_indents), sum(1 for n in scopes[-1][1] if not n.startswith('_'))))
+            continue
+
+        # Dedenting code closes the scopes and loops it has left
+        while len(scopes) > 1 and indent_level <= scopes[-1][0]:
+            scopes.pop()
+        while loop_indents and indent_level <= loop_indents[-1] and not stripped.startswith('else'):
+            loop_indents.pop()
+        names = scopes[-1][1]
+
+        match = _DEF_NAME.match(stripped) or _CLASS_NAME.match(stripped)
+        if match:
+            names.add(match.group(1))
+            scopes.append((indent_level, set()))
+            if stripped.startswith(('def ', 'async def ')):
+                pending_params = (indent_level, [match.group(2)])
+                if bracket_level == 0:
+                    scopes[-1][1].update(_param_names(match.group(2)))
+                    pending_params = None
             continue
+        names.update(_bound_names(stripped))
+
+        if stripped.startswith(LOOP_KEYWORDS) and stripped.endswith(':'):
+            loop_indents.append(indent_level)
+        is_structural = stripped.startswith(STRUCTURAL_KEYWORDS) or stripped.endswith(':')
+        if (not trapped_in_literal and bracket_level == 0 and not is_structural and
+                stripped not in CLOSER_LINES):
+            sites.append((indent_level, bool(loop_indents), sum(1 for n in names if not n.startswith('_'))))
+
+    stats = []
+    for depth in range(max_depth + 1):
+        chosen = [s for s in sites if s[0] <= depth]
+        rows = sum(s[2] for s in chosen)
+        stats.append({
+            "depth": depth,
+            "wrapped": len(chosen),
+            "loop_nested": sum(1 for s in chosen if s[1]),
+            "rows_per_call": rows / len(chosen) if chosen else 0.0,
+            "rows_per_pass": rows,
+        })
+    return stats
+
+
+def _print_estimate_table(stats):
+    print(f"        {'depth':<6}{'wrapped':>9}{'in loops':>10}{'rows/call':>11}{'rows/pass':>11}")
+    for s in stats:
+        print(f"        {s['depth']:<6}{s['wrapped']:>9,}{s['loop_nested']:>10,}"
+              f"{s['rows_per_call']:>11.1f}{s['rows_per_pass']:>11,}")
+
+
+def profile_trace_rate(sandbox_dir, entry, seconds=5.0):
+    """Runs an instrumented entry script for up to `seconds`; returns (elapsed, trace bytes, variable rows)."""
+    for f_name in LOG_FILES:
+        if os.path.exists(os.path.join(sandbox_dir, f_name)):
+            os.remove(os.path.join(sandbox_dir, f_name))
+    start = time.perf_counter()
+    # KeyboardInterrupt would be swallowed by the runtime's bare excepts, so SIGINT flushes and exits directly
+    launcher = ("import atexit, os, runpy, signal, sys\n"
+                "signal.signal(signal.SIGINT, lambda *_: (atexit._run_exitfuncs(), os._exit(0)))\n"
+                f"sys.argv = [{entry!r}]\nrunpy.run_path({entry!r}, run_name='__main__')")
+    proc = subprocess.Popen([sys.executable, "-c", launcher], cwd=sandbox_dir, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        proc.wait(timeout=seconds)
+    except subprocess.TimeoutExpired:
+        if os.name == 'nt':
+            proc.terminate()
+        else:
+            proc.send_signal(signal.SIGINT)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+    elapsed = time.perf_counter() - start
+
+    trace_bytes = sum(os.path.getsize(os.path.join(sandbox_dir, n)) for n in LOG_FILES
+                      if os.path.exists(os.path.join(sandbox_dir, n)))
+    rows = 0
+    tracker = os.path.join(sandbox_dir, "_VARIABLE_TRACKER.csv")
+    if os.path.exists(tracker):
+        with open(tracker, 'rb') as f:
+            rows = max(0, sum(1 for _ in f) - 1)
+    return elapsed, trace_bytes, rows
+
+
+def estimate_project(source_dir, max_depth, loop_mode=False, function_mode=False, profile_entry=None,
+                     profile_seconds=5.0, include=None, exclude=None):
+    print(f"\n[START] Estimating instrumentation cost (classification only, depth 0-{max_depth})...")
+    module_names = _header_scope_names()
+    totals = None
+    for root, files in walk_project(source_dir, skip_dirs=PROJECT_SKIP_DIRS, include=include, exclude=exclude):
+        for file in files:
+            if file.endswith(".py"):
+                src = os.path.join(root, file)
+                try:
+                    stats = estimate_file(src, max_depth, module_names)
+                except Exception as e:
+                    print(f"    Skipped: {file} ({e})")
+                    continue
+                print(f"    {os.path.relpath(src, source_dir)}")
+                _print_estimate_table(stats)
+                if totals is None:
+                    totals = [dict(s) for s in stats]
+                else:
+                    for total, s in zip(totals, stats):
+                        for key in ("wrapped", "loop_nested", "rows_per_pass"):
+                            total[key] += s[key]
+    if totals is None:
+        print("    No Python files found.")
+        return None
+    for total in totals:
+        total["rows_per_call"] = total["rows_per_pass"] / total["wrapped"] if total["wrapped"] else 0.0
+    print("    PROJECT TOTAL")
+    _print_estimate_table(totals)
+
+    if profile_entry:
+        print(f"\n    Profiling {profile_entry} for up to {profile_seconds:g}s per depth...")
+        print(f"        {'depth':<6}{'seconds':>9}{'rows/sec':>12}{'MB/sec':>10}{'GB/hour':>10}")
+        for total in totals:
+            with tempfile.TemporaryDirectory() as sandbox_dir:
+                build_sandbox(source_dir, sandbox_dir, total["depth"], loop_mode, function_mode, verbose=False,
+                              include=include, exclude=exclude)
+                elapsed, trace_bytes, rows = profile_trace_rate(sandbox_dir, profile_entry, profile_seconds)
+            total["trace_mb_per_sec"] = trace_bytes / 1048576 / elapsed
+            total["rows_per_sec"] = rows / elapsed
+            print(f"        {total['depth']:<6}{elapsed:>9.1f}{total['rows_per_sec']:>12,.0f}"
+                  f"{total['trace_mb_per_sec']:>10.2f}{total['trace_mb_per_sec'] * 3600 / 1024:>10.2f}")
+    print(f"\n[FINISH] Estimate complete. No sandbox was created.")
+    return totals
+
+
+def instrument_project_file(src, dst, max_depth, loop_mode=False, function_mode=False, runtime_dir=None):
+    if os.path.getsize(src) >= STREAM_THRESHOLD_BYTES:
+        ok = stream_inject_file(src, dst, max_depth, loop_mode, function_mode, source_path=src,
+                                runtime_dir=runtime_dir)
+        if ok:
+            shutil.copystat(src, dst)
+        else:
+            shutil.copy2(src, dst)  # like a failed inject_into_file, the sandbox keeps the original
+        return ok
+    shutil.copy2(src, dst)
+    return inject_into_file(dst, max_depth, loop_mode, function_mode, source_path=src, runtime_dir=runtime_dir)
+
+
+def build_sandbox(source_dir, target_dir, max_depth, loop_mode=False, function_mode=False, verbose=True,
+                  include=None, exclude=None):
+    # One runtime at the sandbox root; every instrumented module imports it from there
+    os.makedirs(target_dir, exist_ok=True)
+    write_runtime(target_dir)
+    for root, files in walk_project(source_dir, skip_dirs=PROJECT_SKIP_DIRS, include=include, exclude=exclude):
         for file in files:
             if file.endswith(".py"):
                 src = os.path.join(root, file)
                 dst = os.path.join(target_dir, os.path.relpath(src, source_dir))
                 os.makedirs(os.path.dirname(dst), exist_ok=True)
-                shutil.copy2(src, dst)
-                inject_into_file(dst, max_depth)
-                print(f"    Instrumented: {file}")
+                instrument_project_file(src, dst, max_depth, loop_mode, function_mode, runtime_dir=target_dir)
+                if verbose:
+                    print(f"    Instrumented: {file}")
+
+
+def process_project(source_dir, max_depth, loop_mode=False, function_mode=False, estimate=False,
+                    profile_entry=None, profile_seconds=5.0, include=None, exclude=None, watch=False):
+    if estimate:
+        return estimate_project(source_dir, max_depth, loop_mode, function_mode, profile_entry, profile_seconds,
+                                include, exclude)
+    target_dir = source_dir.rstrip('\\/') + f"_DEBUG_STATE_{int(time.time())}"
+    if not os.path.exists(target_dir):
+        os.makedirs(target_dir)
+    print(f"\n[START] Building instrumented project layout...")
+    build_sandbox(source_dir, target_dir, max_depth, loop_mode, function_mode, include=include, exclude=exclude)
     print(f"\n[FINISH] Safe project sandbox initialized at: {target_dir}")
+    if watch:
+        watch_project(source_dir, target_dir,
+                      lambda src, dst: instrument_project_file(src, dst, max_depth, loop_mode, function_mode,
+                                                               runtime_dir=target_dir),
+                      suffixes=(".py",), skip_dirs=PROJECT_SKIP_DIRS, include=include, exclude=exclude)
 
 
 if __name__ == "__main__":
-    p = input("Project Path: ").strip().strip('"')
-    try:
-        d = int(input("Max Depth (default 3): ").strip() or 3)
-    except:
-        d = 3
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Build an instrumented copy of a Python project.")
+        parser.add_argument("path", help="Project folder")
+        parser.add_argument("--depth", type=int, default=3, help="Max indent depth to instrument (default 3)")
+        parser.add_argument("--loops", action="store_true", help="Summarize loops instead of wrapping every iteration")
+        parser.add_argument("--functions", action="store_true", help="Wrap whole functions instead of every statement")
+        parser.add_argument("--estimate", action="store_true", help="Only report wrap counts and trace volume per depth")
+        parser.add_argument("--profile", metavar="ENTRY", help="With --estimate: run this script (relative to the project) to measure trace MB/sec")
+        parser.add_argument("--profile-seconds", type=float, default=5.0, help="Time limit per profiling run (default 5)")
+        parser.add_argument("--include", action="append", metavar="GLOB", help="Only instrument matching files (gitignore syntax, repeatable)")
+        parser.add_argument("--exclude", action="append", metavar="GLOB", help="Skip matching files/folders (gitignore syntax, repeatable)")
+        parser.add_argument("--watch", action="store_true", help="Keep re-instrumenting changed files into the sandbox")
+        args = parser.parse_args()
+        p, d, loops, functions = args.path, args.depth, args.loops, args.functions
+        estimate, entry, seconds = args.estimate, args.profile, args.profile_seconds
+        include, exclude, watch = args.include, args.exclude, args.watch
+    else:
+        p = input("Project Path: ").strip().strip('"')
+        try:
+            d = int(input("Max Depth (default 3): ").strip() or 3)
+        except:
+            d = 3
+        loops = input("Summarize loops instead of wrapping every iteration? (y/N): ").strip().lower() == "y"
+        functions = input("Wrap whole functions instead of every statement? (y/N): ").strip().lower() == "y"
+        estimate = input("Estimate cost only, without building a sandbox? (y/N): ").strip().lower() == "y"
+        entry = (input("Entry script to profile (blank to skip): ").strip().strip('"') or None) if estimate else None
+        seconds = 5.0
+        include = exclude = None
+        watch = not estimate and input("Watch for changes and re-instrument them live? (y/N): ").strip().lower() == "y"
     if os.path.isdir(p):
-        process_project(p, d)
+        process_project(p, d, loops, functions, estimate, entry, seconds, include, exclude, watch)
     else:
         print("Invalid directory path.")
@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 def generate_header():
     # Returns an Elixir module header that mimics your original tracking engine.
     # It sets up concurrent-safe logging configurations for Elixir scripts.
@@ -17,13 +19,35 @@ defmodule DebugTracker do
       File.write(f_name, "--- SESSION START: #{DateTime.utc_now()} ---\\n")
     end)
     
-    File.write("_VARIABLE_TRACKER.csv", "Line,Variable,Value\\n")
+    File.write("_VARIABLE_TRACKER.csv", "File,Line,Seq,Thread,Variable,Type,Value\\n")
+    :persistent_term.put(:ad_trace_seq, :atomics.new(1, []))
+  end
+
+  # Rows follow the common trace schema (see trace_schema.py)
+  def csv(text) do
+    if String.contains?(text, [",", "\\"", "\\r", "\\n"]) do
+      "\\"" <> String.replace(text, "\\"", "\\"\\"") <> "\\""
+    else
+      text
+    end
   end
 
-  def record_state(line_no, var_name, var_val) do
+  def type_of(val) when is_integer(val), do: "integer"
+  def type_of(val) when is_float(val), do: "float"
+  def type_of(val) when is_boolean(val), do: "boolean"
+  def type_of(val) when is_atom(val), do: "atom"
+  def type_of(val) when is_binary(val), do: "string"
+  def type_of(val) when is_list(val), do: "list"
+  def type_of(val) when is_tuple(val), do: "tuple"
+  def type_of(val) when is_map(val), do: "map"
+  def type_of(_val), do: "term"
+
+  def record_state(file, line_no, var_name, var_val) do
     if @debug_active do
       clean_val = "#{inspect(var_val)}" |> String.replace("\\n", " ") |> String.replace("\\r", "")
-      File.write("_VARIABLE_TRACKER.csv", "#{line_no},#{var_name},#{clean_val}\\n", [:append])
+      seq = :atomics.add_get(:persistent_term.get(:ad_trace_seq), 1, 1) - 1
+      row = [csv(file), line_no, seq, csv(inspect(self())), csv(var_name), type_of(var_val), csv(clean_val)]
+      File.write("_VARIABLE_TRACKER.csv", Enum.join(row, ",") <> "\\n", [:append])
     end
     var_val
   end
@@ -106,7 +130,7 @@ def inject_into_file(file_path):
                     block = [
                         f"{indent_str}try do",
                         f"{indent_str}  {stripped}",
-                        f"{indent_str}  DebugTracker.record_state({idx + 1}, \"{var_part}\", {var_part})",
+                        f"{indent_str}  DebugTracker.record_state(__ENV__.file, {idx + 1}, \"{var_part}\", {var_part})",
                         f"{indent_str}rescue",
                         f"{indent_str}  e ->",
                         f"{indent_str}    DebugTracker.ad_script_output(\"Line {idx + 1} Failed: #{{inspect(e)}}\", true)",
@@ -127,15 +151,13 @@ def inject_into_file(file_path):
         return False
 
 
-def process_project(source_dir):
+def process_project(source_dir, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_ELIXIR_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
     print(f"\n[START] Building instrumented Elixir project layout...")
     
-    for root, _, files in os.walk(source_dir):
-        if any(x in root for x in ['_build', 'deps', '.git', '.elixir_ls']):
-            continue
+    for root, files in walk_project(source_dir, skip_dirs=['_build', 'deps', '.git', '.elixir_ls'], include=include, exclude=exclude):
         for file in files:
             if file.endswith(".ex") or file.endswith(".exs"):
                 src = os.path.join(root, file)
@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def generate_header():
     # Modified header strictly compliant with GDScript formatting (Uses Tabs)
@@ -28,6 +30,19 @@ static func _ad_script_output(msg: String, is_error: bool = true) -> void:
 \t\t\tfile.seek_end()
 \t\t\tfile.store_line(formatted)
 
+# One <stmt> row per executed line in the common trace schema (see trace_schema.py); the seq counter
+# is engine metadata, so every instrumented script shares it and the first record starts the file
+static func _ad_trace(script_file: String, line_no: int) -> void:
+\tif not _AD_DEBUG_ACTIVE: return
+\tvar seq: int = Engine.get_meta("_ad_trace_seq", 0)
+\tvar file = FileAccess.open("user://_VARIABLE_TRACKER.csv", FileAccess.WRITE if seq == 0 else FileAccess.READ_WRITE)
+\tif not file: return
+\tif seq == 0:
+\t\tfile.store_csv_line(PackedStringArray(["File", "Line", "Seq", "Thread", "Variable", "Type", "Value"]))
+\tfile.seek_end()
+\tfile.store_csv_line(PackedStringArray([script_file, str(line_no), str(seq), str(OS.get_thread_caller_id()), "<stmt>", "", ""]))
+\tEngine.set_meta("_ad_trace_seq", seq + 1)
+
 # ==========================================\n"""
 
 
@@ -37,6 +52,7 @@ def inject_into_file(file_path, max_depth=3):
             raw_content = f.read()
 
         raw_lines = raw_content.splitlines()
+        file_name = os.path.basename(file_path).replace('"', '')
         lines_meta = []
         in_multiline_comment = False
 
@@ -120,7 +136,8 @@ def inject_into_file(file_path, max_depth=3):
                     # GDScript does not use generic try/catch, we hook an execution log check right after runtime steps
                     block = [
                         f"{indent_str}{content_part}",
-                        f"{indent_str}_ad_script_output(\"Passed Line {idx + 1}: {content_part.replace('\"', '\\\"')}\", false)"
+                        f"{indent_str}_ad_script_output(\"Passed Line {idx + 1}: {content_part.replace('\"', '\\\"')}\", false)",
+                        f"{indent_str}_ad_trace(\"{file_name}\", {idx + 1})"
                     ]
                     transformed_lines[idx] = "\n".join(block)
             else:
@@ -135,14 +152,12 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_DEBUG_GD_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
     print(f"\n[START] Building instrumented GDScript layout...")
-    for root, _, files in os.walk(source_dir):
-        if any(x in root for x in ['.godot', '.git', 'addons']):
-            continue
+    for root, files in walk_project(source_dir, skip_dirs=['.godot', '.git', 'addons'], include=include, exclude=exclude):
         for file in files:
             if file.endswith(".gd"):
                 src = os.path.join(root, file)
@@ -3,6 +3,8 @@ import shutil
 import time
 import re
 
+from project_walker import walk_project
+
 # ==========================================
 # 1. THE CLOJURE LOGGER HEADER (V7.0)
 # ==========================================
@@ -17,12 +19,28 @@ def generate_clojure_header():
 
 (def ^:dynamic *ad-debug-active* true)
 
+;; Rows follow the common trace schema (see trace_schema.py). Every file gets this header, so the seq
+;; counter lives in the JVM's system properties; whichever file records first starts the trace.
+(defn- _ad-trace-seq []
+  (locking System
+    (let [props (System/getProperties)]
+      (or (.get props "_ad.trace.seq")
+          (let [counter (java.util.concurrent.atomic.AtomicLong.)]
+            (spit "_VARIABLE_TRACKER.csv" "File,Line,Seq,Thread,Variable,Type,Value\\n")
+            (.put props "_ad.trace.seq" counter)
+            counter)))))
+
 (defn- _record-state [line-no var-map]
   (when *ad-debug-active*
     (try
-      (with-open [writer (io/writer "_VARIABLE_TRACKER.csv" :append true)]
-        (csv/write-csv writer 
-          (map (fn [[k v]] [line-no (str k) (pr-str v)]) var-map)))
+      (let [counter (_ad-trace-seq)
+            file (str *file*)
+            thread (.getName (Thread/currentThread))]
+        (with-open [writer (io/writer "_VARIABLE_TRACKER.csv" :append true)]
+          (csv/write-csv writer
+            (doall (map (fn [[k v]] [file line-no (.getAndIncrement counter) thread (str k)
+                                     (if (nil? v) "nil" (.getName (class v))) (pr-str v)])
+                        var-map)))))
       (catch Exception _ nil))))
 
 (defn- _ad-log [msg is-error]
@@ -57,12 +75,14 @@ def inject_into_clojure(file_path):
         forms = re.split(r'\n(?=\()', content)
         new_content = [generate_clojure_header()]
 
+        next_line = 1
         for i, form in enumerate(forms):
+            line_no = next_line + len(form) - len(form.lstrip('\n'))
+            next_line += form.count('\n') + 1  # the split consumed the newline before each form
             if not form.strip(): continue
             
             # We wrap top-level forms in a try/catch to log failures
             # and inject a state recorder
-            line_no = i + 1
             instrumented_form = f"""
 (try
   (let [result {form.strip()}]
@@ -83,15 +103,13 @@ def inject_into_clojure(file_path):
 # ==========================================
 # 4. RUNNER (Universal)
 # ==========================================
-def process_project(source_dir):
+def process_project(source_dir, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_CLJ_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir): os.makedirs(target_dir)
     
     print(f"\n[START] Instrumenting Clojure Project...")
     
-    for root, _, files in os.walk(source_dir):
-        if any(x in root for x in ['target', '.git', '.lsp']): continue
-        
+    for root, files in walk_project(source_dir, skip_dirs=['target', '.git', '.lsp'], include=include, exclude=exclude):
         for file in files:
             if file.endswith((".clj", ".cljs", ".cljc")):
                 src = os.path.join(root, file)
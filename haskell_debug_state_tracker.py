@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def generate_header():
     """
@@ -12,10 +14,36 @@ def generate_header():
 -- AUTOMATED HASKELL DEBUG STATE TRACKER & INSTRUMENTATION WRAPPER
 -- =================================================================
 import qualified Debug.Trace as _Tr
+import qualified Data.IORef as _Ref
+import qualified System.Environment as _Env
+import qualified System.IO.Unsafe as _Unsafe
 
 {- DEBUG UTILITIES -}
-_logState :: String -> a -> a
-_logState msg expr = _Tr.trace ("[DEBUG] " ++ msg) expr
+-- Rows follow the common trace schema (see trace_schema.py); each module counts its own seq, and the
+-- first one to record in this process (marked in the environment) starts the file
+{-# NOINLINE _adSeq #-}
+_adSeq :: _Ref.IORef Int
+_adSeq = _Unsafe.unsafePerformIO (_Ref.newIORef 0)
+
+_adCsv :: String -> String
+_adCsv text
+  | any (`elem` ",\\"\\r\\n") text = "\\"" ++ concatMap (\\c -> if c == '"' then "\\"\\"" else [c]) text ++ "\\""
+  | otherwise = text
+
+{-# NOINLINE _logState #-}
+_logState :: String -> Int -> String -> a -> a
+_logState file line name expr = _Unsafe.unsafePerformIO $ do
+  started <- _Env.lookupEnv "_AD_TRACE_STARTED"
+  case started of
+    Nothing -> do
+      writeFile "_VARIABLE_TRACKER.csv" "File,Line,Seq,Thread,Variable,Type,Value\\n"
+      _Env.setEnv "_AD_TRACE_STARTED" "1"
+    Just _ -> return ()
+  seqNo <- _Ref.atomicModifyIORef' _adSeq (\\n -> (n + 1, n))
+  appendFile "_VARIABLE_TRACKER.csv" (_adCsv file ++ "," ++ show line ++ "," ++ show seqNo ++ ",,"
+                                     ++ _adCsv name ++ ",,\\n")
+  _Tr.traceIO ("[DEBUG] Evaluating Line " ++ show line ++ ": " ++ name)
+  return expr
 -- =================================================================
 """
 
@@ -26,6 +54,7 @@ def inject_into_file(file_path):
             raw_content = f.read()
 
         raw_lines = raw_content.splitlines()
+        file_name = os.path.basename(file_path).replace('"', '')
         transformed_lines = []
         in_block_comment = False
         has_module_decl = False
@@ -65,14 +94,14 @@ def inject_into_file(file_path):
             if not is_structural and not is_type_signature and '=' in stripped:
                 # Split the declaration from its assignment
                 parts = line.split('=', 1)
-                lhs = parts
-                rhs = parts
+                lhs = parts[0]
+                rhs = parts[1]
 
                 # Ensure it's not a syntax fragment
                 if rhs.strip():
                     # Inject Debug.Trace tracking wrapper safely around the execution block
-                    clean_msg = f"Evaluating Line {line_no}: {lhs.strip()[:20]}..."
-                    instrumented_rhs = f" (_logState \"{clean_msg}\" ({rhs.strip()}))"
+                    clean_name = lhs.strip()[:20].replace('\\', '\\\\').replace('"', '\\"')
+                    instrumented_rhs = f" (_logState \"{file_name}\" {line_no} \"{clean_name}\" ({rhs.strip()}))"
                     transformed_lines.append(f"{lhs}={instrumented_rhs}")
                     continue
 
@@ -93,18 +122,15 @@ def inject_into_file(file_path):
         return False
 
 
-def process_project(source_dir):
+def process_project(source_dir, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_HASKELL_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
         
     print(f"\n[START] Building instrumented Haskell project sandbox...")
     
-    for root, _, files in os.walk(source_dir):
-        # Ignore common package/build folders
-        if any(x in root for x in ['.stack-work', 'dist', 'dist-newstyle', '.git']):
-            continue
-            
+    # Ignore common package/build folders
+    for root, files in walk_project(source_dir, skip_dirs=['.stack-work', 'dist', 'dist-newstyle', '.git'], include=include, exclude=exclude):
         for file in files:
             if file.endswith(".hs") or file.endswith(".lhs"):
                 src = os.path.join(root, file)
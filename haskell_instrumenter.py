@@ -4,6 +4,8 @@ import shutil
 import time
 import re
 
+from project_walker import walk_project
+
 def generate_header():
     """
     Generates a Haskell instrumentation header using unsafe IO hooks 
@@ -95,7 +97,7 @@ def inject_into_file(file_path):
         print(f"Injection Error on {file_path}: {e}")
         return False
 
-def process_project(source_dir):
+def process_project(source_dir, include=None, exclude=None):
     # Initialize separate sandbox environment
     target_dir = source_dir.rstrip('\\/') + f"_HASKELL_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
@@ -111,10 +113,8 @@ def process_project(source_dir):
             else:
                 f.write(f"--- HASKELL SESSION START: {time.strftime('%Y-%m-%d %H:%M:%S')} ---\n")
 
-    for root, _, files in os.walk(source_dir):
-        # Ignore common build artifacts environments
-        if any(x in root for x in ['.stack-work', 'dist', 'dist-newstyle', '.git']):
-            continue
+    # Ignore common build artifacts environments
+    for root, files in walk_project(source_dir, skip_dirs=['.stack-work', 'dist', 'dist-newstyle', '.git'], include=include, exclude=exclude):
         for file in files:
             src = os.path.join(root, file)
             dst = os.path.join(target_dir, os.path.relpath(src, source_dir))
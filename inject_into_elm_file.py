@@ -8,6 +8,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def inject_into_elm_file(file_path):
     try:
@@ -67,6 +69,9 @@ def inject_into_elm_file(file_path):
 
         total_lines = len(lines_meta)
         transformed_lines = [None] * total_lines
+        # Elm only logs to the console, so each Debug.log tag carries the File, Line and Variable
+        # fields of the common trace schema (see trace_schema.py), ahead of ": <value>"
+        file_name = os.path.basename(file_path).replace('"', "").replace(",", "")
 
         # Phase 2: Structural Pipeline Injection
         for idx in range(total_lines):
@@ -110,7 +115,7 @@ def inject_into_elm_file(file_path):
                 left, right = line_text.split("->", 1)
                 clean_tag = left.strip().replace('"', '\\"')
                 transformed_lines[idx] = (
-                    f'{left}-> Debug.log "[Line {line_num}] Branch ({clean_tag})" <| {right}'
+                    f'{left}-> Debug.log "{file_name},{line_num},,,Branch ({clean_tag}),," <| {right}'
                 )
 
             # Target Value Assignments and Function Declarations
@@ -118,7 +123,7 @@ def inject_into_elm_file(file_path):
                 left, right = line_text.split("=", 1)
                 clean_tag = left.strip().replace('"', '\\"')
                 transformed_lines[idx] = (
-                    f'{left}= Debug.log "[Line {line_num}] Eval ({clean_tag})" <| {right}'
+                    f'{left}= Debug.log "{file_name},{line_num},,,Eval ({clean_tag}),," <| {right}'
                 )
 
             else:
@@ -134,20 +139,20 @@ def inject_into_elm_file(file_path):
         return False
 
 
-def process_elm_project(source_dir):
+def process_elm_project(source_dir, include=None, exclude=None):
     target_dir = source_dir.rstrip("\\/") + f"_ELM_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
 
     print(f"\n[START] Building instrumented Elm sandbox architecture...")
 
-    for root, _, files in os.walk(source_dir):
-        # Prevent mutating build collateral, dependency trees, or hidden metadata
-        if any(
-            x in root for x in ["elm-stuff", "node_modules", ".git", "tests"]
-        ):
-            continue
-
+    # Prevent mutating build collateral, dependency trees, or hidden metadata
+    for root, files in walk_project(
+        source_dir,
+        skip_dirs=["elm-stuff", "node_modules", ".git", "tests"],
+        include=include,
+        exclude=exclude,
+    ):
         for file in files:
             if file.endswith(".elm"):
                 src = os.path.join(root, file)
@@ -3,6 +3,8 @@ import shutil
 import time
 import re
 
+from project_walker import walk_project
+
 
 def generate_header():
     # Injected informational header for the modified Bluespec source files
@@ -22,7 +24,7 @@ def inject_into_file(file_path, max_depth=3):
         raw_lines = raw_content.splitlines()
 
         transformed_lines = []
-        filename = os.path.basename(file_path)
+        filename = os.path.basename(file_path).replace('"', "").replace(",", "")
 
         # Regex patterns to capture rule and method names in BSV
         rule_pattern = re.compile(r"\brule\s+([a-zA-Z0-9_]+)")
@@ -47,11 +49,11 @@ def inject_into_file(file_path, max_depth=3):
                 )
 
                 # Construct a strict 4-space padded hardware simulation display statement
-                # This automatically logs the execution time ($time), file, line number, and block name
+                # Each firing prints one row of the common trace schema (see trace_schema.py):
+                # file, line and block name, with the simulation time ($time) as the value
                 indent_str = leading_whitespace + "    "
                 trace_statement = (
-                    f'{indent_str}$display("[BSV_TRACE] [Time=%0d] File: {filename}, '
-                    f'Line: {idx + 1} | Fired {block_type}: {block_name}", $time);'
+                    f'{indent_str}$display("{filename},{idx + 1},,,{block_type} {block_name},time,%0d", $time);'
                 )
 
                 transformed_lines.append(trace_statement)
@@ -68,7 +70,7 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     # Establish a timestamped safe workspace folder mirroring your original code's design
     target_dir = source_dir.rstrip("\\/") + f"_BSV_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
@@ -76,14 +78,13 @@ def process_project(source_dir, max_depth):
 
     print(f"\n[START] Building instrumented Bluespec project layout...")
 
-    for root, _, files in os.walk(source_dir):
-        # Skip common non-source directories
-        if any(
-            x in root
-            for x in ["venv", ".git", "__pycache__", "build", "bdir", "simdir"]
-        ):
-            continue
-
+    # Skip common non-source directories
+    for root, files in walk_project(
+        source_dir,
+        skip_dirs=["venv", ".git", "__pycache__", "build", "bdir", "simdir"],
+        include=include,
+        exclude=exclude,
+    ):
         for file in files:
             # Target Bluespec SystemVerilog files
             if file.endswith(".bsv") or file.endswith(".bs"):
@@ -102,6 +103,10 @@ def process_project(source_dir, max_depth):
     print(
         " Run your Bluespec compiler (bsc) on this new directory to view runtime cycle logs."
     )
+    print(
+        " Save the simulation output under a 'File,Line,Seq,Thread,Variable,Type,Value' header"
+        " as _VARIABLE_TRACKER.csv to read it with ad_trace."
+    )
 
 
 if __name__ == "__main__":
@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def generate_header():
     # Tailored Mojo/Python universal modelines and logger blocks
@@ -14,6 +16,7 @@ def generate_header():
 # =====================================================================
 # Note: Mojo requires explicit typing/imports if handled natively. 
 # This header writes to external telemetry streams sequentially.
+from os import getenv, setenv
 
 def _ad_log_event(line_no: int, msg: str, is_error: bool = False):
     try:
@@ -28,6 +31,20 @@ def _ad_log_event(line_no: int, msg: str, is_error: bool = False):
     except:
         pass
 
+# One <stmt> row per executed step in the common trace schema (see trace_schema.py); the seq counter
+# lives in the environment so every instrumented module shares it, and the first row starts the file
+def _ad_trace(source: String, line_no: Int):
+    try:
+        var seq_text = getenv("_AD_TRACE_SEQ")
+        var seq = 0 if seq_text == "" else atol(seq_text)
+        _ = setenv("_AD_TRACE_SEQ", str(seq + 1))
+        with open("_VARIABLE_TRACKER.csv", "w" if seq == 0 else "a") as f:
+            if seq == 0:
+                f.write("File,Line,Seq,Thread,Variable,Type,Value\\n")
+            f.write(source + "," + str(line_no) + "," + str(seq) + ",,<stmt>,,\\n")
+    except:
+        pass
+
 # =====================================================================\n"""
 
 
@@ -39,6 +56,7 @@ def inject_into_file(file_path, max_depth=3):
         # Phase 1: Clean hidden non-breaking space anomalies variants globally
         raw_content = raw_content.replace('\xa0', ' ').replace('\u00a0', ' ')
         raw_lines = raw_content.splitlines()
+        file_name = os.path.basename(file_path).replace(",", "").replace('"', "")
 
         lines_meta = []
         in_triple_quote = False
@@ -132,6 +150,7 @@ def inject_into_file(file_path, max_depth=3):
                         f"{indent_str}try:",
                         f"{indent_str}    {content_part}",
                         f"{indent_str}    _ad_log_event({idx + 1}, 'Step Executed Successfully')",
+                        f"{indent_str}    _ad_trace(\"{file_name}\", {idx + 1})",
                         f"{indent_str}except e:",
                         f"{indent_str}    _ad_log_event({idx + 1}, 'Block Context Execution Failed', is_error=True)",
                         f"{indent_str}    raise e"
@@ -149,17 +168,15 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_MOJO_DEBUG_STATE_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
         
     print(f"\n[START] Building instrumented Mojo sandbox environment...")
     
-    for root, _, files in os.walk(source_dir):
-        # Prevent traversal into heavy project cache directories
-        if any(x in root for x in ['venv', '.git', '__pycache__', '.mojo_cache']):
-            continue
+    # Prevent traversal into heavy project cache directories
+    for root, files in walk_project(source_dir, skip_dirs=['venv', '.git', '__pycache__', '.mojo_cache'], include=include, exclude=exclude):
         for file in files:
             # Targets both standard Python files, Mojo extensions, and magic-fire extensions
             if file.endswith((".py", ".mojo", ".🔥")):
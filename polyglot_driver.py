@@ -0,0 +1,321 @@
+import argparse
+import collections
+import contextlib
+import importlib.machinery
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from project_walker import PYTHON_ENV_DIRS, walk_project
+from project_watcher import watch_project
+from sandbox_copy import clone_file, summarize
+
+# ==========================================
+# 1. THE PLUGIN REGISTRY (file extension -> language injector script)
+# ==========================================
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGINS = {}     # language -> Plugin
+EXTENSIONS = {}  # ".ext" -> language
+
+# Union of the per-language runners' build/dependency folders
+DRIVER_SKIP_DIRS = PYTHON_ENV_DIRS + ['.git', '__pycache__', 'node_modules', 'build', 'dist', 'target', 'bin',
+                                      'obj', '.stack-work', 'dist-newstyle', 'zig-cache', 'zig-out', '_build', 'deps',
+                                      'elm-stuff', '.dart_tool', 'vendor', '.godot', 'sim_build', '.bsp', '.metals',
+                                      '.bloop']
+
+
+class Plugin:
+    """One language: the script that instruments it, how to call it, and the support files it needs."""
+
+    def __init__(self, language, module_file, handler, extensions, setup=None, skip_suffixes=(), claims=None):
+        self.language = language
+        self.module_file = module_file
+        self.handler = handler
+        self.extensions = extensions
+        self.setup = setup
+        self.skip_suffixes = skip_suffixes
+        self.claims = claims  # claims(path): False for a file of another language sharing the extension
+        self._module = None
+        self.error = None
+
+    def load(self):
+        """Imports the language script once per process (most have no .py suffix, so load by path)."""
+        if self._module is None:
+            path = os.path.join(PLUGIN_DIR, self.module_file)
+            loader = importlib.machinery.SourceFileLoader(f"_ad_plugin_{self.language}", path)
+            spec = importlib.util.spec_from_loader(loader.name, loader)
+            module = importlib.util.module_from_spec(spec)
+            loader.exec_module(module)
+            self._module = module
+        return self._module
+
+    def available(self):
+        if self._module is None and self.error is None:
+            try:
+                self.load()
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+        return self.error is None
+
+
+def register(language, module_file, handler, extensions, setup=None, skip_suffixes=(), claims=None):
+    """Adds (or replaces) a language; later registrations win the extensions they name."""
+    PLUGINS[language] = Plugin(language, module_file, handler, extensions, setup, skip_suffixes, claims)
+    for ext in extensions:
+        EXTENSIONS[ext] = language
+
+
+def plugin_for(path):
+    language = EXTENSIONS.get(os.path.splitext(path)[1])
+    if language is None:
+        return None
+    plugin = PLUGINS[language]
+    if path.endswith(plugin.skip_suffixes) or (plugin.claims is not None and not plugin.claims(path)):
+        return None
+    return plugin
+
+
+# Extensions two languages share (.pl Prolog/Perl, .m MATLAB/Objective-C) are settled by the file's head
+_PERL_MARKERS = re.compile(r'^\s*(?:use\s+(?:strict|warnings|[A-Z]\w*(?:::\w+)*)\b|my\s+[$@%]|'
+                           r'sub\s+\w+\s*\{|package\s+[\w:]+\s*;)', re.M)
+_PROLOG_CLAUSE = re.compile(r'^[a-z]\w*(?:\(.*\))?\s*(?::-.*)?\.\s*(?:%.*)?$', re.M)
+_OBJC_MARKERS = re.compile(r'^\s*(?:#\s*(?:import|include)\b|@(?:interface|implementation|protocol|end)\b)', re.M)
+
+
+def _head(path, size=4096):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read(size)
+    except OSError:
+        return ""
+
+
+def _is_prolog(path):
+    head = _head(path)
+    if head.startswith("#!"):
+        return "perl" not in head.split("\n", 1)[0]
+    return (":-" in head or bool(_PROLOG_CLAUSE.search(head))) and not _PERL_MARKERS.search(head)
+
+
+def _is_matlab(path):
+    return not _OBJC_MARKERS.search(_head(path))
+
+# ==========================================
+# 2. BUILT-IN LANGUAGES (handlers receive the loaded script, src, dst, max_depth, target_dir)
+# ==========================================
+def inject(function_name, depth=False):
+    """Handler for the common runner shape: copy into the sandbox, then rewrite the copy in place."""
+    def handler(module, src, dst, max_depth, target_dir):
+        shutil.copy2(src, dst)
+        function = getattr(module, function_name)
+        return function(dst, max_depth) if depth else function(dst)
+    return handler
+
+
+def _python(module, src, dst, max_depth, target_dir):
+    return module.instrument_project_file(src, dst, max_depth, runtime_dir=target_dir)
+
+
+def _glsl(module, src, dst, max_depth, target_dir):
+    module.sandbox_glsl_file(Path(src), Path(dst), Path(target_dir), max_depth)
+
+
+def _java(module, src, dst, max_depth, target_dir):
+    shutil.copy2(src, dst)
+    return module.inject_with_ast(dst, os.path.basename(dst))
+
+
+def support_files(*files):
+    """Setup hook writing (relative path, generator function name) pairs at the sandbox root."""
+    def setup(module, target_dir):
+        for rel_path, generator in files:
+            path = os.path.join(target_dir, rel_path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            content = getattr(module, generator)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content() if callable(content) else content)
+    return setup
+
+
+def _glsl_setup(module, target_dir):
+    with open(os.path.join(target_dir, "_GLSL_VARIABLE_TRACKER.csv"), "w", encoding="utf-8", newline='') as f:
+        f.write("File,Line,Seq,Thread,Variable,Type,Value\r\n")
+
+
+register("python", "debugger_application.py", _python, (".py",),
+         setup=support_files(("_ad_runtime.py", "generate_runtime")))
+register("cpp", "AdDebugLogger.py", inject("inject_into_cpp_file"), (".cpp", ".cc", ".cxx"),
+         setup=support_files(("AdDebugLogger.h", "generate_cpp_header"), ("AdDebugLogger.cpp", "generate_cpp_source")))
+register("c", "generate_c_header", inject("inject_into_c_file"), (".c",))
+register("javascript", "generate_js_header", inject("inject_into_js_file", depth=True), (".js",))
+register("typescript", "generate_ts_header", inject("inject_into_ts_file"), (".ts",), skip_suffixes=(".d.ts",))
+register("go", "generate_go_debug_util", inject("inject_into_go_file"), (".go",))
+register("java", "generate_java_logger_class", _java, (".java",),
+         setup=support_files(("com/addebug/AdDebugLogger.java", "generate_java_logger_class")))
+register("swift", "inject_into_swift", inject("inject_into_swift"), (".swift",),
+         setup=support_files(("AD_Logger.swift", "SWIFT_LOGGER_CONTENT")), skip_suffixes=("AD_Logger.swift",))
+register("ruby", "inject_into_ruby", inject("inject_into_ruby", depth=True), (".rb",))
+register("php", "generate_php_header", inject("inject_into_php_file"), (".php",))
+register("lua", "generate_lua_header", inject("inject_into_lua_file", depth=True), (".lua",))
+register("julia", "generate_julia_header", inject("inject_into_julia", depth=True), (".jl",))
+register("matlab", "generate_matlab_header", inject("inject_into_matlab"), (".m",), claims=_is_matlab)
+register("dart", "get_dart_header", inject("inject_into_dart_file"), (".dart",))
+register("zig", "generate_zig_header", inject("inject_into_zig", depth=True), (".zig",))
+register("bash", "generate_bash_header", inject("inject_into_bash_file"), (".sh",))
+register("solidity", "generate_solidity_header", inject("inject_into_solidity"), (".sol",))
+register("prolog", "generate_prolog_header", inject("inject_into_prolog_file"), (".pl", ".pro", ".P"),
+         claims=_is_prolog)
+register("typst", "generate_typst_header", inject("inject_into_typst_file"), (".typ",))
+register("elm", "inject_into_elm_file.py", inject("inject_into_elm_file"), (".elm",))
+register("elixir", "ex_debug_injector.py", inject("inject_into_file"), (".ex", ".exs"))
+register("clojure", "generate_clojure_header.py", inject("inject_into_clojure"), (".clj", ".cljs", ".cljc"))
+register("haskell", "haskell_debug_state_tracker.py", inject("inject_into_file"), (".hs", ".lhs"))
+register("scala", "scala_instrumenter.py", inject("inject_into_file", depth=True), (".scala", ".sc"))
+register("bluespec", "instrument_bsv_debug.py", inject("inject_into_file", depth=True), (".bsv", ".bs"))
+register("godot", "gd_instrumenter.py", inject("inject_into_file", depth=True), (".gd",))
+register("mojo", "mojo_state_tracker.py", inject("inject_into_file", depth=True), (".mojo", ".🔥"))
+register("qsharp", "process_qsharp_project", inject("inject_into_qsharp"), (".qs",))
+register("systemverilog", "generate_sv_header", inject("instrument_sv_file"), (".sv", ".v"))
+register("glsl", "generate_glsl_debug_header", _glsl, (".glsl", ".frag", ".vert", ".geom", ".comp", ".tesc", ".tese"),
+         setup=_glsl_setup)
+
+# ==========================================
+# 3. THE DRIVER (one walk, one sandbox, a worker pool, one report)
+# ==========================================
+def _instrument_task(task):
+    """Runs in a worker: instruments one file and captures whatever the injector printed."""
+    language, src, dst, max_depth, target_dir = task
+    plugin = PLUGINS[language]
+    out = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(out):
+            ok = plugin.handler(plugin.load(), src, dst, max_depth, target_dir) is not False
+    except Exception as e:
+        ok = False
+        out.write(f"{type(e).__name__}: {e}\n")
+    return language, src, ok, time.perf_counter() - start, out.getvalue().strip()
+
+
+def _print_report(report):
+    print(f"\n    {'language':<14}{'plugin':<32}{'files':>7}{'failed':>8}{'cpu sec':>9}")
+    for language, row in sorted(report["languages"].items()):
+        print(f"    {language:<14}{row['plugin']:<32}{row['files']:>7,}{row['failed']:>8,}{row['seconds']:>9.2f}")
+    if report["untouched"]:
+        print(f"\n    Untouched files: {summarize(report['untouched'])}")
+    for language, error in sorted(report["unavailable"].items()):
+        print(f"    [SKIPPED] {language}: plugin unavailable ({error})")
+    for entry in report["failures"]:
+        print(f"    [FAILED] {entry['file']} ({entry['language']}): {entry['output'] or 'injector returned False'}")
+
+
+def process_polyglot_project(source_dir, max_depth=3, jobs=None, languages=None, include=None, exclude=None,
+                             watch=False):
+    target_dir = source_dir.rstrip('\\/') + f"_POLYGLOT_DEBUG_{int(time.time())}"
+    os.makedirs(target_dir, exist_ok=True)
+    print(f"\n[START] Building one instrumented sandbox for every language...")
+    start = time.perf_counter()
+
+    tasks, used = [], set()
+    report = {"languages": {}, "untouched": collections.Counter(), "unavailable": {}, "failures": [], "files": []}
+    for root, files in walk_project(source_dir, skip_dirs=DRIVER_SKIP_DIRS, include=include, exclude=exclude):
+        for file in files:
+            src = os.path.join(root, file)
+            dst = os.path.join(target_dir, os.path.relpath(src, source_dir))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            plugin = plugin_for(src)
+            if plugin is not None and (languages is None or plugin.language in languages):
+                if plugin.available():
+                    tasks.append((plugin.language, src, dst, max_depth, target_dir))
+                    used.add(plugin.language)
+                    continue
+                report["unavailable"][plugin.language] = plugin.error
+            report["untouched"][clone_file(src, dst)] += 1
+
+    for language in sorted(used):
+        plugin = PLUGINS[language]
+        if plugin.setup is not None:
+            plugin.setup(plugin.load(), target_dir)
+
+    if jobs == 1 or len(tasks) < 2:
+        results = map(_instrument_task, tasks)
+    else:
+        jobs = jobs or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(_instrument_task, tasks, chunksize=max(1, len(tasks) // (jobs * 8)))
+    try:
+        for language, src, ok, seconds, output in results:
+            rel_path = os.path.relpath(src, source_dir)
+            row = report["languages"].setdefault(
+                language, {"plugin": PLUGINS[language].module_file, "files": 0, "failed": 0, "seconds": 0.0})
+            row["files"] += 1
+            row["seconds"] += seconds
+            entry = {"file": rel_path, "language": language, "ok": ok, "seconds": round(seconds, 6), "output": output}
+            report["files"].append(entry)
+            if not ok:
+                row["failed"] += 1
+                report["failures"].append(entry)
+    finally:
+        if not (jobs == 1 or len(tasks) < 2):
+            executor.shutdown()
+
+    report["wall_seconds"] = time.perf_counter() - start
+    with open(os.path.join(target_dir, "_INSTRUMENTATION_REPORT.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    _print_report(report)
+    print(f"\n[FINISH] {len(tasks):,} files instrumented in {report['wall_seconds']:.2f}s. Sandbox: {target_dir}")
+
+    if watch:
+        def instrument(src, dst):
+            plugin = plugin_for(src)
+            if plugin is not None and (languages is None or plugin.language in languages) and plugin.available():
+                _, _, ok, _, output = _instrument_task((plugin.language, src, dst, max_depth, target_dir))
+                if output:
+                    print(f"        {output}")
+            else:
+                clone_file(src, dst)
+
+        watch_project(source_dir, target_dir, instrument, skip_dirs=DRIVER_SKIP_DIRS, include=include,
+                      exclude=exclude)
+    return report
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Instrument every supported language of a project in one pass.")
+        parser.add_argument("path", help="Project folder")
+        parser.add_argument("--depth", type=int, default=3, help="Max nesting depth for injectors that take one (default 3)")
+        parser.add_argument("--jobs", type=int, help="Worker processes (default: CPU count)")
+        parser.add_argument("--only", help="Comma-separated languages to instrument, e.g. python,cpp,javascript")
+        parser.add_argument("--include", action="append", metavar="GLOB", help="Only consider matching files (gitignore syntax, repeatable)")
+        parser.add_argument("--exclude", action="append", metavar="GLOB", help="Skip matching files/folders (gitignore syntax, repeatable)")
+        parser.add_argument("--watch", action="store_true", help="Keep re-instrumenting changed files into the sandbox")
+        parser.add_argument("--list", action="store_true", help="List the registered languages and exit")
+        args = parser.parse_args()
+        if args.list:
+            for language, plugin in sorted(PLUGINS.items()):
+                print(f"{language:<14}{' '.join(plugin.extensions):<40}{plugin.module_file}")
+            sys.exit(0)
+        p, d, jobs, watch = args.path, args.depth, args.jobs, args.watch
+        only = set(args.only.split(",")) if args.only else None
+        include, exclude = args.include, args.exclude
+    else:
+        p = input("Project Path: ").strip().strip('"')
+        try:
+            d = int(input("Max Depth (default 3): ").strip() or 3)
+        except:
+            d = 3
+        only = {x.strip() for x in input("Languages (comma-separated, blank for all): ").split(",") if x.strip()} or None
+        watch = input("Watch for changes and re-instrument them live? (y/N): ").strip().lower() == "y"
+        jobs = include = exclude = None
+    if os.path.isdir(p):
+        process_polyglot_project(p, d, jobs, only, include, exclude, watch)
+    else:
+        print("Invalid directory path.")
@@ -0,0 +1,216 @@
+import os
+import re
+
+# ==========================================
+# 1. THE PATTERN COMPILER (.gitignore-style globs -> one regex per rule list)
+# ==========================================
+def glob_to_regex(glob):
+    """Translates one gitignore glob body ('*' and '?' stay inside a path segment, '**' spans segments)."""
+    out, i, n = [], 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == '*':
+            if glob.startswith('**', i) and (i == 0 or glob[i - 1] == '/') and (i + 2 == n or glob[i + 2] == '/'):
+                if i + 2 == n:
+                    out.append('.*')  # 'dir/**' -> everything inside
+                    i += 2
+                else:
+                    out.append('(?:.*/)?')  # '**/' -> zero or more directories
+                    i += 3
+                continue
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            j = i + 1
+            if j < n and glob[j] in '!^':
+                j += 1
+            if j < n and glob[j] == ']':
+                j += 1
+            j = glob.find(']', j)
+            if j == -1:
+                out.append('\\[')
+            else:
+                body = glob[i + 1:j]
+                out.append('[' + ('^' + body[1:] if body[0] in '!^' else body) + ']')
+                i = j + 1
+                continue
+        elif c == '\\' and i + 1 < n:
+            out.append(re.escape(glob[i + 1]))
+            i += 2
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+class IgnoreRules:
+    """
+    One .gitignore-style rule list. All rules are joined into a single alternation in reverse order,
+    each tagged with an empty named group, so one fullmatch finds the last rule that applies.
+    """
+
+    def __init__(self, patterns):
+        file_alts, dir_alts = [], []
+        self._negated = {}
+        for i, line in enumerate(patterns):
+            pattern = line.rstrip('\n')
+            pattern = pattern if pattern.endswith('\\ ') else pattern.rstrip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negated = pattern.startswith('!')
+            if negated:
+                pattern = pattern[1:]
+            elif pattern.startswith(('\\#', '\\!')):
+                pattern = pattern[1:]
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if not pattern:
+                continue
+            # A slash at the start or middle anchors the rule to the directory holding it
+            anchored = '/' in pattern
+            body = glob_to_regex(pattern.lstrip('/'))
+            alt = f"{body if anchored else '(?:.*/)?' + body}(?P<r{i}>)"
+            dir_alts.append(alt)
+            if not dir_only:
+                file_alts.append(alt)
+            self._negated[f"r{i}"] = negated
+        self._file_regex = re.compile('|'.join(reversed(file_alts))) if file_alts else None
+        self._dir_regex = re.compile('|'.join(reversed(dir_alts))) if dir_alts else None
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return cls(f.readlines())
+
+    def match(self, rel_path, is_dir):
+        """True if ignored, False if re-included by a '!' rule, None if no rule applies."""
+        regex = self._dir_regex if is_dir else self._file_regex
+        if regex is None:
+            return None
+        m = regex.fullmatch(rel_path)
+        if m is None:
+            return None
+        return not self._negated[m.lastgroup]
+
+# ==========================================
+# 2. THE WALKER (os.scandir, pruning excluded directories before descending)
+# ==========================================
+# Folder names Python environments usually get; any other virtualenv is found by its pyvenv.cfg
+PYTHON_ENV_DIRS = ['venv', '.venv', 'env', '.tox', 'site-packages']
+VIRTUALENV_MARKER = 'pyvenv.cfg'
+
+
+def _ignored(layers, rel_path, is_dir):
+    # Deeper .gitignore files take precedence over shallower ones and the runner's own rules
+    for rules, base in reversed(layers):
+        result = rules.match(rel_path[len(base):], is_dir)
+        if result is not None:
+            return result
+    return False
+
+
+def _base_rules(skip_dirs, include, exclude):
+    base_rules = IgnoreRules(['.git/'] + [d.rstrip('/') + '/' for d in skip_dirs] + list(exclude or []))
+    return base_rules, (IgnoreRules(include) if include else None)
+
+
+def _gitignore_layer(dir_path, rel_dir):
+    try:
+        return [(IgnoreRules.from_file(os.path.join(dir_path, '.gitignore')), rel_dir)]
+    except OSError:
+        return []
+
+
+def walk_project(source_dir, skip_dirs=(), include=None, exclude=None, use_gitignore=True, skip_virtualenvs=True):
+    """
+    Drop-in for os.walk in the project runners: yields (root, files) top-down with the same root
+    spelling. skip_dirs are directory names (or root-relative paths) never descended into; include
+    and exclude are gitignore-style globs relative to source_dir, and every .gitignore found on the
+    way applies to its own subtree. Excluded directories are pruned, never listed; so are
+    virtualenvs (folders holding a pyvenv.cfg) whatever their name, unless skip_virtualenvs is False.
+    """
+    base_rules, include_rules = _base_rules(skip_dirs, include, exclude)
+
+    stack = [(source_dir, "", [(base_rules, "")])]
+    while stack:
+        root, rel_root, layers = stack.pop()
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        if skip_virtualenvs and rel_root and any(entry.name == VIRTUALENV_MARKER for entry in entries):
+            continue
+
+        if use_gitignore:
+            for entry in entries:
+                if entry.name == '.gitignore' and entry.is_file():
+                    layers = layers + _gitignore_layer(root, rel_root)
+                    break
+
+        files, subdirs = [], []
+        for entry in entries:
+            rel_path = rel_root + entry.name
+            try:
+                is_dir = entry.is_dir()
+                if is_dir and entry.is_symlink():
+                    continue  # like os.walk(followlinks=False)
+            except OSError:
+                continue
+            if _ignored(layers, rel_path, is_dir):
+                continue
+            if is_dir:
+                subdirs.append((entry.path, rel_path + '/', layers))
+            elif include_rules is None or include_rules.match(rel_path, False):
+                files.append(entry.name)
+
+        yield root, files
+        stack.extend(reversed(subdirs))
+
+
+class PathFilter:
+    """
+    Answers "would walk_project yield this file?" for single paths, e.g. ones reported by a file
+    watcher. The .gitignore layers of each directory are cached; call reset() when one changes.
+    """
+
+    def __init__(self, source_dir, skip_dirs=(), include=None, exclude=None, use_gitignore=True,
+                 skip_virtualenvs=True):
+        self.source_dir = source_dir
+        self.use_gitignore = use_gitignore
+        self.skip_virtualenvs = skip_virtualenvs
+        self._base, self._include = _base_rules(skip_dirs, include, exclude)
+        self.reset()
+
+    def reset(self):
+        self._dir_layers = {"": self._layers_for("")}
+
+    def _layers_for(self, rel_dir, parent_layers=None):
+        layers = parent_layers if parent_layers is not None else [(self._base, "")]
+        if self.use_gitignore:
+            layers = layers + _gitignore_layer(os.path.join(self.source_dir, rel_dir), rel_dir)
+        return layers
+
+    def dir_layers(self, rel_dir):
+        """Rule layers in force inside rel_dir ('a/b/' form), or None if rel_dir itself is excluded."""
+        if rel_dir in self._dir_layers:
+            return self._dir_layers[rel_dir]
+        parent = rel_dir[:rel_dir.rstrip('/').rfind('/') + 1]
+        parent_layers = self.dir_layers(parent)
+        if parent_layers is None or _ignored(parent_layers, rel_dir.rstrip('/'), True):
+            layers = None
+        elif self.skip_virtualenvs and os.path.isfile(os.path.join(self.source_dir, rel_dir, VIRTUALENV_MARKER)):
+            layers = None
+        else:
+            layers = self._layers_for(rel_dir, parent_layers)
+        self._dir_layers[rel_dir] = layers
+        return layers
+
+    def accepts(self, rel_path):
+        """rel_path uses '/' separators and is relative to source_dir."""
+        layers = self.dir_layers(rel_path[:rel_path.rfind('/') + 1])
+        if layers is None or _ignored(layers, rel_path, False):
+            return False
+        return self._include is None or bool(self._include.match(rel_path, False))
@@ -0,0 +1,224 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import shutil
+import struct
+import sys
+import time
+
+from project_walker import PathFilter, walk_project
+
+# ==========================================
+# 1. CHANGE SOURCES (inotify through ctypes on Linux, stat polling everywhere else)
+# ==========================================
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+               IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class StatScanner:
+    """Polls (mtime, size) of every watched file; portable but costs one stat per file per poll."""
+
+    def __init__(self, source_dir, walk_args, poll_interval=0.1):
+        self.source_dir = source_dir
+        self.walk_args = walk_args
+        self.poll_interval = poll_interval
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        skip = len(self.source_dir.rstrip('\\/')) + 1
+        for root, files in walk_project(self.source_dir, **self.walk_args):
+            # walk_project keeps the source_dir spelling, so slicing beats os.path.relpath here
+            rel_root = (root[skip:].replace(os.sep, '/') + '/') if len(root) >= skip else ''
+            for file in files:
+                try:
+                    st = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                snapshot[rel_root + file] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout=None):
+        time.sleep(self.poll_interval if timeout is None else min(timeout, self.poll_interval))
+        current = self._scan()
+        old, self._snapshot = self._snapshot, current
+        return {p for p in current.keys() | old.keys() if current.get(p) != old.get(p)}
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """One inotify watch per non-excluded directory; new directories are picked up as they appear."""
+
+    def __init__(self, source_dir, path_filter):
+        self.source_dir = source_dir
+        self.path_filter = path_filter
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, "O_CLOEXEC", 0))
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs = {}  # watch descriptor -> rel dir ('' or 'a/b/')
+        self.add_tree("")
+
+    def add_tree(self, rel_dir):
+        """Watches rel_dir and everything below it; returns the files already inside (for late-created dirs)."""
+        found = set()
+        stack = [rel_dir]
+        while stack:
+            current = stack.pop()
+            if self.path_filter.dir_layers(current) is None:
+                continue
+            path = os.path.join(self.source_dir, current) if current else self.source_dir
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+            if wd < 0:
+                continue
+            self._dirs[wd] = current
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(current + entry.name + '/')
+                        elif rel_dir:
+                            found.add(current + entry.name)
+            except OSError:
+                pass
+        return found
+
+    def drop_tree(self, rel_dir):
+        for wd, watched in list(self._dirs.items()):
+            if watched.startswith(rel_dir):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def wait(self, timeout=None):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 1 << 16)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + name_len].rstrip(b"\0")
+                offset += _EVENT_HEADER.size + name_len
+                if mask & IN_Q_OVERFLOW:
+                    changed.add(None)  # events were lost: caller rescans everything
+                    continue
+                if mask & IN_IGNORED:
+                    self._dirs.pop(wd, None)
+                    continue
+                rel_dir = self._dirs.get(wd)
+                if rel_dir is None or not name:
+                    continue
+                rel_path = rel_dir + os.fsdecode(name)
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        changed |= self.add_tree(rel_path + '/')
+                    elif mask & IN_MOVED_FROM:
+                        self.drop_tree(rel_path + '/')
+                        changed.add(rel_path + '/')
+                    elif mask & IN_DELETE:
+                        changed.add(rel_path + '/')
+                    continue
+                changed.add(rel_path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+# ==========================================
+# 2. THE WATCH LOOP (debounce, re-instrument only what changed, report latency)
+# ==========================================
+def _remove_from_sandbox(dst):
+    for path in (dst, dst + ".admap"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def watch_project(source_dir, target_dir, instrument, suffixes=None, skip_dirs=(), include=None, exclude=None,
+                  debounce=0.03, poll_interval=0.1, use_inotify=True, remove=_remove_from_sandbox):
+    """
+    Keeps an existing sandbox in sync with source_dir until Ctrl+C. instrument(src, dst) re-creates one
+    sandbox file; it runs only for files the project walk would include. Bursts of saves are merged
+    until the tree has been quiet for `debounce` seconds.
+    """
+    walk_args = dict(skip_dirs=skip_dirs, include=include, exclude=exclude)
+    path_filter = PathFilter(source_dir, **walk_args)
+    source = None
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            source = InotifyWatcher(source_dir, path_filter)
+        except (OSError, AttributeError):
+            source = None
+    if source is None:
+        source = StatScanner(source_dir, walk_args, poll_interval)
+    print(f"\n[WATCH] Watching {source_dir} via {type(source).__name__} (Ctrl+C to stop)...")
+
+    pending = set()
+    try:
+        while True:
+            changed = source.wait(debounce if pending else None)
+            if changed:
+                pending |= changed
+                continue
+            if not pending:
+                continue
+
+            if None in pending or any(p.rsplit('/', 1)[-1] == '.gitignore' for p in pending):
+                path_filter.reset()
+            if None in pending:
+                pending = {os.path.relpath(os.path.join(root, f), source_dir).replace(os.sep, '/')
+                           for root, files in walk_project(source_dir, **walk_args) for f in files}
+            for rel_path in sorted(pending):
+                src = os.path.join(source_dir, rel_path)
+                dst = os.path.join(target_dir, rel_path)
+                if rel_path.endswith('/'):
+                    # A directory moved away or deleted: drop its whole sandbox subtree
+                    if not os.path.isdir(src) and os.path.isdir(dst):
+                        shutil.rmtree(dst)
+                        print(f"    [WATCH] Removed {rel_path}")
+                    continue
+                if suffixes and not rel_path.endswith(suffixes):
+                    continue
+                start = time.perf_counter()
+                if not os.path.isfile(src) or not path_filter.accepts(rel_path):
+                    if os.path.exists(dst):
+                        remove(dst)
+                        print(f"    [WATCH] Removed {rel_path}")
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    instrument(src, dst)
+                except Exception as e:
+                    # One unreadable or half-saved file must not end the session; its next save retries it
+                    print(f"    [WATCH] {rel_path} failed to re-instrument: {type(e).__name__}: {e}")
+                    continue
+                elapsed = (time.perf_counter() - start) * 1000
+                try:
+                    since_save = (time.time() - os.stat(src).st_mtime) * 1000
+                except OSError:
+                    since_save = elapsed
+                print(f"    [WATCH] {rel_path} re-instrumented in {elapsed:.1f} ms (save -> ready {since_save:.1f} ms)")
+            pending = set()
+    except KeyboardInterrupt:
+        print("\n[WATCH] Stopped.")
+    finally:
+        source.close()
@@ -3,6 +3,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 def generate_header():
     # Added Universal IDE Modelines to force the editor engine to lock to spaces.
     # The injected header strictly uses 4-space blocks for its internal hierarchy.
@@ -190,14 +192,12 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_DEBUG_STATE_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
     print(f"\n[START] Building instrumented project layout...")
-    for root, _, files in os.walk(source_dir):
-        if any(x in root for x in ['venv', '.git', '__pycache__']):
-            continue
+    for root, files in walk_project(source_dir, skip_dirs=['venv', '.git', '__pycache__'], include=include, exclude=exclude):
         for file in files:
             if file.endswith(".py"):
                 src = os.path.join(root, file)
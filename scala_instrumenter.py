@@ -2,6 +2,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def generate_header():
     """Generates a Scala utility singleton object for unified state and logging."""
@@ -21,7 +23,7 @@ object _ScalaDebugTracker {
       try {
         val pw = new PrintWriter(new File(fName))
         if (fName.endsWith(".csv")) {
-          pw.write("Line,Variable,Value\\n")
+          pw.write("File,Line,Seq,Thread,Variable,Type,Value\\n")
         } else {
           pw.write(s"--- SESSION START: ${LocalDateTime.now()} ---\\n")
         }
@@ -35,17 +37,32 @@ object _ScalaDebugTracker {
   // Initialize logs once upon class load
   resetLogs()
 
-  def recordState(lineNo: Int, varName: String, value: Any): Unit = {
+  // Rows follow the common trace schema (see trace_schema.py)
+  private val seq = new java.util.concurrent.atomic.AtomicLong()
+
+  private def csv(text: String): String =
+    if (text.exists(c => c == ',' || c == '"' || c == '\\r' || c == '\\n')) "\\"" + text.replace("\\"", "\\"\\"") + "\\""
+    else text
+
+  private def writeRow(file: String, lineNo: Int, varName: String, kind: String, value: String): Unit = synchronized {
     try {
       val fw = new FileWriter("_VARIABLE_TRACKER.csv", true)
-      val cleanVal = s"$value".replace("\\n", " ").replace("\\r", "")
-      fw.write(s"$lineNo,$varName,\\"$cleanVal\\"\\n")
+      val thread = Thread.currentThread().getName
+      fw.write(s"${csv(file)},$lineNo,${seq.getAndIncrement()},${csv(thread)},${csv(varName)},$kind,${csv(value)}\\n")
       fw.close()
     } catch {
       case _: Exception => // Suppress
     }
   }
 
+  def recordState(file: String, lineNo: Int, varName: String, value: Any): Unit = {
+    val kind = if (value == null) "" else value.getClass.getSimpleName
+    writeRow(file, lineNo, varName, kind, s"$value".replace("\\n", " ").replace("\\r", ""))
+  }
+
+  // One <stmt> record per executed statement
+  def traceLine(file: String, lineNo: Int): Unit = writeRow(file, lineNo, "<stmt>", "", "")
+
   def logOutput(msg: String, isError: Boolean = true): Unit = {
     val timestamp = LocalDateTime.now().format(formatter)
     val formatted = if (isError) s"[DEBUG_ERROR] [$timestamp] $msg" else s"[SCRIPT] $msg"
@@ -113,6 +130,7 @@ def inject_into_file(file_path, max_depth=3):
 
         total_lines = len(lines_meta)
         transformed_lines = [None] * total_lines
+        file_name = os.path.basename(file_path).replace('"', '')
         
         # Scala structural headers we don't want to wrap directly in try-catch
         structural_keywords = (
@@ -147,6 +165,7 @@ def inject_into_file(file_path, max_depth=3):
                 block = [
                     f"{indent_str}try {{",
                     f"{indent_str}  {stmt}",
+                    f"{indent_str}  _ScalaDebugTracker.traceLine(\"{file_name}\", {idx + 1})",
                     f"{indent_str}}} catch {{",
                     f"{indent_str}  case e: Throwable => ",
                     f"{indent_str}    _ScalaDebugTracker.logOutput(\"Line {idx + 1} Failed: \" + e.getMessage, true)",
@@ -167,16 +186,14 @@ def inject_into_file(file_path, max_depth=3):
         return False
 
 
-def process_project(source_dir, max_depth):
+def process_project(source_dir, max_depth, include=None, exclude=None):
     target_dir = source_dir.rstrip('\\/') + f"_SCALA_DEBUG_{int(time.time())}"
     if not os.path.exists(target_dir):
         os.makedirs(target_dir)
         
     print(f"\n[START] Building instrumented Scala project layout...")
-    for root, _, files in os.walk(source_dir):
-        # Ignore common Scala target build folders
-        if any(x in root for x in ['target', '.git', '.bloop', '.metals', 'project/project']):
-            continue
+    # Ignore common Scala target build folders
+    for root, files in walk_project(source_dir, skip_dirs=['target', '.git', '.bloop', '.metals', 'project/project'], include=include, exclude=exclude):
         for file in files:
             if file.endswith(".scala") or file.endswith(".sc"):
                 src = os.path.join(root, file)
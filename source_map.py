@@ -0,0 +1,180 @@
+import bisect
+import json
+import marshal
+import os
+import re
+from array import array
+
+# ==========================================
+# 1. THE SOURCE MAP (Instrumented line -> original line spans)
+# ==========================================
+MAP_SUFFIX = ".admap"
+
+
+def spans_from_block_sizes(first_line, block_sizes):
+    """Yields (inst_start, orig_start, orig_end) spans as soon as each one is complete."""
+    span = None
+    inst_line, last_size = first_line, 0
+    for orig_line, size in enumerate(block_sizes, start=1):
+        if size == 1 and last_size == 1:
+            span[2] = orig_line  # untouched line continues the current linear span
+        else:
+            if span is not None:
+                yield tuple(span)
+            span = [inst_line, orig_line, orig_line]
+        last_size = size
+        inst_line += size
+    if span is not None:
+        yield tuple(span)
+
+
+def write_source_map(path, file_name, source, spans):
+    """Streams spans into a sidecar file without holding them in memory; returns the span count."""
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'{{"version":2,"file":{json.dumps(file_name)},"source":{json.dumps(source)},"spans":[')
+        for span in spans:
+            f.write(('[%d,%d,%d]' if not count else ',[%d,%d,%d]') % span)
+            count += 1
+        f.write(']}')
+    return count
+
+
+class SourceMap:
+    """
+    Sorted spans of instrumented lines. Inside a span the original line advances with the
+    instrumented line until it reaches orig_end, so untouched runs of code are a single
+    span and every wrapped statement block collapses onto its one original line.
+    """
+
+    def __init__(self, file_name, source, spans):
+        self.file_name = file_name
+        self.source = source
+        self.inst_start, self.orig_start, self.orig_end = array('l'), array('l'), array('l')
+        for inst_start, orig_start, orig_end in spans:
+            self.inst_start.append(inst_start)
+            self.orig_start.append(orig_start)
+            self.orig_end.append(orig_end)
+
+    @classmethod
+    def from_block_sizes(cls, file_name, source, first_line, block_sizes):
+        return cls(file_name, source, spans_from_block_sizes(first_line, block_sizes))
+
+    def original_line(self, inst_line):
+        i = bisect.bisect_right(self.inst_start, inst_line) - 1
+        if i < 0:
+            return 0  # inside the injected header
+        return min(self.orig_start[i] + (inst_line - self.inst_start[i]), self.orig_end[i])
+
+    def save(self, path):
+        return write_source_map(path, self.file_name, self.source,
+                                zip(self.inst_start, self.orig_start, self.orig_end))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["file"], data.get("source"), data["spans"])
+
+
+def map_path_for(file_path):
+    return str(file_path) + MAP_SUFFIX
+
+# ==========================================
+# 2. THE RESOLVER (Finds the map for any path spelling found in a report)
+# ==========================================
+class SourceMapIndex:
+    def __init__(self, sandbox_dir):
+        self.sandbox_dir = os.path.abspath(sandbox_dir)
+        self._by_path = {}
+        self._by_name = {}
+        self._resolved = {}
+        self._translated = {}
+        for root, _, files in os.walk(self.sandbox_dir):
+            for file in files:
+                if file.endswith(MAP_SUFFIX):
+                    inst_path = os.path.join(root, file[:-len(MAP_SUFFIX)])
+                    self._by_path[os.path.normcase(inst_path)] = os.path.join(root, file)
+                    self._by_name.setdefault(os.path.basename(inst_path), []).append(inst_path)
+
+    def __len__(self):
+        return len(self._by_path)
+
+    def lookup(self, path):
+        """Returns the SourceMap for a path as it appears in tracebacks/profiles, or None."""
+        if path in self._resolved:
+            return self._resolved[path]
+        candidates = [os.path.normcase(os.path.abspath(path)),
+                      os.path.normcase(os.path.join(self.sandbox_dir, path))]
+        map_file = next((self._by_path[c] for c in candidates if c in self._by_path), None)
+        if map_file is None and len(self._by_name.get(os.path.basename(path), [])) == 1:
+            map_file = self._by_path[os.path.normcase(self._by_name[os.path.basename(path)][0])]
+        result = SourceMap.load(map_file) if map_file else None
+        self._resolved[path] = result
+        return result
+
+    def translate(self, path, inst_line):
+        key = (path, inst_line)
+        result = self._translated.get(key)
+        if result is None:
+            source_map = self.lookup(path)
+            orig_line = source_map.original_line(inst_line) if source_map is not None else 0
+            # Untranslated: not instrumented, or a frame inside the injected header
+            result = (source_map.source or path, orig_line) if orig_line else key
+            self._translated[key] = result
+        return result
+
+# ==========================================
+# 3. THE REMAPPERS (Tracebacks, profiler text, coverage reports, pstats dumps)
+# ==========================================
+_TRACEBACK_FRAME = re.compile(r'File "(?P<path>[^"]+)", line (?P<line>\d+)')
+_PATH_LINE = re.compile(r'(?P<path>(?:[A-Za-z]:)?[^\s:"\'()\[\]]+\.py):(?P<line>\d+)')
+
+
+def remap_text(text, index):
+    def _traceback_frame(match):
+        path, line = index.translate(match.group('path'), int(match.group('line')))
+        return f'File "{path}", line {line}'
+
+    def _path_line(match):
+        path, line = index.translate(match.group('path'), int(match.group('line')))
+        return f'{path}:{line}'
+
+    return _PATH_LINE.sub(_path_line, _TRACEBACK_FRAME.sub(_traceback_frame, text))
+
+
+def remap_stream(src, dst, index):
+    for line in src:
+        dst.write(remap_text(line, index))
+
+
+def remap_pstats(stats_path, output_path, index):
+    """Rewrites the (file, line, function) keys of a cProfile dump, merging entries that collapse together."""
+    with open(stats_path, 'rb') as f:
+        stats = marshal.load(f)
+
+    def _key(func):
+        path, line = index.translate(func[0], func[1])
+        return (path, line, func[2])
+
+    def _merge(a, b):
+        return tuple(x + y for x, y in zip(a, b))
+
+    remapped = {}
+    for func, (cc, nc, tt, ct, callers) in stats.items():
+        new_callers = {}
+        for caller, timing in callers.items():
+            caller_key = _key(caller)
+            new_callers[caller_key] = _merge(new_callers[caller_key], timing) if caller_key in new_callers else timing
+        key = _key(func)
+        if key in remapped:
+            old_cc, old_nc, old_tt, old_ct, old_callers = remapped[key]
+            for caller, timing in new_callers.items():
+                old_callers[caller] = _merge(old_callers[caller], timing) if caller in old_callers else timing
+            remapped[key] = (old_cc + cc, old_nc + nc, old_tt + tt, old_ct + ct, old_callers)
+        else:
+            remapped[key] = (cc, nc, tt, ct, new_callers)
+
+    with open(output_path, 'wb') as f:
+        marshal.dump(remapped, f)
+    return len(remapped)
@@ -0,0 +1,167 @@
+import ast
+import os
+
+import pytest
+
+import trace_schema
+from bench_injectors import CHUNKS
+from debugger_application import inject_into_file, stream_inject_file
+from project_walker import walk_project
+from source_map import SourceMap, map_path_for
+
+# Run with: python -m pytest -q test_injectors.py
+
+# ==========================================
+# 1. STREAMING VS WHOLE-FILE INJECTION (same module, same line map)
+# ==========================================
+SOURCES = {
+    "corpus": "".join(CHUNKS["python"][1].replace("{n}", str(n)) for n in range(3)),
+    "literals": '''
+import os
+
+TEMPLATE = """
+    for x in range(3):
+        not = code
+"""
+
+def join(parts,
+         sep=", "):
+    text = sep.join(
+        str(p) for p in parts
+    )
+    return (text
+            + "!")
+
+class Box:
+    @staticmethod
+    def make(*args, **kwargs):
+        while args:
+            args = args[1:]
+        return Box()
+
+value = join([1, 2, 3])
+''',
+}
+MODES = {"statements": (False, False), "loops": (True, False), "functions": (False, True)}
+
+
+def _instrument_both(tmp_path, source, depth, loop_mode, function_mode):
+    src = tmp_path / "source.py"
+    src.write_text(source, encoding="utf-8")
+    whole = tmp_path / "whole.py"
+    whole.write_text(source, encoding="utf-8")
+    streamed = tmp_path / "streamed.py"
+    assert inject_into_file(str(whole), depth, loop_mode, function_mode, source_path=str(src))
+    assert stream_inject_file(str(src), str(streamed), depth, loop_mode, function_mode, source_path=str(src))
+    return whole, streamed
+
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("name", SOURCES)
+@pytest.mark.parametrize("depth", [1, 3])
+def test_stream_matches_whole_file(tmp_path, name, mode, depth):
+    whole, streamed = _instrument_both(tmp_path, SOURCES[name], depth, *MODES[mode])
+    whole_lines = whole.read_text(encoding="utf-8").splitlines()
+    streamed_lines = streamed.read_text(encoding="utf-8").splitlines()
+    ast.parse("\n".join(streamed_lines))
+
+    # Only the line-map statement differs: embedded spans vs a reference to the .admap sidecar
+    differing = [i for i, (a, b) in enumerate(zip(whole_lines, streamed_lines)) if a != b]
+    assert len(whole_lines) == len(streamed_lines)
+    assert len(differing) == 1
+    assert whole_lines[differing[0]].startswith("_AD_LINE_MAP = _ad_line_map(")
+    assert streamed_lines[differing[0]].startswith("_AD_LINE_MAP = _ad_line_map_file(")
+
+    whole_map = SourceMap.load(map_path_for(str(whole)))
+    streamed_map = SourceMap.load(map_path_for(str(streamed)))
+    for column in ("inst_start", "orig_start", "orig_end"):
+        assert getattr(whole_map, column) == getattr(streamed_map, column)
+    assert whole_map.source == streamed_map.source
+
+
+def test_line_map_points_at_original_lines(tmp_path):
+    source = SOURCES["literals"]
+    whole, _ = _instrument_both(tmp_path, source, 3, False, False)
+    line_map = SourceMap.load(map_path_for(str(whole)))
+    mapped = {}
+    for inst_line, text in enumerate(whole.read_text(encoding="utf-8").splitlines(), start=1):
+        mapped.setdefault(line_map.original_line(inst_line), set()).add(text.strip())
+    # Every original line survives somewhere in the block its span maps back to it
+    for orig_line, text in enumerate(source.splitlines(), start=1):
+        assert text.strip() in mapped[orig_line], orig_line
+
+# ==========================================
+# 2. PROJECT WALK (gitignore negation and anchoring)
+# ==========================================
+def _tree(root, files):
+    for rel_path, text in files.items():
+        path = root / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+
+
+def _walked(root, **kwargs):
+    found = set()
+    for folder, files in walk_project(str(root), **kwargs):
+        rel_dir = os.path.relpath(folder, root)
+        found.update(os.path.normpath(os.path.join(rel_dir, f)).replace(os.sep, "/") for f in files)
+    return found
+
+
+def test_walk_negation_reincludes_files(tmp_path):
+    _tree(tmp_path, {
+        ".gitignore": "*.log\n!keep.log\n",
+        "a.log": "", "keep.log": "", "sub/b.log": "", "sub/keep.log": "", "main.py": "",
+    })
+    assert _walked(tmp_path) == {".gitignore", "keep.log", "sub/keep.log", "main.py"}
+
+
+def test_walk_nested_gitignore_overrides_parent(tmp_path):
+    _tree(tmp_path, {
+        ".gitignore": "*.py\n",
+        "top.py": "",
+        "src/.gitignore": "!*.py\n",
+        "src/app.py": "",
+    })
+    assert _walked(tmp_path) == {".gitignore", "src/.gitignore", "src/app.py"}
+
+
+def test_walk_anchored_rules_apply_to_their_own_directory(tmp_path):
+    _tree(tmp_path, {
+        ".gitignore": "/build\ndocs/*.txt\n",
+        "build/out.py": "", "pkg/build/kept.py": "",
+        "docs/notes.txt": "", "docs/deep/notes.txt": "", "pkg/docs/notes.txt": "",
+        "pkg/.gitignore": "/local.py\n", "pkg/local.py": "", "pkg/inner/local.py": "",
+    })
+    assert _walked(tmp_path) == {
+        ".gitignore", "pkg/build/kept.py", "docs/deep/notes.txt", "pkg/docs/notes.txt",
+        "pkg/.gitignore", "pkg/inner/local.py",
+    }
+
+
+def test_walk_runner_rules_and_skip_dirs(tmp_path):
+    _tree(tmp_path, {
+        "app.py": "", "tests/test_app.py": "", "node_modules/x/y.py": "", "lib/node_modules/z.py": "",
+        "data/table.csv": "", "venv2/pyvenv.cfg": "", "venv2/lib/site.py": "",
+    })
+    assert _walked(tmp_path, skip_dirs=["node_modules"], exclude=["tests/"], include=["*.py"]) == {"app.py"}
+    assert _walked(tmp_path, skip_dirs=["/node_modules"]) == {
+        "app.py", "tests/test_app.py", "lib/node_modules/z.py", "data/table.csv"}
+
+# ==========================================
+# 3. PARALLEL CSV INGEST (byte ranges give the same records as one pass)
+# ==========================================
+def test_parallel_csv_matches_serial(tmp_path, monkeypatch):
+    path = tmp_path / "_VARIABLE_TRACKER.csv"
+    rows = ["File,Line,Seq,Thread,Variable,Type,Value"]
+    for i in range(3000):
+        value = f'"multi\nline, {i} ""quoted"""' if i % 7 == 0 else str(i * i)
+        rows.append(f"app.py,{i % 90 + 1},{i},MainThread,v{i % 5},int,{value}")
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    monkeypatch.setattr(trace_schema, "RANGE_BYTES", 4096)
+
+    serial = [tuple(r) for r in trace_schema.iter_records(str(path))]
+    parallel = [tuple(r) for b in trace_schema.iter_batches(str(path), jobs=2) for r in b.records()]
+    assert len(trace_schema.split_ranges(str(path), 8)) > 1
+    assert len(serial) == 3000
+    assert parallel == serial
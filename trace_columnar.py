@@ -0,0 +1,213 @@
+import collections
+import json
+import mmap
+import os
+import sys
+import zlib
+from array import array
+from itertools import accumulate
+
+from trace_schema import iter_batches
+
+try:
+    import numpy
+except ImportError:  # the columns are plain little-endian arrays; memoryviews read them without NumPy
+    numpy = None
+
+# ==========================================
+# 1. THE COLUMN FILES (one raw array per column, loadable zero-copy with numpy.memmap)
+# ==========================================
+#   line.bin           int32   source line per record
+#   seq.bin            int64   record position in the run
+#   file.bin           int32   code into meta["dictionaries"]["file"]
+#   thread.bin         int32   code into meta["dictionaries"]["thread"]
+#   variable.bin       int32   code into meta["dictionaries"]["variable"]
+#   type.bin           int32   code into meta["dictionaries"]["type"]
+#   value_offsets.bin  int64   records + 1 offsets into value_heap.bin; value i is heap[off[i]:off[i + 1]]
+#   value_hash.bin     int64   CRC32 of the value | its length << 32, for vectorized change detection
+#   value_heap.bin     uint8   the UTF-8 values back to back
+COLUMNS_VERSION = 1
+META_FILE = "meta.json"
+INT_COLUMNS = {"line": 'i', "seq": 'q', "file": 'i', "thread": 'i', "variable": 'i', "type": 'i',
+               "value_offsets": 'q', "value_hash": 'q'}
+CODED_COLUMNS = ["file", "thread", "variable", "type"]
+
+
+def columns_path_for(trace_path):
+    return trace_path + ".adcol"
+
+
+def _dtype(typecode):
+    return f"<i{array(typecode).itemsize}"
+
+
+def _write(out, data):
+    if sys.byteorder != "little":
+        data.byteswap()
+    out.write(data.tobytes())
+
+
+def _encode(texts, lookup, names):
+    """Dictionary-encodes one batch column; new names get the next codes."""
+    for text in set(texts).difference(lookup):
+        lookup[text] = len(names)
+        names.append(text)
+    return array('i', map(lookup.__getitem__, texts))
+
+
+def write_columns(trace_path, out_dir=None, fmt=None, jobs=1):
+    """Converts any runtime's trace into column files in one streaming pass; returns the record count."""
+    out_dir = out_dir or columns_path_for(trace_path)
+    os.makedirs(out_dir, exist_ok=True)
+    st = os.stat(trace_path)
+    dictionaries = {name: [] for name in CODED_COLUMNS}
+    lookups = {name: {} for name in CODED_COLUMNS}
+    files = {name: open(os.path.join(out_dir, name + ".bin"), 'wb') for name in INT_COLUMNS}
+    records, heap_size = 0, 0
+    try:
+        with open(os.path.join(out_dir, "value_heap.bin"), 'wb') as heap:
+            _write(files["value_offsets"], array('q', [0]))
+            for batch in iter_batches(trace_path, fmt=fmt, jobs=jobs):
+                _write(files["line"], array('i', batch.line))
+                _write(files["seq"], array('q', batch.seq))
+                for name in CODED_COLUMNS:
+                    _write(files[name], _encode(getattr(batch, name), lookups[name], dictionaries[name]))
+                values = [v.encode("utf-8", "surrogateescape") for v in batch.value]
+                heap.write(b"".join(values))
+                offsets = array('q', accumulate(map(len, values), initial=heap_size))
+                heap_size = offsets[-1]
+                _write(files["value_offsets"], offsets[1:])
+                _write(files["value_hash"], array('q', [len(v) << 32 | zlib.crc32(v) for v in values]))
+                records += len(batch)
+    finally:
+        for f in files.values():
+            f.close()
+    meta = {"version": COLUMNS_VERSION, "source": os.path.abspath(trace_path), "source_size": st.st_size,
+            "source_mtime_ns": st.st_mtime_ns, "records": records, "heap_bytes": heap_size,
+            "dtypes": {name: _dtype(code) for name, code in INT_COLUMNS.items()}, "dictionaries": dictionaries}
+    # meta.json goes last: a conversion that died halfway never looks complete
+    with open(os.path.join(out_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return records
+
+
+def columns_are_fresh(out_dir, trace_path):
+    try:
+        with open(os.path.join(out_dir, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        st = os.stat(trace_path)
+    except (OSError, ValueError):
+        return False
+    return (meta.get("version") == COLUMNS_VERSION and meta.get("source_size") == st.st_size and
+            meta.get("source_mtime_ns") == st.st_mtime_ns)
+
+# ==========================================
+# 2. THE READER (memory-mapped columns; NumPy arrays when NumPy is installed, memoryviews otherwise)
+# ==========================================
+class ColumnarTrace:
+    """The column files of one trace, mapped read-only; nothing is copied until it is used."""
+
+    def __init__(self, out_dir):
+        self.path = out_dir
+        with open(os.path.join(out_dir, META_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.records = self.meta["records"]
+        self.dictionaries = self.meta["dictionaries"]
+        self._maps = []
+        self._columns = {}
+
+    def __len__(self):
+        return self.records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._columns.clear()
+        for f, mapped in self._maps:
+            if mapped is not None:
+                mapped.close()
+            f.close()
+        self._maps = []
+
+    def column(self, name):
+        """The column as a numpy.memmap, or a memoryview over an mmap without NumPy."""
+        column = self._columns.get(name)
+        if column is not None:
+            return column
+        path = os.path.join(self.path, name + ".bin")
+        dtype = self.meta["dtypes"].get(name, "u1")
+        if numpy is not None:
+            column = numpy.memmap(path, dtype=dtype, mode='r') if os.path.getsize(path) else numpy.zeros(0, dtype)
+        else:
+            if sys.byteorder != "little" and dtype != "u1":
+                raise ValueError("reading column files on a big-endian machine needs NumPy")
+            f = open(path, 'rb')
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else None
+            self._maps.append((f, mapped))
+            view = memoryview(mapped) if mapped is not None else memoryview(b"")
+            column = view.cast({"<i4": 'i', "<i8": 'q'}.get(dtype, 'B'))
+        self._columns[name] = column
+        return column
+
+    def value(self, i):
+        offsets, heap = self.column("value_offsets"), self.column("value_heap")
+        return bytes(heap[int(offsets[i]):int(offsets[i + 1])]).decode("utf-8", "surrogateescape")
+
+    def name(self, column, code):
+        return self.dictionaries[column][code]
+
+    def marker_codes(self):
+        """Variable codes of the <enter>/<exit>/<iteration> rows, which carry no variable value."""
+        return [code for code, name in enumerate(self.dictionaries["variable"])
+                if name.startswith("<") and name.endswith(">")]
+
+
+def open_columns(trace_path, rebuild=False, fmt=None, jobs=1):
+    """The ColumnarTrace of a trace (or of an .adcol folder), converting first if missing or stale."""
+    if os.path.isdir(trace_path) and os.path.exists(os.path.join(trace_path, META_FILE)):
+        return ColumnarTrace(trace_path)
+    out_dir = columns_path_for(trace_path)
+    if rebuild or not columns_are_fresh(out_dir, trace_path):
+        write_columns(trace_path, out_dir, fmt, jobs)
+    return ColumnarTrace(out_dir)
+
+# ==========================================
+# 3. THE AGGREGATIONS (vectorized over the mapped columns; pure-Python fallbacks without NumPy)
+# ==========================================
+def hits_per_line(trace):
+    """{line: records written there}."""
+    lines = trace.column("line")
+    if numpy is not None:
+        counts = numpy.bincount(lines) if len(lines) else numpy.zeros(0, numpy.int64)
+        hit = numpy.flatnonzero(counts)
+        return dict(zip(hit.tolist(), counts[hit].tolist()))
+    return dict(collections.Counter(lines))
+
+
+def changes_per_variable(trace):
+    """{variable: value changes between its consecutive records}; marker rows are skipped."""
+    variables, hashes = trace.column("variable"), trace.column("value_hash")
+    markers = trace.marker_codes()
+    names = trace.dictionaries["variable"]
+    if numpy is not None:
+        keep = ~numpy.isin(variables, markers) if markers else slice(None)
+        codes, values = numpy.asarray(variables)[keep], numpy.asarray(hashes)[keep]
+        order = numpy.argsort(codes, kind="stable")  # each variable's records, still in run order
+        codes, values = codes[order], values[order]
+        changed = (codes[1:] == codes[:-1]) & (values[1:] != values[:-1])
+        counts = numpy.bincount(codes[1:][changed], minlength=len(names))
+        return {names[code]: int(counts[code]) for code in numpy.flatnonzero(counts).tolist()}
+    skip = set(markers)
+    last, counts = {}, collections.Counter()
+    for code, value in zip(variables, hashes):
+        if code in skip:
+            continue
+        before = last.get(code)
+        if before is not None and before != value:
+            counts[code] += 1
+        last[code] = value
+    return {names[code]: count for code, count in counts.items()}
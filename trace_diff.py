@@ -0,0 +1,245 @@
+import bisect
+import collections
+from array import array
+
+from trace_index import TraceLayout
+
+# ==========================================
+# 1. THE RECORD STREAMS (one hash per record; only the roles are hashed, so extra columns are ignored)
+# ==========================================
+WINDOW_RECORDS = 1 << 18  # records per side held in memory while aligning
+
+
+class TraceReader:
+    """Sequential reader filling parallel arrays: record hash, variable id and byte offset."""
+
+    def __init__(self, path, variables):
+        self.path = path
+        self._file = open(path, 'rb')
+        header = self._file.readline()
+        self.layout = TraceLayout.from_header_line(header)
+        self._offset = len(header)
+        self._variables = variables  # shared by both sides so ids are comparable
+        self.exhausted = False
+
+    def read(self, count, hashes, variable_ids, offsets):
+        layout, variables = self.layout, self._variables
+        for raw in self._file:
+            offsets.append(self._offset)
+            self._offset += len(raw)
+            fields = layout.fields(raw)
+            if len(fields) >= layout.width:
+                key = (fields[layout.file] if layout.file is not None else b"", fields[layout.line],
+                       fields[layout.variable], fields[layout.value])
+                variable = fields[layout.variable]
+            else:
+                key, variable = (raw,), b"<malformed>"
+            hashes.append(hash(key))
+            vid = variables.get(variable)
+            if vid is None:
+                vid = variables[variable] = len(variables)
+            variable_ids.append(vid)
+            count -= 1
+            if not count:
+                return
+        self.exhausted = True
+
+    def line_at(self, offset):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return f.readline()
+
+    def close(self):
+        self._file.close()
+
+
+def open_trace_reader(path, variables):
+    return TraceReader(path, variables)
+
+# ==========================================
+# 2. THE ALIGNMENT (patience diff: unique common records anchor the match, gaps are recursed)
+# ==========================================
+def _common_prefix(a, b, alo, ahi, blo, bhi):
+    # Slice comparisons run in C, so identical stretches are found by galloping + bisection
+    limit = min(ahi - alo, bhi - blo)
+    lo, size = 0, 1
+    while lo < limit:
+        hi = min(lo + size, limit)
+        if a[alo + lo:alo + hi] == b[blo + lo:blo + hi]:
+            lo, size = hi, size * 2
+            continue
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if a[alo + lo:alo + mid] == b[blo + lo:blo + mid]:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+    return limit
+
+
+def _common_suffix(a, b, alo, ahi, blo, bhi):
+    limit = min(ahi - alo, bhi - blo)
+    lo, size = 0, 1
+    while lo < limit:
+        hi = min(lo + size, limit)
+        if a[ahi - hi:ahi - lo] == b[bhi - hi:bhi - lo]:
+            lo, size = hi, size * 2
+            continue
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if a[ahi - mid:ahi - lo] == b[bhi - mid:bhi - lo]:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+    return limit
+
+
+def _longest_increasing(pairs):
+    # Patience sorting on the b positions gives the longest increasing subsequence
+    tails, tail_ids, previous = [], [], [-1] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_ids.append(k)
+        else:
+            tails[pos] = j
+            tail_ids[pos] = k
+        previous[k] = tail_ids[pos - 1] if pos else -1
+    anchors = []
+    k = tail_ids[-1] if tail_ids else -1
+    while k >= 0:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def _unique_anchors(a, b, alo, ahi, blo, bhi):
+    """Longest increasing run of records that occur exactly once on each side."""
+    count_a = collections.Counter(a[alo:ahi])
+    count_b = collections.Counter(b[blo:bhi])
+    where_b = {b[j]: j for j in range(blo, bhi) if count_b[b[j]] == 1}
+    pairs = [(i, where_b[a[i]]) for i in range(alo, ahi) if count_a[a[i]] == 1 and a[i] in where_b]
+    if pairs:
+        return _longest_increasing(pairs)
+    # Loops repeat every record, so nothing is unique: pair the k-th occurrences of records seen equally often
+    seen, where_b = collections.Counter(), collections.defaultdict(list)
+    for j in range(blo, bhi):
+        if count_a[b[j]] == count_b[b[j]]:
+            where_b[b[j]].append(j)
+    pairs = []
+    for i in range(alo, ahi):
+        positions = where_b.get(a[i])
+        if positions:
+            pairs.append((i, positions[seen[a[i]]]))
+            seen[a[i]] += 1
+    return _longest_increasing(pairs)
+
+
+def align(a, b):
+    """Matched runs (i, j, length) of two hash arrays, ascending and non-overlapping."""
+    runs = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        n = _common_prefix(a, b, alo, ahi, blo, bhi)
+        if n:
+            runs.append((alo, blo, n))
+            alo, blo = alo + n, blo + n
+        n = _common_suffix(a, b, alo, ahi, blo, bhi)
+        if n:
+            runs.append((ahi - n, bhi - n, n))
+            ahi, bhi = ahi - n, bhi - n
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, b, alo, ahi, blo, bhi)
+        for i, j in anchors:
+            runs.append((i, j, 1))
+            if i > alo or j > blo:
+                stack.append((alo, i, blo, j))
+            alo, blo = i + 1, j + 1
+        if anchors:
+            stack.append((alo, ahi, blo, bhi))
+    runs.sort()
+    return runs
+
+# ==========================================
+# 3. THE DIFF (windowed, so memory is bounded on multi-GB traces)
+# ==========================================
+class TraceDiff:
+    """Summary of a diff: first divergence, hunks, and records per diverging variable."""
+
+    def __init__(self, max_hunks):
+        self.max_hunks = max_hunks
+        self.first = None             # (step in A, step in B)
+        self.hunks = 0
+        self.only_a = self.only_b = 0
+        self.records_a = self.records_b = 0
+        self.variables = {}           # name -> [A-only, B-only, first A step, first B step]
+        self.samples = []             # (a_step, b_step, [A lines], [B lines]) for the first hunks
+
+
+def diff_traces(path_a, path_b, window=WINDOW_RECORDS, max_hunks=5, sample_lines=10):
+    variables = {}
+    reader_a, reader_b = open_trace_reader(path_a, variables), open_trace_reader(path_b, variables)
+    result = TraceDiff(max_hunks)
+    buffers = [[array('q'), array('I'), array('q')] for _ in range(2)]
+    base = [0, 0]  # global step of buffer position 0, per side
+    names = None
+
+    def hunk(a0, a1, b0, b1):
+        nonlocal names
+        result.hunks += 1
+        result.only_a += a1 - a0
+        result.only_b += b1 - b0
+        if result.first is None:
+            result.first = (base[0] + a0, base[1] + b0)
+        if names is None or len(names) != len(variables):
+            names = {vid: name.decode("utf-8", "replace") for name, vid in variables.items()}
+        for side, lo, hi in ((0, a0, a1), (1, b0, b1)):
+            for k in range(lo, hi):
+                entry = result.variables.setdefault(names[buffers[side][1][k]], [0, 0, None, None])
+                entry[side] += 1
+                if entry[2 + side] is None:
+                    entry[2 + side] = base[side] + k
+        if len(result.samples) < max_hunks:
+            result.samples.append((
+                base[0] + a0, base[1] + b0,
+                [reader_a.line_at(buffers[0][2][k]) for k in range(a0, min(a1, a0 + sample_lines))],
+                [reader_b.line_at(buffers[1][2][k]) for k in range(b0, min(b1, b0 + sample_lines))]))
+
+    try:
+        while True:
+            for side, reader in ((0, reader_a), (1, reader_b)):
+                need = window - len(buffers[side][0])
+                if need > 0 and not reader.exhausted:
+                    reader.read(need, *buffers[side])
+            a, b = buffers[0][0], buffers[1][0]
+            if not a and not b:
+                break
+            done = reader_a.exhausted and reader_b.exhausted
+            runs = align(a, b)
+            # Commit through the last matched run; the unmatched tail waits for more records unless input is over
+            end_a, end_b = (len(a), len(b)) if done or not runs else (runs[-1][0] + runs[-1][2], runs[-1][1] + runs[-1][2])
+            i = j = 0
+            for ri, rj, n in runs:
+                if ri >= end_a:
+                    break
+                if ri > i or rj > j:
+                    hunk(i, ri, j, rj)
+                i, j = ri + n, rj + n
+            if end_a > i or end_b > j:
+                hunk(i, end_a, j, end_b)
+            result.records_a += end_a
+            result.records_b += end_b
+            for side, end in ((0, end_a), (1, end_b)):
+                for arr in buffers[side]:
+                    del arr[:end]
+                base[side] += end
+    finally:
+        reader_a.close()
+        reader_b.close()
+    return result
@@ -0,0 +1,337 @@
+import bisect
+import csv
+import heapq
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+
+# ==========================================
+# 1. THE TRACE LAYOUTS (every header variant the runtimes emit)
+# ==========================================
+INDEX_MAGIC = b"ADIDX1\n\0"
+INDEX_VERSION = 2
+BLOCK_RECORDS = 1 << 20  # records grouped in memory before a sorted block is spilled to disk
+
+# Column name -> role; 'Object' is the HDL runtime's name for the variable column
+COLUMN_ROLES = {"file": "file", "line": "line", "variable": "variable", "object": "variable", "value": "value",
+                "type": "type", "declaredtype": "type", "seq": "seq", "thread": "thread"}
+
+
+def index_path_for(trace_path):
+    return trace_path + ".adidx"
+
+
+class TraceLayout:
+    """
+    Column positions of one trace, read from its header row: 'Line,Variable,Value', the Cirq
+    variants with a 'Type' column, 'File'-prefixed traces and the Timestamp/Q# extras all work.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        roles = {}
+        for i, name in enumerate(self.columns):
+            role = COLUMN_ROLES.get(name.strip().lower())
+            if role and role not in roles:
+                roles[role] = i
+        missing = {"line", "variable", "value"} - roles.keys()
+        if missing:
+            raise ValueError(f"Not a variable trace; no {', '.join(sorted(missing))} column in: {','.join(self.columns)}")
+        self.file = roles.get("file")
+        self.line = roles["line"]
+        self.variable = roles["variable"]
+        self.value = roles["value"]
+        self.type = roles.get("type")
+        self.seq = roles.get("seq")
+        self.thread = roles.get("thread")
+        self.width = max(roles.values()) + 1
+        self._tail = len(self.columns) - self.value - 1  # columns after the value
+
+    @classmethod
+    def from_header_line(cls, raw):
+        return cls(next(csv.reader([raw.decode("utf-8-sig", "replace").rstrip("\r\n")])))
+
+    def fields(self, raw):
+        """
+        Splits one raw record; the csv module only runs for the rare quoted rows. Several
+        language runtimes write values unquoted, so a row with too many commas gives the
+        surplus to the value column, and a value wrapped in quotes that were never escaped
+        (Scala) is unwrapped.
+        """
+        raw = raw.rstrip(b"\r\n")
+        if b'"' not in raw:
+            fields = raw.split(b",")
+            if len(fields) > len(self.columns):
+                tail = len(fields) - self._tail
+                fields[self.value:tail] = [b",".join(fields[self.value:tail])]
+            return fields
+        try:
+            fields = next(csv.reader([raw.decode("utf-8", "replace")], strict=True), [])
+            if len(fields) == len(self.columns):
+                return [f.encode("utf-8") for f in fields]
+        except csv.Error:
+            pass
+        fields = raw.split(b",")
+        if len(fields) > len(self.columns):
+            tail = len(fields) - self._tail
+            fields[self.value:tail] = [b",".join(fields[self.value:tail])]
+        if len(fields) > self.value:
+            value = fields[self.value]
+            if len(value) > 1 and value[:1] == b'"' and value[-1:] == b'"':
+                fields[self.value] = value[1:-1]
+        return fields
+
+    def key(self, fields):
+        return (fields[self.file] if self.file is not None else b"", fields[self.line], fields[self.variable])
+
+# Sidecar files share one layout: magic, meta JSON length, meta JSON, padding to 8, then raw arrays
+def write_sidecar_meta(out, magic, meta):
+    encoded = json.dumps(meta).encode("utf-8")
+    out.write(magic + struct.pack("<Q", len(encoded)) + encoded)
+    out.write(b"\0" * (-out.tell() % 8))
+
+
+def read_sidecar_meta(buffer, magic):
+    """Returns (meta, offset of the first array) from a mapped or fully read sidecar."""
+    if buffer[:len(magic)] != magic:
+        raise ValueError("not an index sidecar")
+    meta_len = struct.unpack_from("<Q", buffer, len(magic))[0]
+    start = len(magic) + 8
+    end = start + meta_len
+    return json.loads(buffer[start:end]), end + (-end % 8)
+
+
+def sidecar_is_fresh(sidecar_path, magic, version, trace_path, **expected):
+    """True if the sidecar was built by this version, on this machine, from the trace as it is now."""
+    try:
+        with open(sidecar_path, 'rb') as f:
+            head = f.read(len(magic) + 8)
+            meta, _ = read_sidecar_meta(head + f.read(struct.unpack_from("<Q", head, len(magic))[0]), magic)
+        st = os.stat(trace_path)
+    except (OSError, ValueError, struct.error):
+        return False
+    return (meta.get("version") == version and meta.get("byteorder") == sys.byteorder and
+            meta.get("source_size") == st.st_size and meta.get("source_mtime_ns") == st.st_mtime_ns and
+            all(meta.get(k) == v for k, v in expected.items()))
+
+# ==========================================
+# 2. THE INDEX BUILDER (one streaming pass, bounded memory, sorted posting blocks)
+# ==========================================
+def _write_array(out, data):
+    out.write(data.tobytes())
+
+
+def build_index(trace_path, index_path=None, block_records=BLOCK_RECORDS):
+    """
+    Writes the sidecar index of a trace: the byte offset of every record (step) plus, per
+    (file, line, variable), the ascending steps that wrote it and a CRC32 of each value.
+    Postings are collected per block of records and spilled to disk, so memory stays bounded
+    by the block size and the number of distinct keys, not by the size of the trace.
+    """
+    index_path = index_path or index_path_for(trace_path)
+    mtime_ns = os.stat(trace_path).st_mtime_ns
+    keys = {}       # (file, line, variable) bytes -> key id
+    segments = []   # key id -> [(position in the block spill file, count), ...]
+
+    with open(trace_path, 'rb') as src, tempfile.TemporaryFile() as offsets_tmp, \
+            tempfile.TemporaryFile() as blocks_tmp:
+        header = src.readline()
+        layout = TraceLayout.from_header_line(header)
+        offset, step = len(header), 0
+        offsets, block = array('q'), {}
+
+        def spill():
+            _write_array(offsets_tmp, offsets)
+            del offsets[:]
+            for kid, (steps, hashes) in block.items():
+                segments[kid].append((blocks_tmp.tell(), len(steps)))
+                _write_array(blocks_tmp, steps)
+                _write_array(blocks_tmp, hashes)
+            block.clear()
+
+        for raw in src:
+            offsets.append(offset)
+            offset += len(raw)
+            fields = layout.fields(raw)
+            # Short rows (e.g. a partial last line of a still-running program) stay addressable as steps
+            if len(fields) >= layout.width:
+                key = layout.key(fields)
+                kid = keys.get(key)
+                if kid is None:
+                    kid = keys[key] = len(keys)
+                    segments.append([])
+                postings = block.get(kid)
+                if postings is None:
+                    postings = block[kid] = (array('q'), array('I'))
+                postings[0].append(step)
+                postings[1].append(zlib.crc32(fields[layout.value]))
+            step += 1
+            if step % block_records == 0:
+                spill()
+        spill()
+
+        # Keys sorted by variable first, so every key of one variable is a contiguous run
+        order = sorted(keys, key=lambda k: (k[2], k[0], k[1]))
+        postings, start = [], 0
+        for key in order:
+            count = sum(n for _, n in segments[keys[key]])
+            postings.append([start, count])
+            start += count
+        meta = {
+            "version": INDEX_VERSION, "byteorder": sys.byteorder, "source_size": offset,
+            "source_mtime_ns": mtime_ns, "columns": layout.columns, "records": step, "postings": postings,
+            "keys": [[part.decode("utf-8", "replace") for part in key] for key in order],
+        }
+
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'wb') as out:
+            write_sidecar_meta(out, INDEX_MAGIC, meta)
+            offsets_tmp.seek(0)
+            shutil.copyfileobj(offsets_tmp, out, 1 << 20)
+            for width, skip in ((8, False), (4, True)):  # all steps, then all value hashes
+                for key in order:
+                    for pos, count in segments[keys[key]]:
+                        blocks_tmp.seek(pos + (count * 8 if skip else 0))
+                        out.write(blocks_tmp.read(count * width))
+        os.replace(tmp_path, index_path)
+    return index_path
+
+# ==========================================
+# 3. THE QUERY SIDE (memory-mapped arrays; no trace scan after the first build)
+# ==========================================
+class TraceIndex:
+    """
+    Random access into a variable trace through its sidecar index, building the index on first
+    use or when the trace has changed since. Steps are 0-based data-row numbers of the trace.
+    """
+
+    def __init__(self, trace_path, index_path=None, rebuild=False, verbose=False):
+        self.trace_path = trace_path
+        self.index_path = index_path or index_path_for(trace_path)
+        if rebuild or not self._fresh():
+            if verbose:
+                print(f"[INDEX] Indexing {trace_path}...", file=sys.stderr)
+            build_index(trace_path, self.index_path)
+
+        self._index_file = open(self.index_path, 'rb')
+        self._index_map = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        meta, pos = read_sidecar_meta(self._index_map, INDEX_MAGIC)
+
+        self.records = meta["records"]
+        self.layout = TraceLayout(meta["columns"])
+        self.keys = [tuple(k) for k in meta["keys"]]
+        self.postings = meta["postings"]
+        self._variables = [k[2] for k in self.keys]
+        total = sum(count for _, count in self.postings)
+        view = memoryview(self._index_map)
+        self.offsets = view[pos:pos + self.records * 8].cast('q')
+        pos += self.records * 8
+        self.steps = view[pos:pos + total * 8].cast('q')
+        pos += total * 8
+        self.hashes = view[pos:pos + total * 4].cast('I')
+        self._views = [view, self.offsets, self.steps, self.hashes]
+
+        self._trace_file = open(trace_path, 'rb')
+        size = meta["source_size"]
+        self._trace = mmap.mmap(self._trace_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._end = size
+
+    def _fresh(self):
+        return sidecar_is_fresh(self.index_path, INDEX_MAGIC, INDEX_VERSION, self.trace_path)
+
+    def __len__(self):
+        return self.records
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._index_map.close()
+        self._index_file.close()
+        if isinstance(self._trace, mmap.mmap):
+            self._trace.close()
+        self._trace_file.close()
+
+    # ----- records -----
+    def raw_record(self, step):
+        start = self.offsets[step]
+        end = self.offsets[step + 1] if step + 1 < self.records else self._end
+        return self._trace[start:end]
+
+    def record(self, step):
+        """The decoded columns of one step, in the trace's own column order."""
+        return [f.decode("utf-8", "replace") for f in self.layout.fields(self.raw_record(step))]
+
+    def value(self, step):
+        fields = self.record(step)
+        return fields[self.layout.value] if len(fields) > self.layout.value else None
+
+    # ----- keys -----
+    def key_ids(self, variable, line=None, file=None):
+        """Key ids of every (file, line, variable) the variable was recorded under, optionally narrowed."""
+        lo = bisect.bisect_left(self._variables, variable)
+        hi = bisect.bisect_right(self._variables, variable, lo)
+        return [kid for kid in range(lo, hi)
+                if (line is None or self.keys[kid][1] == str(line)) and (file is None or self.keys[kid][0] == file)]
+
+    def _posting_range(self, kid, start=0, stop=None):
+        first, count = self.postings[kid]
+        lo = bisect.bisect_left(self.steps, start, first, first + count)
+        hi = first + count if stop is None else bisect.bisect_left(self.steps, stop, lo, first + count)
+        return lo, hi
+
+    # ----- queries -----
+    def history(self, variable, line=None, file=None, start=0, stop=None):
+        """Yields (step, key id) for every record of the variable in [start, stop), in step order."""
+        runs = []
+        for kid in self.key_ids(variable, line, file):
+            lo, hi = self._posting_range(kid, start, stop)
+            runs.append(((self.steps[i], kid) for i in range(lo, hi)))
+        return heapq.merge(*runs)
+
+    def count(self, variable, line=None, file=None):
+        return sum(self.postings[kid][1] for kid in self.key_ids(variable, line, file))
+
+    def nth(self, variable, n, line=None, file=None):
+        """Step of the n-th (1-based) record of the variable, or None."""
+        kids = self.key_ids(variable, line, file)
+        if len(kids) == 1:
+            first, count = self.postings[kids[0]]
+            return self.steps[first + n - 1] if 0 < n <= count else None
+        for i, (step, _) in enumerate(self.history(variable, line, file), 1):
+            if i == n:
+                return step
+        return None
+
+    def last_before(self, variable, step, line=None, file=None):
+        """Step of the variable's latest record at or before `step` (its value as of that step), or None."""
+        best = None
+        for kid in self.key_ids(variable, line, file):
+            first, count = self.postings[kid]
+            i = bisect.bisect_right(self.steps, step, first, first + count)
+            if i > first and (best is None or self.steps[i - 1] > best):
+                best = self.steps[i - 1]
+        return best
+
+    def equals(self, variable, value, line=None, file=None):
+        """Yields steps whose recorded value equals `value`; CRC32 pre-filter, exact check on hits."""
+        target = zlib.crc32(value.encode("utf-8"))
+        runs = []
+        for kid in self.key_ids(variable, line, file):
+            first, count = self.postings[kid]
+            runs.append(self.steps[i] for i in range(first, first + count) if self.hashes[i] == target)
+        for step in heapq.merge(*runs):
+            if self.value(step) == value:
+                yield step
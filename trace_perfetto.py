@@ -0,0 +1,114 @@
+import csv
+import gzip
+import json
+import os
+
+# ==========================================
+# 1. THE TIMING MARKS (_TIMING.csv, written by the runtime when AD_TIMING=1)
+# ==========================================
+TIMING_FILE = "_TIMING.csv"
+PROCESS_ID = 1
+SPAN_OPEN = {"enter": "function", "loop": "loop"}
+SPAN_CLOSE = {"exit": "function", "exception": "function", "endloop": "loop"}
+
+
+def timing_path_for(path):
+    """Accepts the timing CSV itself or the sandbox folder the instrumented run wrote it into."""
+    return os.path.join(path, TIMING_FILE) if os.path.isdir(path) else path
+
+
+def read_marks(timing_path):
+    """Yields (time_ns, thread ident, line, event, name) in file order."""
+    with open(timing_path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+        rows = csv.reader(f)
+        next(rows, None)
+        for row in rows:
+            if len(row) < 5:
+                continue  # partial last row of a run that was killed
+            try:
+                yield int(row[0]), int(row[1]), int(row[2]), row[3], row[4]
+            except ValueError:
+                continue
+
+# ==========================================
+# 2. THE EXPORTER (Chrome trace-event JSON array, one event per line, never held in memory)
+# ==========================================
+class _Thread:
+    """Per-thread export state: track id, last mark, and the spans still open on the thread."""
+
+    def __init__(self, tid):
+        self.tid = tid
+        self.last = None
+        self.stack = []  # (kind, name) of open B events, innermost last
+
+
+def _open_output(out_path):
+    if out_path.endswith(".gz"):
+        return gzip.open(out_path, 'wt', encoding='utf-8')
+    return open(out_path, 'w', encoding='utf-8')
+
+
+def export_chrome_trace(timing_path, out_path, process_name="instrumented run", min_line_us=0.0):
+    """
+    Converts the runtime's timing marks into a Chrome/Perfetto trace: B/E spans for wrapped
+    functions and loops, an X slice per recorded statement (from the thread's previous mark to
+    the statement's own mark) and one track per thread. Marks are streamed, so memory depends
+    only on the thread count and call depth. Returns the number of events written.
+    """
+    threads = {}
+    start = None
+    written = 0
+
+    with _open_output(out_path) as out:
+        def emit(event):
+            nonlocal written
+            out.write(("[\n" if not written else ",\n") + json.dumps(event, separators=(",", ":")))
+            written += 1
+
+        emit({"ph": "M", "name": "process_name", "pid": PROCESS_ID, "args": {"name": process_name}})
+        for now, ident, line, event, name in read_marks(timing_path):
+            if start is None:
+                start = now
+            ts = (now - start) / 1000.0
+            thread = threads.get(ident)
+            if thread is None:
+                thread = threads[ident] = _Thread(len(threads) + 1)
+                emit({"ph": "M", "name": "thread_name", "pid": PROCESS_ID, "tid": thread.tid,
+                      "args": {"name": name if event == "thread" else f"thread {ident}"}})
+            if event == "thread":
+                thread.last = ts
+                continue
+
+            if event == "line":
+                if thread.last is not None and ts - thread.last >= min_line_us:
+                    emit({"ph": "X", "name": f"line {line}", "cat": "line", "pid": PROCESS_ID, "tid": thread.tid,
+                          "ts": thread.last, "dur": ts - thread.last, "args": {"line": line}})
+            elif event in SPAN_OPEN:
+                kind = SPAN_OPEN[event]
+                label = name if kind == "function" else f"loop @ line {line}"
+                thread.stack.append((kind, label))
+                emit({"ph": "B", "name": label, "cat": kind, "pid": PROCESS_ID, "tid": thread.tid, "ts": ts,
+                      "args": {"line": line}})
+            elif event in SPAN_CLOSE:
+                kind = SPAN_CLOSE[event]
+                # Loops left by return/raise/break-out never wrote their own end mark; close them with the call
+                target = name if kind == "function" else f"loop @ line {line}"
+                if any(open_span == (kind, target) for open_span in thread.stack):
+                    while thread.stack:
+                        open_kind, label = thread.stack.pop()
+                        args = {"line": line}
+                        if (open_kind, label) == (kind, target) and event == "exception":
+                            args["exception"] = True
+                        emit({"ph": "E", "name": label, "cat": open_kind, "pid": PROCESS_ID, "tid": thread.tid,
+                              "ts": ts, "args": args})
+                        if (open_kind, label) == (kind, target):
+                            break
+            thread.last = ts
+
+        # Spans still open when the run ended (killed, os._exit, daemon threads) end at the thread's last mark
+        for thread in threads.values():
+            while thread.stack:
+                kind, label = thread.stack.pop()
+                emit({"ph": "E", "name": label, "cat": kind, "pid": PROCESS_ID, "tid": thread.tid, "ts": thread.last})
+        out.write("\n]\n" if written else "[]\n")
+    return written
@@ -0,0 +1,232 @@
+import heapq
+import zlib
+from array import array
+
+from trace_index import TraceLayout
+
+# ==========================================
+# 1. THE SKETCHES (fixed memory whatever the trace size)
+# ==========================================
+SKETCH_CAPACITY = 1000     # keys monitored per Space-Saving summary
+CMS_WIDTH = 1 << 16
+CMS_DEPTH = 4
+STATE_SLOTS = 1 << 20      # hashed last-value table; collisions only add spurious changes
+PENDING_KEYS = 4096        # distinct keys summed locally before they are pushed into the sketches
+
+
+class SpaceSaving:
+    """
+    Top-k heavy hitters in O(capacity) memory (Metwally et al.). A key's count is an upper bound
+    that overestimates by at most its recorded error. The minimum is found through a lazy heap:
+    entries only lower-bound the live counts and are refreshed when they reach the top.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}    # key -> [count, error]
+        self._heap = []
+        self.total = 0
+
+    def add(self, key, weight=1):
+        """Counts `key`; returns the key evicted to make room for it, if any."""
+        self.total += weight
+        entry = self.counts.get(key)
+        if entry is not None:
+            entry[0] += weight
+            return None
+        evicted = None
+        error = 0
+        if len(self.counts) >= self.capacity:
+            while True:
+                count, victim = heapq.heappop(self._heap)
+                live = self.counts[victim][0]
+                if live == count:
+                    break
+                heapq.heappush(self._heap, (live, victim))
+            del self.counts[victim]
+            evicted, error = victim, count
+        self.counts[key] = [error + weight, error]
+        heapq.heappush(self._heap, (error + weight, key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(entry[0], k) for k, entry in self.counts.items()]
+            heapq.heapify(self._heap)
+        return evicted
+
+    def top(self, n):
+        """[(key, count, error)] by descending count."""
+        ranked = sorted(self.counts.items(), key=lambda kv: -kv[1][0])[:n]
+        return [(key, count, error) for key, (count, error) in ranked]
+
+
+class CountMin:
+    """Frequency estimates for any key (never below the true count) in width x depth counters."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.rows = [array('q', bytes(8 * width)) for _ in range(depth)]
+        self._recent = {}  # key -> slots; traces repeat the same few names, so hashing is mostly skipped
+
+    def _slots(self, key):
+        slots = self._recent.get(key)
+        if slots is None:
+            if len(self._recent) >= 4096:
+                self._recent.clear()
+            h = zlib.crc32(key)
+            step = (h >> 16) | 1
+            slots = self._recent[key] = tuple(enumerate((h + i * step) % self.width for i in range(len(self.rows))))
+        return slots
+
+    def add(self, key, weight=1):
+        rows = self.rows
+        for i, slot in self._slots(key):
+            rows[i][slot] += weight
+
+    def estimate(self, key):
+        return min(self.rows[i][slot] for i, slot in self._slots(key))
+
+# ==========================================
+# 2. THE VALUE MODEL (coarse runtime type and size, read from the repr the runtime wrote)
+# ==========================================
+_CONTAINERS = {ord("["): "list", ord("("): "tuple", ord("{"): "dict"}
+
+
+def value_type(value):
+    if not value:
+        return "str"
+    if value in (b"True", b"False"):
+        return "bool"
+    if value == b"None":
+        return "NoneType"
+    kind = _CONTAINERS.get(value[0])
+    if kind is not None:
+        if kind == "dict" and b":" not in value and value != b"{}":
+            return "set"
+        return kind
+    if value[0] == ord("<") and b" object at " in value:
+        return value[1:].split(b" ", 1)[0].rsplit(b".", 1)[-1].decode("utf-8", "replace")
+    digits = value[1:] if value[0] == ord("-") else value
+    if digits.isdigit():
+        return "int"
+    if digits[:1].isdigit() or digits[:1] in (b".", b"i", b"n"):
+        try:
+            float(value)
+            return "float"
+        except ValueError:
+            pass
+    return "str"
+
+
+def value_size(value):
+    """Element count for container reprs (commas + 1), character count otherwise."""
+    if value and value[0] in _CONTAINERS:
+        return 0 if len(value) <= 2 else value.count(b",") + 1
+    return len(value)
+
+# ==========================================
+# 3. THE REPORT (one streaming pass; memory fixed by the sketch sizes)
+# ==========================================
+class TraceReport:
+    """Heavy-hitter summaries of one trace; every count is an estimate with a known error bound."""
+
+    def __init__(self, capacity=SKETCH_CAPACITY, slots=STATE_SLOTS):
+        self.records = 0
+        self.snapshots = 0
+        self.lines = SpaceSaving(capacity)        # snapshots written per line
+        self.changes = SpaceSaving(capacity)      # value changes per variable
+        self.type_changes = SpaceSaving(capacity)
+        self.growth = SpaceSaving(capacity)       # size increases per variable
+        self.writes = CountMin()                  # records per variable, for change rates
+        self.types = {}                           # monitored type-unstable variable -> set of types seen
+        self.sizes = {}                           # monitored growing variable -> [first, last, max, decreases]
+        self._type_names = {}                     # type hash -> name, one entry per distinct type
+        self._slots = slots
+        self._last_value = array('q', bytes(8 * slots))
+        self._last_type = array('q', bytes(8 * slots))
+        self._last_size = array('q', [-1]) * slots
+
+    def _flush(self, pending_lines, pending_writes, pending_changes):
+        for key, weight in pending_lines.items():
+            self.lines.add(key, weight)
+        for key, weight in pending_writes.items():
+            self.writes.add(key, weight)
+        for key, weight in pending_changes.items():
+            self.changes.add(key, weight)
+        pending_lines.clear()
+        pending_writes.clear()
+        pending_changes.clear()
+
+    def feed(self, path):
+        # The hottest counters are summed in small dicts first and reach the sketches as weighted adds
+        pending_lines, pending_writes, pending_changes = {}, {}, {}
+        with open(path, 'rb') as src:
+            layout = TraceLayout.from_header_line(src.readline())
+            type_col = next((i for i, c in enumerate(layout.columns) if c.strip().lower() == "type"), None)
+            width = max(layout.width, (type_col or 0) + 1)
+            file_col, line_col, variable_col, value_col = layout.file, layout.line, layout.variable, layout.value
+            slots = self._slots
+            last_value, last_type, last_size = self._last_value, self._last_type, self._last_size
+            type_names = self._type_names
+            previous_where, snapshot_first = None, None
+            for raw in src:
+                self.records += 1
+                fields = layout.fields(raw)
+                if len(fields) < width:
+                    continue
+                where = (fields[file_col] + b":" + fields[line_col]) if file_col is not None else fields[line_col]
+                variable, value = fields[variable_col], fields[value_col]
+                # A snapshot is the run of rows one hook wrote for a line; a repeated first variable starts the next
+                marker = variable[:1] == b"<"
+                if where != previous_where or variable == snapshot_first or marker:
+                    previous_where, snapshot_first = where, variable
+                    self.snapshots += 1
+                    pending_lines[where] = pending_lines.get(where, 0) + 1
+                if marker and variable[-1:] == b">":
+                    continue  # <enter>/<exit>/<iteration> marker rows carry no variable value
+                name = (fields[file_col] + b":" + variable) if file_col is not None else variable
+                pending_writes[name] = pending_writes.get(name, 0) + 1
+                slot = hash(name) % slots
+
+                value_hash = hash(value) or 1
+                if last_value[slot] != value_hash:
+                    if last_value[slot]:
+                        pending_changes[name] = pending_changes.get(name, 0) + 1
+                    last_value[slot] = value_hash
+
+                kind = fields[type_col].decode("utf-8", "replace") if type_col is not None else value_type(value)
+                type_hash = hash(kind) or 1
+                if last_type[slot] != type_hash:
+                    if last_type[slot]:
+                        evicted = self.type_changes.add(name)
+                        self.types.pop(evicted, None)
+                        seen = self.types.setdefault(name, set())
+                        if len(seen) < 8:
+                            seen.add(kind)
+                            seen.add(type_names.get(last_type[slot], "?"))
+                    type_names.setdefault(type_hash, kind)
+                    last_type[slot] = type_hash
+
+                size = value_size(value)
+                before = last_size[slot]
+                if size != before:
+                    if before >= 0:
+                        tracked = self.sizes.get(name)
+                        if size > before:
+                            evicted = self.growth.add(name)
+                            self.sizes.pop(evicted, None)
+                            if tracked is None:
+                                tracked = self.sizes[name] = [before, size, size, 0]
+                        if tracked is not None:
+                            tracked[1] = size
+                            tracked[2] = max(tracked[2], size)
+                            if size < before:
+                                tracked[3] += 1
+                    last_size[slot] = size
+
+                if len(pending_writes) >= PENDING_KEYS or len(pending_lines) >= PENDING_KEYS:
+                    self._flush(pending_lines, pending_writes, pending_changes)
+        self._flush(pending_lines, pending_writes, pending_changes)
+        return self
+
+
+def report_trace(path, capacity=SKETCH_CAPACITY, slots=STATE_SLOTS):
+    return TraceReport(capacity, slots).feed(path)
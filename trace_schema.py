@@ -0,0 +1,502 @@
+import collections
+import csv
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from trace_index import COLUMN_ROLES, TraceLayout
+
+# ==========================================
+# 1. THE RECORD SCHEMA (what every trace reads as, whichever runtime wrote it)
+# ==========================================
+#   file      source file of the record; "" when the runtime does not say
+#   line      1-based source line (int); 0 when unknown
+#   seq       0-based position of the record in the run (int)
+#   thread    thread / process / lane id as text; "" when the runtime does not say
+#   variable  variable name, or a <marker>: <enter> <exit> <exception> <iteration> <stmt> <error>
+#   type      runtime or declared type name; "" when unknown
+#   value     the value as the runtime printed it
+SCHEMA_COLUMNS = ["File", "Line", "Seq", "Thread", "Variable", "Type", "Value"]
+TraceRecord = collections.namedtuple("TraceRecord", ["file", "line", "seq", "thread", "variable", "type", "value"])
+BATCH_RECORDS = 1 << 16
+CHUNK_BYTES = 1 << 22
+RANGE_BYTES = 1 << 25     # smallest byte range worth shipping to a worker process
+
+# Trace files written by the language runtimes, by format
+LEGACY_FILES = {
+    "_VARIABLE_TRACKER.csv": "csv", "_VAR_TRACKER.csv": "csv", "_SIGNAL_VARIABLE_TRACKER.csv": "csv",
+    "_Q_VARIABLE_TRACKER.csv": "csv", "_GLSL_VARIABLE_TRACKER.csv": "csv",
+    "_TRACE.log": "java", "_CLOJURE_DEBUG_LOG.txt": "clojure", "_BASH_VARIABLES.log": "bash",
+}
+
+
+class RecordBatch:
+    """Up to BATCH_RECORDS consecutive records as one list per schema column."""
+
+    __slots__ = ("file", "line", "seq", "thread", "variable", "type", "value")
+
+    def __init__(self, file, line, seq, thread, variable, type, value):
+        self.file = file
+        self.line = line
+        self.seq = seq
+        self.thread = thread
+        self.variable = variable
+        self.type = type
+        self.value = value
+
+    def __len__(self):
+        return len(self.seq)
+
+    def columns(self):
+        return [self.file, self.line, self.seq, self.thread, self.variable, self.type, self.value]
+
+    def records(self):
+        return map(TraceRecord, *self.columns())
+
+
+def _to_ints(texts):
+    try:
+        return list(map(int, texts))
+    except ValueError:
+        return [int(t) if t.strip().isdigit() else 0 for t in texts]
+
+# ==========================================
+# 2. THE LEGACY PARSERS (column-wise over large chunks; per-row work only for irregular ones)
+# ==========================================
+def _split_plain(lines, ncols, value):
+    """Rows without quotes; unquoted commas inside the value stay in the value."""
+    if value is None or value == ncols - 1:
+        return [line.split(",", ncols - 1) for line in lines]
+    tail = ncols - value - 1
+    rows = []
+    for line in lines:
+        head = line.rsplit(",", tail)
+        rows.append(head[0].split(",", value) + head[1:])
+    return rows
+
+
+def _split_rows(lines, ncols, value, layout):
+    """Rows of a chunk that has quotes or stray commas somewhere."""
+    try:
+        # Newlines go back in so quoted values the runtime's sanitizer missed keep their line breaks
+        rows = [row for row in csv.reader([line + "\n" for line in lines], strict=True) if row]
+        if all(len(row) == ncols for row in rows):
+            return rows
+    except csv.Error:
+        pass
+    # Unquoted commas or unescaped quotes somewhere in the chunk: row by row, leniently
+    rows = []
+    for line in lines:
+        if not line:
+            continue
+        if '"' not in line:
+            rows.extend(_split_plain([line], ncols, value))
+        elif layout is not None:
+            rows.append([f.decode("utf-8") for f in layout.fields(line.encode("utf-8"))])
+        else:
+            rows.append(next(csv.reader([line]), []))
+    return rows
+
+
+def _split_columns(complete, ncols, value, line_col, layout):
+    """One chunk of whole lines -> one list per column."""
+    if "\r" in complete:
+        complete = complete.replace("\r\n", "\n")
+    lines = complete.count("\n") + 1
+    # Clean chunks (the common case) are split in a single call and sliced into columns
+    if ('"' not in complete and "\n\n" not in complete and "\r" not in complete and
+            complete.count(",") == (ncols - 1) * lines):
+        flat = complete.replace("\n", ",").split(",")
+        columns = [flat[i::ncols] for i in range(ncols)]
+        # A row short of a comma and another with a stray one would still add up; the line column tells
+        if "".join(columns[line_col]).isdigit():
+            return columns
+    lines = complete.split("\n")
+    if '"' in complete:
+        rows = _split_rows(lines, ncols, value, layout)
+    else:
+        rows = _split_plain([line for line in lines if line], ncols, value)
+    rows = [row for row in rows if len(row) == ncols]  # partial rows of an interrupted run
+    return [list(col) for col in zip(*rows)] if rows else [[] for _ in range(ncols)]
+
+
+def _record_cut(block):
+    """Offset of the newline ending the last whole record of a block that starts on a record; -1 if none."""
+    cut = block.rfind(b"\n")
+    if cut < 0 or b'"' not in block:
+        return cut
+    # A newline after an odd number of quotes is inside a quoted value; one stray quote must not
+    # hold back the rest of the file though, so past half a block the plain last newline wins
+    quotes = block.count(b'"', 0, cut)
+    floor = len(block) // 2
+    candidate = cut
+    while quotes % 2 and candidate > floor:
+        previous = block.rfind(b"\n", 0, candidate)
+        if previous < 0:
+            break
+        quotes -= block.count(b'"', previous, candidate)
+        candidate = previous
+    return candidate if not quotes % 2 else cut
+
+
+_CsvHead = collections.namedtuple("_CsvHead", ["columns", "roles", "quantum", "layout", "start"])
+
+
+def _csv_head(path):
+    """Column roles of a CSV trace and the byte offset of its first record."""
+    with open(path, 'rb') as src:
+        header = src.readline()
+    columns = next(csv.reader([header.decode("utf-8-sig", "replace").rstrip("\r\n")]), [])
+    roles = {}
+    for i, name in enumerate(columns):
+        role = COLUMN_ROLES.get(name.strip().lower())
+        if role and role not in roles:
+            roles[role] = i
+    if "line" not in roles or "variable" not in roles:
+        raise ValueError(f"Not a variable trace; no line/variable column in: {','.join(columns)}")
+    # Q# flags quantum values in their own column; it becomes the type
+    quantum = next((i for i, c in enumerate(columns) if c.strip().lower() == "is_quantum_result"), None)
+    layout = TraceLayout(columns) if "value" in roles else None
+    return _CsvHead(columns, roles, quantum, layout, len(header))
+
+
+def _record_tail(src, limit):
+    """
+    The bytes from src's position through the newline that closes the quoted value a range end
+    fell into; b"" when no such newline comes within `limit` bytes (a stray quote, not a value).
+    """
+    tail = src.read(limit)
+    quotes, pos = 1, 0
+    while True:
+        nl = tail.find(b"\n", pos)
+        if nl < 0:
+            src.seek(-len(tail), os.SEEK_CUR)
+            return b""
+        quotes += tail.count(b'"', pos, nl)
+        if not quotes % 2:
+            src.seek(nl + 1 - len(tail), os.SEEK_CUR)
+            return tail[:nl + 1]
+        pos = nl + 1
+
+
+def _csv_range_batches(path, head, start, end, batch_size, seq=0, stop=None):
+    """
+    Batches of the records starting in bytes [start, end) of a CSV trace (to EOF when end is None).
+    A record the end cuts inside a quoted value is read to its true end, whose offset goes to stop[0].
+    """
+    roles, quantum = head.roles, head.quantum
+    ncols, value = len(head.columns), roles.get("value")
+    pending = [[] for _ in range(ncols)]
+
+    def batches(final):
+        nonlocal seq, pending
+        while len(pending[0]) >= batch_size or (final and pending[0]):
+            cols = [col[:batch_size] for col in pending]
+            pending = [col[batch_size:] for col in pending]
+            n = len(cols[0])
+            blank = [""] * n
+            get = lambda role: cols[roles[role]] if role in roles else blank
+            kinds = get("type")
+            if quantum is not None:
+                kinds = ["quantum" if flag.strip().lower() == "yes" else "" for flag in cols[quantum]]
+            yield RecordBatch(get("file"), _to_ints(cols[roles["line"]]), list(range(seq, seq + n)),
+                              get("thread"), cols[roles["variable"]], kinds, get("value"))
+            seq += n
+
+    with open(path, 'rb') as src:
+        src.seek(start)
+        left = end - start if end is not None else float("inf")
+        carry, quotes = b"", 0
+        while True:
+            text = src.read(min(CHUNK_BYTES, left)) if left > 0 else b""
+            left -= len(text)
+            quotes += text.count(b'"')
+            if not text and quotes % 2 and end is not None:
+                text, quotes = _record_tail(src, CHUNK_BYTES), 0
+            block = carry + text
+            if not text:
+                complete, carry = block, b""
+            else:
+                cut = _record_cut(block)
+                complete, carry = (block[:cut], block[cut + 1:]) if cut >= 0 else (b"", block)
+            complete = complete.decode("utf-8", "replace").rstrip("\r\n")
+            if complete:
+                for col, part in zip(pending, _split_columns(complete, ncols, value, roles["line"], head.layout)):
+                    col.extend(part)
+                yield from batches(False)
+            if not text:
+                break
+        if stop is not None:
+            stop[0] = src.tell()
+        yield from batches(True)
+
+
+def _csv_batches(path, batch_size):
+    head = _csv_head(path)
+    return _csv_range_batches(path, head, head.start, None, batch_size)
+
+
+# Text logs: one regex per format, each match turned into (file, line, variable, value)
+_JAVA_LINE = re.compile(r"^(\S+) \| (.*):(\d+) \| (.*)$")
+_CLOJURE_LINE = re.compile(r"^\[(DEBUG|ERROR)\] Line: (\d+) \| (.*)$")
+_BASH_SECTION = re.compile(r"^--- STATE AT ERROR \(Line (\d+)\) ---$")
+_BASH_VARIABLE = re.compile(r"^([A-Za-z_][A-Za-z0-9_]*)=(.*)$")
+_BASH_FUNCTION = re.compile(r"^\S+ \(\) ?$")
+
+
+def _java_rows(lines):
+    for line in lines:
+        match = _JAVA_LINE.match(line)
+        if match:
+            yield match.group(2), int(match.group(3)), "<stmt>", match.group(4)
+
+
+def _clojure_rows(lines):
+    for line in lines:
+        match = _CLOJURE_LINE.match(line)
+        if not match:
+            continue
+        if match.group(1) == "ERROR":
+            yield "", int(match.group(2)), "<error>", match.group(3)
+        else:
+            variable, _, value = match.group(3).partition(" = ")
+            yield "", int(match.group(2)), variable, value
+
+
+def _bash_rows(lines):
+    # `set` prints variables, then function bodies; only the variables of each error section are kept
+    line_no = None
+    for line in lines:
+        section = _BASH_SECTION.match(line)
+        if section:
+            line_no = int(section.group(1))
+            continue
+        if line_no is None:
+            continue
+        if _BASH_FUNCTION.match(line):
+            line_no = None
+            continue
+        match = _BASH_VARIABLE.match(line)
+        if match:
+            yield "", line_no, match.group(1), match.group(2)
+
+
+_LOG_PARSERS = {"java": _java_rows, "clojure": _clojure_rows, "bash": _bash_rows}
+
+
+def _log_batches(path, fmt, batch_size):
+    with open(path, 'r', encoding='utf-8', errors='replace') as src:
+        lines = (line.rstrip("\r\n") for line in src)
+        seq, batch = 0, []
+        for row in _LOG_PARSERS[fmt](lines):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield _rows_to_batch(batch, seq)
+                seq += len(batch)
+                batch = []
+        if batch:
+            yield _rows_to_batch(batch, seq)
+
+
+def _rows_to_batch(rows, seq):
+    files, lines, variables, values = (list(col) for col in zip(*rows))
+    blank = [""] * len(rows)
+    return RecordBatch(files, lines, list(range(seq, seq + len(rows))), blank, variables, blank, values)
+
+# ==========================================
+# 3. THE INGEST API
+# ==========================================
+def detect_format(path):
+    """'csv', 'java', 'clojure' or 'bash', from the file name or else its first line."""
+    fmt = LEGACY_FILES.get(os.path.basename(path))
+    if fmt is not None:
+        return fmt
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        first = f.readline().rstrip("\r\n")
+    if _CLOJURE_LINE.match(first):
+        return "clojure"
+    if first.startswith("--- VARIABLE DUMPS") or _BASH_SECTION.match(first):
+        return "bash"
+    if _JAVA_LINE.match(first):
+        return "java"
+    header = {c.strip().lower() for c in next(csv.reader([first]), [])}
+    if "line" in header and ("variable" in header or "object" in header):
+        return "csv"
+    raise ValueError(f"Unrecognized trace format: {path}")
+
+
+def iter_batches(path, batch_size=BATCH_RECORDS, fmt=None, jobs=1):
+    """
+    Yields RecordBatch column blocks of any runtime's trace file, in record order. CSV traces
+    are parsed by `jobs` worker processes (None: one per CPU) when jobs is not 1.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == "csv":
+        return _csv_batches(path, batch_size) if jobs == 1 else _parallel_batches(path, jobs, batch_size)
+    if fmt in _LOG_PARSERS:
+        return _log_batches(path, fmt, batch_size)
+    raise ValueError(f"Unknown trace format: {fmt}")
+
+
+def iter_records(path, fmt=None):
+    for batch in iter_batches(path, fmt=fmt):
+        yield from batch.records()
+
+
+def find_traces(folder):
+    """Trace files any runtime left in a sandbox folder (top level only, where the runtimes write)."""
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name in LEGACY_FILES and os.path.isfile(os.path.join(folder, name)))
+
+
+def write_schema_csv(path, out_path, fmt=None, jobs=1):
+    """Rewrites any trace as a schema CSV (SCHEMA_COLUMNS header); returns the record count."""
+    count = 0
+    with open(out_path, 'w', encoding='utf-8', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(SCHEMA_COLUMNS)
+        for batch in iter_batches(path, fmt=fmt, jobs=jobs):
+            writer.writerows(zip(*batch.columns()))
+            count += len(batch)
+    return count
+
+# ==========================================
+# 4. THE PARALLEL INGEST (byte ranges split on record boundaries, parsed in a process pool)
+# ==========================================
+def _looks_like_record(line, head):
+    line = line.rstrip(b"\r")
+    if not line:
+        return False
+    if b'"' in line:
+        if line.count(b'"') % 2:
+            return False  # opens or closes a value that spans lines
+        try:
+            fields = next(csv.reader([line.decode("utf-8", "replace")], strict=True), [])
+        except csv.Error:
+            return False
+    else:
+        fields = line.split(b",")
+    return len(fields) >= len(head.columns) and fields[head.roles["line"]].strip().isdigit()
+
+
+def _record_start(src, pos, size, head):
+    """
+    Likely first record start after `pos`: a line break followed by two lines that both parse as
+    records. Quoted values can look like records too; _checked_results repairs a wrong guess.
+    """
+    window = 1 << 16
+    while True:
+        src.seek(pos)
+        block = src.read(window)
+        at_eof = pos + len(block) >= size
+        lines = block.split(b"\n")
+        if not at_eof:
+            lines.pop()  # cut off by the window
+        offset = pos + len(lines[0]) + 1  # lines[0] is the rest of whatever record pos fell into
+        for i in range(1, len(lines) - 1):
+            if _looks_like_record(lines[i], head) and _looks_like_record(lines[i + 1], head):
+                return offset
+            offset += len(lines[i]) + 1
+        if at_eof:
+            return size
+        window *= 4
+
+
+def split_ranges(path, parts, head=None):
+    """[(start, end)] byte ranges covering the records of a CSV trace, each starting on a record."""
+    head = head or _csv_head(path)
+    size = os.path.getsize(path)
+    bounds = [head.start]
+    with open(path, 'rb') as src:
+        for i in range(1, parts):
+            target = head.start + (size - head.start) * i // parts
+            if target <= bounds[-1]:
+                continue
+            start = _record_start(src, target, size, head)
+            if bounds[-1] < start < size:
+                bounds.append(start)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _parse_range(task):
+    """(result, offset of the true record end the range stopped at); func must use up the batches."""
+    path, head, start, end, batch_size, func = task
+    stop = [end]
+    batches = _csv_range_batches(path, head, start, end, batch_size, stop=stop)
+    result = func(batches) if func is not None else list(batches)
+    return result, stop[0]
+
+
+def _checked_results(parsed):
+    """
+    The results of (task, (result, stop)) pairs in file order. A range whose guessed start is not
+    where the range before it really stopped began inside a quoted value; it is parsed again from there.
+    """
+    expected = None
+    for task, (result, stop) in parsed:
+        path, head, start, end, batch_size, func = task
+        if expected is not None and start != expected:
+            result, stop = _parse_range((path, head, min(expected, end), end, batch_size, func))
+            stop = max(stop, expected)
+        expected = stop
+        yield result
+
+
+def _range_tasks(path, jobs, batch_size, func):
+    jobs = jobs or os.cpu_count() or 1
+    head = _csv_head(path)
+    # A few ranges per worker, so one slow range does not leave the others idle at the end
+    parts = max(1, min(jobs * 4, (os.path.getsize(path) - head.start) // RANGE_BYTES))
+    return jobs, [(path, head, start, end, batch_size, func) for start, end in split_ranges(path, parts, head)]
+
+
+def _parallel_batches(path, jobs, batch_size):
+    jobs, tasks = _range_tasks(path, jobs, batch_size, None)
+    if jobs == 1 or len(tasks) < 2:
+        yield from _csv_batches(path, batch_size)
+        return
+    seq = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for batches in _checked_results(_submitted(executor, tasks, jobs * 2)):
+            for batch in batches:
+                n = len(batch)
+                batch.seq = list(range(seq, seq + n))
+                seq += n
+                yield batch
+
+
+def _submitted(executor, tasks, in_flight):
+    """(task, (result, stop)) in task order, with at most `in_flight` ranges parsed ahead (bounded memory)."""
+    futures = collections.deque()
+    for task in tasks:
+        futures.append((task, executor.submit(_parse_range, task)))
+        if len(futures) >= in_flight:
+            done, future = futures.popleft()
+            yield done, future.result()
+    while futures:
+        done, future = futures.popleft()
+        yield done, future.result()
+
+
+def map_ranges(path, func, jobs=None, batch_size=BATCH_RECORDS):
+    """
+    Runs func(batches) on every byte range of a CSV trace in a process pool and returns the
+    results in file order; only these partials travel back, so aggregations scale with the
+    workers. func must be a module-level function, and the seq of each range starts at 0.
+    """
+    jobs, tasks = _range_tasks(path, jobs, batch_size, func)
+    if jobs == 1 or len(tasks) < 2:
+        return list(_checked_results((task, _parse_range(task)) for task in tasks))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(_checked_results(zip(tasks, executor.map(_parse_range, tasks))))
+
+
+def tally(batches):
+    """Partial counts for map_ranges: {"records": n, "lines": Counter, "variables": Counter}."""
+    records, lines, variables = 0, collections.Counter(), collections.Counter()
+    for batch in batches:
+        records += len(batch)
+        lines.update(zip(batch.file, batch.line))
+        variables.update(batch.variable)
+    return {"records": records, "lines": lines, "variables": variables}
@@ -0,0 +1,130 @@
+import json
+import os
+import selectors
+import socket
+import struct
+
+from trace_index import TraceLayout
+
+# ==========================================
+# 1. THE WIRE FORMAT (kept in step with _AdStreamSink in the runtime header)
+# ==========================================
+FRAME = struct.Struct("<IB")  # payload length, kind
+KIND_ROW, KIND_HELLO, KIND_DROPPED = 0, 1, 2
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+
+def parse_address(address):
+    """'unix:/path', 'tcp:host:port' or 'host:port' -> (socket family, bind/connect target)."""
+    kind, _, target = address.partition(":")
+    if kind == "unix":
+        return socket.AF_UNIX, target
+    host, _, port = (target if kind == "tcp" else address).rpartition(":")
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class FrameReader:
+    """Reassembles frames from arbitrary socket reads."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        self._buffer += data
+        buffer, pos = self._buffer, 0
+        while len(buffer) - pos >= FRAME.size:
+            length, kind = FRAME.unpack_from(buffer, pos)
+            if length > MAX_PAYLOAD:
+                raise ValueError(f"frame of {length:,} bytes; not an ad-trace stream")
+            end = pos + FRAME.size + length
+            if end > len(buffer):
+                break
+            yield kind, bytes(buffer[pos + FRAME.size:end])
+            pos = end
+        del buffer[:pos]
+
+# ==========================================
+# 2. THE COLLECTOR (one listening socket, any number of instrumented processes)
+# ==========================================
+class Producer:
+    """One connected instrumented process."""
+
+    def __init__(self, sock, peer):
+        self.sock = sock
+        self.peer = peer
+        self.reader = FrameReader()
+        self.pid = None
+        self.argv = []
+        self.layout = TraceLayout(["Line", "Variable", "Value"])
+        self.rows = 0
+        self.dropped = 0
+
+
+def open_listener(address):
+    family, target = parse_address(address)
+    if family == socket.AF_UNIX and os.path.exists(target):
+        os.remove(target)  # stale socket of a collector that did not shut down cleanly
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    if family != socket.AF_UNIX:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(target)
+    sock.listen(16)
+    sock.setblocking(False)
+    return sock
+
+
+def collect(address, on_row, on_event=None, stop=None):
+    """
+    Accepts instrumented processes on `address` and calls on_row(producer, fields) for every
+    trace row and on_event(producer, kind, detail) for connects, drop notices and disconnects.
+    Runs until `stop()` returns True (checked every 0.2s) or KeyboardInterrupt.
+    """
+    on_event = on_event or (lambda producer, kind, detail: None)
+    listener = open_listener(address)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, None)
+    try:
+        while stop is None or not stop():
+            for key, _ in selector.select(timeout=0.2):
+                if key.data is None:
+                    sock, peer = listener.accept()
+                    sock.setblocking(False)
+                    selector.register(sock, selectors.EVENT_READ, Producer(sock, peer))
+                    continue
+                producer = key.data
+                try:
+                    data = producer.sock.recv(1 << 18)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    selector.unregister(producer.sock)
+                    producer.sock.close()
+                    on_event(producer, "disconnect", None)
+                    continue
+                try:
+                    for kind, payload in producer.reader.feed(data):
+                        if kind == KIND_ROW:
+                            producer.rows += 1
+                            on_row(producer, producer.layout.fields(payload))
+                        elif kind == KIND_HELLO:
+                            hello = json.loads(payload)
+                            producer.pid, producer.argv = hello.get("pid"), hello.get("argv", [])
+                            producer.layout = TraceLayout(hello.get("columns") or ["Line", "Variable", "Value"])
+                            on_event(producer, "connect", hello)
+                        elif kind == KIND_DROPPED:
+                            count = int(payload)
+                            producer.dropped += count
+                            on_event(producer, "dropped", count)
+                except ValueError as e:
+                    selector.unregister(producer.sock)
+                    producer.sock.close()
+                    on_event(producer, "error", str(e))
+    finally:
+        for key in list(selector.get_map().values()):
+            key.fileobj.close()
+        selector.close()
+        family, target = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(target):
+            os.remove(target)
@@ -0,0 +1,270 @@
+import json
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+from array import array
+
+from trace_index import TraceIndex, TraceLayout, read_sidecar_meta, sidecar_is_fresh, write_sidecar_meta
+
+# ==========================================
+# 1. FRAMES (recovered from the <enter>/<exit>/<exception> rows of function mode)
+# ==========================================
+TIMELINE_MAGIC = b"ADCKPT1\0"
+TIMELINE_VERSION = 2
+CHECKPOINT_INTERVAL = 4096  # records between full-state checkpoints; a lookup replays at most this many
+FRAME_MARKERS = ("<enter>", "<exit>", "<exception>")
+SNAPSHOT_MARKERS = FRAME_MARKERS + ("<iteration>",)
+TRIGGER_MARKER = "<trigger>"  # where an AD_TRIGGERS capture window opened
+FLUSH_RECORDS = 1 << 20
+
+
+def timeline_path_for(trace_path):
+    return trace_path + ".adckpt"
+
+
+def build_timeline(trace_path, timeline_path=None, interval=CHECKPOINT_INTERVAL):
+    """
+    One pass over a trace that assigns every record to a frame and snapshots the locals of every
+    live frame each `interval` records. Frame 0 is the module level; each <enter> row opens a
+    frame and the matching <exit>/<exception> closes it once its final locals dump (the rows on
+    the marker's line that follow it) has been written. Values persist until overwritten, so
+    sampled loops and delta-style traces reconstruct to the last known value.
+    """
+    timeline_path = timeline_path or timeline_path_for(trace_path)
+    mtime_ns = os.stat(trace_path).st_mtime_ns
+    names, name_ids = ["<module>"], {"<module>": 0}
+    enters, exits, parents, name_of = array('q', [0]), array('q', [-1]), array('q', [-1]), array('I', [0])
+    stack, states = [0], {0: {}}
+    closing = None  # (frame, line) whose exit dump is still being written
+    checkpoints = array('q')
+
+    with open(trace_path, 'rb') as src, tempfile.TemporaryFile() as frames_tmp, \
+            tempfile.TemporaryFile() as blobs_tmp:
+        header = src.readline()
+        layout = TraceLayout.from_header_line(header)
+        offset, step = len(header), 0
+        frame_of = array('I')
+
+        for raw in src:
+            offset += len(raw)
+            if step % interval == 0:
+                checkpoints.append(blobs_tmp.tell())
+                blobs_tmp.write(json.dumps(states, separators=(",", ":")).encode("utf-8"))
+            fields = layout.fields(raw)
+            frame = stack[-1]
+            if len(fields) >= layout.width:
+                line = fields[layout.line].decode("utf-8", "replace")
+                variable = fields[layout.variable].decode("utf-8", "replace")
+                value = fields[layout.value].decode("utf-8", "replace")
+                if closing is not None and (line != closing[1] or variable in FRAME_MARKERS):
+                    states.pop(closing[0], None)
+                    closing = None
+                if variable == "<enter>":
+                    frame = len(enters)
+                    if value not in name_ids:
+                        name_ids[value] = len(names)
+                        names.append(value)
+                    enters.append(step)
+                    exits.append(-1)
+                    parents.append(stack[-1])
+                    name_of.append(name_ids[value])
+                    stack.append(frame)
+                    states[frame] = {}
+                elif variable in ("<exit>", "<exception>"):
+                    # Pop to the innermost call of that function; calls left open above it lost their exit row
+                    target = next((f for f in reversed(stack[1:]) if names[name_of[f]] == value), stack[-1])
+                    if target != 0:
+                        while stack[-1] != target:
+                            lost = stack.pop()
+                            exits[lost] = step - 1
+                            states.pop(lost, None)
+                        stack.pop()
+                        exits[target] = step
+                        closing = (target, line)
+                    frame = target
+                elif variable == TRIGGER_MARKER:
+                    pass
+                elif closing is not None:
+                    frame = closing[0]
+                    exits[frame] = step
+                    states[frame][variable] = value
+                else:
+                    states[frame][variable] = value
+            frame_of.append(frame)
+            step += 1
+            if len(frame_of) >= FLUSH_RECORDS:
+                frames_tmp.write(frame_of.tobytes())
+                del frame_of[:]
+        frames_tmp.write(frame_of.tobytes())
+        checkpoints.append(blobs_tmp.tell())
+
+        meta = {
+            "version": TIMELINE_VERSION, "byteorder": sys.byteorder, "source_size": offset,
+            "source_mtime_ns": mtime_ns, "interval": interval, "records": step, "frames": len(enters),
+            "checkpoints": len(checkpoints) - 1, "names": names,
+        }
+        tmp_path = timeline_path + ".tmp"
+        with open(tmp_path, 'wb') as out:
+            write_sidecar_meta(out, TIMELINE_MAGIC, meta)
+            for data in (enters, exits, parents, name_of):
+                out.write(data.tobytes())
+            out.write(b"\0" * (-out.tell() % 8))
+            frames_tmp.seek(0)
+            shutil.copyfileobj(frames_tmp, out, 1 << 20)
+            out.write(b"\0" * (-out.tell() % 8))
+            out.write(checkpoints.tobytes())
+            blobs_tmp.seek(0)
+            shutil.copyfileobj(blobs_tmp, out, 1 << 20)
+        os.replace(tmp_path, timeline_path)
+    return timeline_path
+
+# ==========================================
+# 2. RECONSTRUCTION (nearest checkpoint + at most `interval` records of replay)
+# ==========================================
+class TraceTimeline:
+    """All locals of any frame at any step of a trace, plus snapshot-by-snapshot stepping."""
+
+    def __init__(self, trace_path, interval=CHECKPOINT_INTERVAL, rebuild=False, verbose=False):
+        self.index = TraceIndex(trace_path, rebuild=rebuild, verbose=verbose)
+        self.path = timeline_path_for(trace_path)
+        if rebuild or not sidecar_is_fresh(self.path, TIMELINE_MAGIC, TIMELINE_VERSION, trace_path,
+                                           interval=interval):
+            if verbose:
+                print(f"[TIMELINE] Checkpointing {trace_path} every {interval:,} records...", file=sys.stderr)
+            build_timeline(trace_path, self.path, interval)
+
+        self._file = open(self.path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        meta, pos = read_sidecar_meta(self._map, TIMELINE_MAGIC)
+        self.interval = meta["interval"]
+        self.records = meta["records"]
+        self.names = meta["names"]
+        frames = meta["frames"]
+        view = memoryview(self._map)
+        self._views = [view]
+
+        def take(code, count, align=False):
+            nonlocal pos
+            width = array(code).itemsize
+            section = view[pos:pos + count * width].cast(code)
+            pos += count * width
+            if align:
+                pos += -pos % 8
+            self._views.append(section)
+            return section
+
+        self.enters = take('q', frames)
+        self.exits = take('q', frames)
+        self.parents = take('q', frames)
+        self.name_of = take('I', frames, align=True)
+        self.frame_of = take('I', self.records, align=True)
+        self._checkpoints = take('q', meta["checkpoints"] + 1)
+        self._blobs = pos
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._map.close()
+        self._file.close()
+        self.index.close()
+
+    # ----- frames -----
+    def frame_info(self, frame):
+        return {"frame": frame, "function": self.names[self.name_of[frame]], "enter": self.enters[frame],
+                "exit": None if self.exits[frame] < 0 else self.exits[frame],
+                "parent": None if self.parents[frame] < 0 else self.parents[frame]}
+
+    def frames(self, function=None):
+        for frame in range(len(self.enters)):
+            if function is None or self.names[self.name_of[frame]] == function:
+                yield frame
+
+    def call_stack(self, frame):
+        """The frame and its callers, innermost first."""
+        chain = []
+        while frame >= 0:
+            chain.append(frame)
+            frame = self.parents[frame]
+        return chain
+
+    def frame_at(self, step):
+        return self.frame_of[step]
+
+    # ----- state -----
+    def _checkpoint(self, n):
+        start = self._blobs + self._checkpoints[n]
+        end = self._blobs + self._checkpoints[n + 1]
+        return json.loads(self._map[start:end])
+
+    def state(self, frame, step):
+        """{variable: value} of `frame` as of `step` (clamped to the frame's lifetime), or None before it starts."""
+        enter = self.enters[frame]
+        if step < enter:
+            return None
+        if self.exits[frame] >= 0:
+            step = min(step, self.exits[frame])
+        step = min(step, self.records - 1)
+        checkpoint = step // self.interval
+        start = checkpoint * self.interval
+        if enter >= start:
+            values, start = {}, enter
+        else:
+            values = self._checkpoint(checkpoint).get(str(frame), {})
+        layout = self.index.layout
+        for s in range(start, step + 1):
+            if self.frame_of[s] != frame:
+                continue
+            fields = self.index.record(s)
+            if len(fields) >= layout.width and fields[layout.variable] not in FRAME_MARKERS:
+                values[fields[layout.variable]] = fields[layout.value]
+        return values
+
+    # ----- stepping (a snapshot is a run of the frame's records from one line, split at marker rows) -----
+    def line_of(self, step):
+        fields = self.index.record(step)
+        return fields[self.index.layout.line] if len(fields) > self.index.layout.line else None
+
+    def _starts_snapshot(self, frame, step):
+        if step == 0 or self.frame_of[step - 1] != frame:
+            return True
+        fields = self.index.record(step)
+        layout = self.index.layout
+        if len(fields) >= layout.width and fields[layout.variable] in SNAPSHOT_MARKERS:
+            return True
+        return self.line_of(step - 1) != (fields[layout.line] if len(fields) > layout.line else None)
+
+    def snapshot_end(self, frame, step):
+        while step + 1 < self.records and not self._starts_snapshot(frame, step + 1):
+            step += 1
+        return step
+
+    def next_snapshot(self, frame, step):
+        """First step of the frame's next snapshot after the one containing `step`, or None."""
+        last = self.exits[frame] if self.exits[frame] >= 0 else self.records - 1
+        s = self.snapshot_end(frame, step) + 1
+        while s <= last and self.frame_of[s] != frame:
+            s += 1
+        return s if s <= last else None
+
+    def prev_snapshot(self, frame, step):
+        """First step of the frame's snapshot before the one containing `step`, or None."""
+        s = step
+        while s > self.enters[frame] and not self._starts_snapshot(frame, s):
+            s -= 1
+        s -= 1
+        while s >= self.enters[frame] and self.frame_of[s] != frame:
+            s -= 1
+        if s < self.enters[frame]:
+            return None
+        while s > self.enters[frame] and not self._starts_snapshot(frame, s):
+            s -= 1
+        return s
@@ -0,0 +1,278 @@
+import sys
+import threading
+import time
+import tkinter as tk
+from array import array
+from tkinter import filedialog, messagebox, ttk
+
+from trace_index import TraceIndex
+
+# ==========================================
+# 1. THEME (same palette as the scheduler sample)
+# ==========================================
+BG_MAIN = "#0f172a"
+BG_CARD = "#1e293b"
+ACCENT = "#38bdf8"
+TEXT_COLOR = "#f8fafc"
+ROW_HEIGHT = 22
+POLL_MS = 100
+SCAN_BATCH = 4096
+
+# ==========================================
+# 2. THE VIEWER (a fixed pool of Treeview rows over a virtual list of steps)
+# ==========================================
+class TraceViewer:
+    """
+    Only the rows that fit in the window exist as Treeview items; scrolling rewrites their values
+    from the trace's offset index. A filter produces an array of matching steps in a background
+    thread and the view pages through that array instead, while it is still growing.
+    """
+
+    def __init__(self, root, trace_path):
+        self.root = root
+        self.trace_path = trace_path
+        self.index = None
+        self.matches = None       # None = every step; otherwise array('q') of matching steps
+        self.top = 0
+        self.items = []
+        self._generation = 0      # bumped to cancel a running filter scan
+        self._scan_state = ""
+        self._shown = None
+
+        root.title(f"Trace Viewer - {trace_path}")
+        root.geometry("1100x700")
+        root.configure(bg=BG_MAIN)
+        self.setup_styles()
+        self.create_widgets()
+        self.status.set("Indexing trace (first open of a large trace can take a while)...")
+        threading.Thread(target=self._open_index, daemon=True).start()
+        root.after(POLL_MS, self._poll)
+
+    def setup_styles(self):
+        style = ttk.Style()
+        style.theme_use("clam")
+        style.configure("Treeview", background=BG_CARD, foreground=TEXT_COLOR, fieldbackground=BG_CARD,
+                        rowheight=ROW_HEIGHT, font=("Consolas", 10))
+        style.configure("Treeview.Heading", background="#334155", foreground=ACCENT, relief="flat",
+                        font=("Segoe UI", 10, "bold"))
+        style.map("Treeview", background=[('selected', ACCENT)], foreground=[('selected', "black")])
+
+    def create_widgets(self):
+        bar = tk.Frame(self.root, bg=BG_MAIN, padx=10, pady=10)
+        bar.pack(fill="x")
+        self.filters = {}
+        for label in ("Line", "Variable", "Value contains"):
+            tk.Label(bar, text=label, bg=BG_MAIN, fg="#94a3b8", font=("Segoe UI", 9, "bold")).pack(side="left")
+            entry = tk.Entry(bar, bg=BG_CARD, fg="white", insertbackground="white", relief="flat", width=18)
+            entry.pack(side="left", padx=(4, 12))
+            entry.bind("<Return>", lambda _e: self.apply_filter())
+            self.filters[label] = entry
+        tk.Button(bar, text="FILTER", command=self.apply_filter, bg=ACCENT, fg="black", relief="flat").pack(side="left")
+        tk.Button(bar, text="CLEAR", command=self.clear_filter, bg="#334155", fg="white", relief="flat").pack(
+            side="left", padx=6)
+        tk.Label(bar, text="Go to step", bg=BG_MAIN, fg="#94a3b8", font=("Segoe UI", 9, "bold")).pack(side="left", padx=(20, 4))
+        self.goto_entry = tk.Entry(bar, bg=BG_CARD, fg="white", insertbackground="white", relief="flat", width=12)
+        self.goto_entry.pack(side="left")
+        self.goto_entry.bind("<Return>", lambda _e: self.goto_step())
+
+        table = tk.Frame(self.root, bg=BG_MAIN)
+        table.pack(fill="both", expand=True, padx=10)
+        self.tree = ttk.Treeview(table, show="headings", selectmode="browse")
+        self.scrollbar = ttk.Scrollbar(table, orient="vertical", command=self.on_scrollbar)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.status = tk.StringVar()
+        tk.Label(self.root, textvariable=self.status, bg=BG_MAIN, fg="#94a3b8", anchor="w",
+                 font=("Segoe UI", 9)).pack(fill="x", padx=10, pady=6)
+
+        self.tree.bind("<Configure>", lambda _e: self._resize())
+        for sequence, delta in (("<Button-4>", -3), ("<Button-5>", 3)):
+            self.tree.bind(sequence, lambda _e, d=delta: self.scroll_to(self.top + d))
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll_to(self.top - (e.delta // 120 or (1 if e.delta > 0 else -1)) * 3))
+        self.tree.bind("<Up>", lambda _e: self._key_scroll(-1))
+        self.tree.bind("<Down>", lambda _e: self._key_scroll(1))
+        self.tree.bind("<Prior>", lambda _e: self._key_scroll(-len(self.items)))
+        self.tree.bind("<Next>", lambda _e: self._key_scroll(len(self.items)))
+        self.tree.bind("<Home>", lambda _e: self._key_scroll(-self.total()))
+        self.tree.bind("<End>", lambda _e: self._key_scroll(self.total()))
+
+    # ----- data -----
+    def _open_index(self):
+        try:
+            index = TraceIndex(self.trace_path)
+        except (OSError, ValueError) as e:
+            self._scan_state = f"Cannot open trace: {e}"
+            return
+        self.index = index
+
+    def total(self):
+        if self.index is None:
+            return 0
+        return len(self.index) if self.matches is None else len(self.matches)
+
+    def step_at(self, row):
+        return row if self.matches is None else self.matches[row]
+
+    # ----- virtual scrolling -----
+    def _install_columns(self):
+        columns = ["Step"] + self.index.layout.columns
+        self.tree.configure(columns=columns)
+        for col in columns:
+            self.tree.heading(col, text=col)
+            self.tree.column(col, anchor="w", width=80 if col in ("Step", "Line") else 160,
+                             stretch=col == columns[-1] or col == "Value")
+        self._resize()
+
+    def _resize(self):
+        rows = max(1, self.tree.winfo_height() // ROW_HEIGHT - 1)
+        while len(self.items) < rows:
+            self.items.append(self.tree.insert("", "end", values=()))
+        while len(self.items) > rows:
+            self.tree.delete(self.items.pop())
+        self._shown = None
+        self.refresh()
+
+    def scroll_to(self, top):
+        self.top = max(0, min(top, self.total() - len(self.items)))
+        self.refresh()
+
+    def _key_scroll(self, delta):
+        self.scroll_to(self.top + delta)
+        return "break"
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * self.total()))
+        elif action == "scroll":
+            step = len(self.items) if unit == "pages" else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def refresh(self):
+        total = self.total()
+        visible = len(self.items)
+        # Rows are rewritten only when the window moves, resizes or a growing filter result fills it
+        state = (self.top, visible, min(visible, max(0, total - self.top)))
+        if self.index is not None and state != self._shown:
+            self._shown = state
+            for i, iid in enumerate(self.items):
+                row = self.top + i
+                if row < total:
+                    step = self.step_at(row)
+                    self.tree.item(iid, values=[step] + self.index.record(step))
+                else:
+                    self.tree.item(iid, values=())
+        if total:
+            self.scrollbar.set(self.top / total, min(1.0, (self.top + visible) / total))
+        else:
+            self.scrollbar.set(0, 1)
+
+    def goto_step(self):
+        try:
+            step = int(self.goto_entry.get().strip())
+        except ValueError:
+            return
+        if self.matches is None:
+            self.scroll_to(step)
+        else:
+            # First match at or after the step (matches are in step order)
+            lo, hi = 0, len(self.matches)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.matches[mid] < step:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            self.scroll_to(lo)
+
+    # ----- filtering (background thread, results streamed into self.matches) -----
+    def apply_filter(self):
+        if self.index is None:
+            return
+        line = self.filters["Line"].get().strip() or None
+        variable = self.filters["Variable"].get().strip() or None
+        needle = self.filters["Value contains"].get()
+        if line is None and variable is None and not needle:
+            return self.clear_filter()
+        self._generation += 1
+        self.matches = array('q')
+        self.top = 0
+        self._shown = None
+        threading.Thread(target=self._scan, args=(self._generation, self.matches, line, variable, needle),
+                         daemon=True).start()
+        self.refresh()
+
+    def clear_filter(self):
+        self._generation += 1
+        self.matches = None
+        self._scan_state = ""
+        self._shown = None
+        self.scroll_to(0)
+
+    def _scan(self, generation, matches, line, variable, needle):
+        index = self.index
+        layout = index.layout
+        start = time.perf_counter()
+        if variable is not None:
+            # The posting lists of the index give the variable's steps directly
+            total = index.count(variable, line=line)
+            source = (step for step, _ in index.history(variable, line=line))
+        else:
+            total = len(index)
+            source = iter(range(total))
+        # Cheap byte tests on the raw row first; quotes are escaped in the CSV, so such needles skip it
+        needle_bytes = needle.encode("utf-8") if '"' not in needle else b""
+        line_bytes = line.encode("utf-8") if line is not None else b""
+        batch = array('q')
+        scanned = 0
+        for step in source:
+            if generation != self._generation:
+                return
+            scanned += 1
+            # Progress and the matches so far go out on a fixed row count, however few rows match
+            if scanned % (SCAN_BATCH * 16) == 0:
+                if batch:
+                    matches.extend(batch)
+                    del batch[:]
+                self._scan_state = f"Filtering... {scanned / max(total, 1):.0%} scanned"
+            if variable is None or needle:
+                raw = index.raw_record(step)
+                if needle_bytes not in raw or line_bytes not in raw:
+                    continue
+                fields = index.record(step)
+                if len(fields) < layout.width:
+                    continue
+                if line is not None and fields[layout.line] != line:
+                    continue
+                if needle and needle not in fields[layout.value]:
+                    continue
+            batch.append(step)
+            if len(batch) >= SCAN_BATCH:
+                matches.extend(batch)
+                del batch[:]
+        matches.extend(batch)
+        if generation == self._generation:
+            self._scan_state = f"Filter finished in {time.perf_counter() - start:.1f}s"
+
+    def _poll(self):
+        if self.index is not None and not self.tree["columns"]:
+            self._install_columns()
+        if self.index is not None:
+            shown = f"{self.total():,} matching steps" if self.matches is not None else f"{self.total():,} steps"
+            self.status.set(f"{shown}  |  rows {self.top:,}-{self.top + len(self.items):,}  {self._scan_state}")
+            self.refresh()
+        elif self._scan_state:
+            self.status.set(self._scan_state)
+        self.root.after(POLL_MS, self._poll)
+
+
+if __name__ == "__main__":
+    root = tk.Tk()
+    path = sys.argv[1] if len(sys.argv) > 1 else filedialog.askopenfilename(
+        title="Open trace", filetypes=[("Variable trace", "*.csv"), ("All files", "*.*")])
+    if not path:
+        messagebox.showinfo("Trace Viewer", "No trace selected.")
+        root.destroy()
+    else:
+        app = TraceViewer(root, path)
+        root.mainloop()
@@ -6,6 +6,8 @@ import os
 import shutil
 import time
 
+from project_walker import walk_project
+
 
 def generate_typst_header():
     """
@@ -131,7 +133,7 @@ def inject_into_typst_file(file_path, max_depth=3):
         return False
 
 
-def process_typst_project(source_dir, max_depth):
+def process_typst_project(source_dir, max_depth, include=None, exclude=None):
     """
     Creates a temporary instrumented project directory to preserve the original sources.
     """
@@ -141,11 +143,8 @@ def process_typst_project(source_dir, max_depth):
 
     print("\n[START] Building instrumented Typst project sandbox...")
 
-    for root, _, files in os.walk(source_dir):
-        # Skip standard build/versioning folders
-        if any(x in root for x in ['.git', '.typst-cache', 'build', 'dist']):
-            continue
-
+    # Skip standard build/versioning folders
+    for root, files in walk_project(source_dir, skip_dirs=['.git', '.typst-cache', 'build', 'dist'], include=include, exclude=exclude):
         for file in files:
             src = os.path.join(root, file)
             dst = os.path.join(target_dir, os.path.relpath(src, source_dir))